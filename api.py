@@ -1,41 +1,113 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException, Request
+from fastapi import FastAPI, UploadFile, File, HTTPException, Request, Header, Query
 from fastapi.responses import StreamingResponse
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
-from typing import Optional, Dict
+from typing import Optional, Dict, List
 import pandas as pd
 import logging
+import json
+import asyncio
 import os
+import hashlib
+import functools
+import time
+from datetime import datetime
 from dotenv import load_dotenv
 from connectors.sql_alchemy_sqlite import SqlAlchemySQLite
 from textgen.factory import LLMClientFactory
+from textgen.transport import close_http_client, close_async_http_client
 from helpers.query_history import *
 from helpers.config_store import *
 from helpers.supported_models import *
+from helpers.sql_cache import get_sql_cache, normalize_question
+from helpers.single_flight import SingleFlight
+from helpers.result_cache import analyze_query
+from helpers.result_stream import STREAM_FORMATS, encode_cursor, decode_cursor, iter_ndjson, iter_csv
+from helpers.bulk_load import detect_file_type
+from helpers.upload_store import (save_upload, dataset_id_for, is_dataset_id, dataset_path, list_datasets,
+                                  read_manifest, write_manifest, content_lock)
+from helpers.dataset_registry import DatasetRegistry, dataset_registry_settings
+from helpers.index_advisor import IndexAdvisor, index_advisor_settings
+from helpers.export_stream import EXPORT_FORMATS, export_settings, iter_xlsx, iter_zip
+from helpers.query_guard import CancelToken, QueryInterrupted
+from helpers.arrow_fetch import ARROW_FORMATS, negotiate_arrow_format, iter_arrow_ipc, iter_parquet
+from helpers.state_backend import get_state_backend
 from pathlib import Path
+from contextlib import asynccontextmanager
 import socket
 
 load_dotenv(override=True)
 
-app = FastAPI(title="DocGene API", description="API to interact with databases using natural language.")
+@asynccontextmanager
+async def lifespan(app):
+    """
+    Releases the pooled LLM HTTP clients and the open datasets' engines on shutdown.
+    """
+    yield
+    close_http_client()
+    await close_async_http_client()
+    datasets.close_all()
+
+app = FastAPI(title="DocGene API", description="API to interact with databases using natural language.",
+              lifespan=lifespan)
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Load configurations
-db_config = load_from_env()
+# Load configurations; runtime updates, the dataset registry's default and change counters, the
+# history, the SQL cache and the index advisor's lock live in the state backend shared by all workers
+state = get_state_backend()
+db_config = SharedConfig(load_from_env(), state)
 print(db_config)
-query_history = load_query_history()
+if db_config.overrides:
+    logger.warning(f"Runtime config updates in effect over .env: {', '.join(sorted(db_config.overrides))} "
+                   "(DELETE /config/update to remove them)")
+
+def open_uploaded_dataset(dataset_id):
+    """
+    Opens the database of a completely loaded upload, or returns None.
+    """
+    if not is_dataset_id(dataset_id):
+        return None
+    dataset_dir = dataset_path(db_config["SQLITE_DB_PATH"], dataset_id)
+    manifest = read_manifest(dataset_dir, db_config["SQLITE_DB_NAME"])
+    if manifest is None:
+        return None
+    db = SqlAlchemySQLite(db_path=dataset_dir, db_name=db_config["SQLITE_DB_NAME"])
+    db.table_names = manifest.get("tables") or db.table_names
+    db.table_name = db.table_names[0]
+    return db
+
+# Every upload is a dataset with its own ID; requests without one use the latest upload
+datasets = DatasetRegistry(open_uploaded_dataset, state=state, **dataset_registry_settings())
+query_flight = SingleFlight()
+index_advisor = IndexAdvisor(state)
+backend_semaphores = {}  # Limits concurrent batch LLM calls per backend
 
-db_instance = None  # Initialize as None until a file is uploaded
+RESULT_FORMATS = ["markdown", "json"] + list(STREAM_FORMATS) + list(ARROW_FORMATS)
+DEFAULT_PAGE_SIZE = int(os.getenv("RESULT_PAGE_SIZE", 100))
+RESULT_CHUNK_SIZE = int(os.getenv("RESULT_CHUNK_SIZE", 10000))
+DISCONNECT_POLL_INTERVAL = float(os.getenv("DISCONNECT_POLL_INTERVAL", 0.5))  # Seconds between client disconnect checks
 
 # Models
 class QueryRequest(BaseModel):
-    question: str
+    question: Optional[str] = None
+    use_cache: bool = True
+    format: str = "markdown"  # markdown, json, ndjson, csv, arrow or parquet
+    page_size: Optional[int] = None
+    cursor: Optional[str] = None  # next_cursor of a previous page
+    dataset_id: Optional[str] = None  # Defaults to the latest upload
+
+class BatchQueryRequest(BaseModel):
+    questions: List[str]
+    use_cache: bool = True
+    dataset_id: Optional[str] = None
 
 class ConfigUpdateRequest(BaseModel):
     updates: Dict[str, str]
 
 class ChatRequest(BaseModel):
     message: str
+    stream: bool = False
     
 def get_local_ip():
     s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
@@ -64,85 +136,539 @@ def home():
     return {"message": "Welcome to DocGene API"}
 
 @app.post("/upload")
-def upload_file(file: UploadFile = File(...)):
-    global db_instance
-    file_location = os.path.join("F:\Mini-Project-Revised", file.filename)
-    with open(file_location, "wb") as buffer:
-        buffer.write(file.file.read())
-    
-    file_extension = file.filename.split(".")[-1].lower()
-    file_type = "excel" if file_extension in ["xls", "xlsx"] else "csv" if file_extension == "csv" else None
-    
-    if not file_type:
+def upload_file(file: Optional[UploadFile] = File(None), files: List[UploadFile] = File(None)):
+    uploads = ([file] if file else []) + (files or [])
+    if not uploads:
+        raise HTTPException(status_code=400, detail="No file uploaded.")
+    file_types = [detect_file_type(upload.filename) for upload in uploads]
+    if not all(file_types):
         raise HTTPException(status_code=400, detail="Unsupported file type. Only Excel and CSV files are allowed.")
-    
-    db_instance = SqlAlchemySQLite(db_path=db_config["SQLITE_DB_PATH"], db_name=db_config["SQLITE_DB_NAME"], uploaded_file=file_location, file_type=file_type)
-    
-    return {"message": "File uploaded and database initialized successfully", "filename": file.filename}
 
-@app.post("/query")
-def execute_query(request: QueryRequest):
-    if db_instance is None:
+    # Stream the uploads to disk in chunks while hashing them; identical content maps to the same database
+    db_path, db_name = db_config["SQLITE_DB_PATH"], db_config["SQLITE_DB_NAME"]
+    upload_dir = os.getenv("UPLOAD_DIR") or os.path.join(str(db_path), "uploads")
+    saved = [save_upload(upload.file, upload_dir, suffix=f".{upload.filename.rsplit('.', 1)[-1].lower()}") for upload in uploads]
+    if len(saved) == 1:
+        content_hash = saved[0][1]
+    else:
+        # File names decide table names, so they are part of a multi-file upload's identity
+        content_hash = hashlib.sha256("\n".join(sorted(
+            f"{upload.filename}:{file_hash}" for upload, (_, file_hash) in zip(uploads, saved))).encode()).hexdigest()
+    dataset_dir = dataset_path(db_path, content_hash)
+    dataset_id = dataset_id_for(content_hash)
+    filenames = [upload.filename for upload in uploads]
+
+    with content_lock(content_hash):
+        manifest = read_manifest(dataset_dir, db_name)
+        if manifest is not None:
+            for temp_location, _ in saved:
+                os.remove(temp_location)
+            datasets.default_id = dataset_id
+            return {"message": "File already loaded; reusing its database", "filenames": filenames,
+                    "dataset_id": dataset_id, "content_hash": content_hash, "deduplicated": True,
+                    "load_stats": manifest["load_stats"]}
+
+        os.makedirs(dataset_dir, exist_ok=True)
+        sources = []
+        for i, (upload, file_type, (temp_location, _)) in enumerate(zip(uploads, file_types, saved)):
+            file_location = os.path.join(dataset_dir, f"source{'' if len(saved) == 1 else f'_{i}'}{Path(temp_location).suffix}")
+            os.replace(temp_location, file_location)
+            sources.append((file_location, file_type, upload.filename))
+        # Load into a new connector first; a failed load leaves the current database in place
+        db = SqlAlchemySQLite(db_path=dataset_dir, db_name=db_name)
+        if db.load_uploaded_files_to_sqlite(sources) is None:
+            db.dispose()
+            raise HTTPException(status_code=400, detail="Failed to load the uploaded files into the database.")
+        write_manifest(dataset_dir, db_name, {"filenames": filenames, "content_hash": content_hash,
+                                              "tables": db.table_names, "load_stats": db.load_stats})
+        datasets.add(dataset_id, db)
+        datasets.default_id = dataset_id
+
+    return {"message": "File uploaded and database initialized successfully", "filenames": filenames,
+            "dataset_id": dataset_id, "content_hash": content_hash, "deduplicated": False, "load_stats": db.load_stats}
+
+@app.get("/datasets")
+def get_datasets():
+    """
+    Lists the uploaded datasets with their files and tables, and which are currently open.
+    """
+    manifests = list_datasets(db_config["SQLITE_DB_PATH"], db_config["SQLITE_DB_NAME"])
+    return {
+        "datasets": [
+            {"dataset_id": dataset_id, "filenames": manifest.get("filenames"), "tables": manifest.get("tables")}
+            for dataset_id, manifest in manifests.items()
+        ],
+        "registry": datasets.stats(),
+    }
+
+def resolve_dataset(dataset_id=None):
+    """
+    Returns (dataset ID, connector) for a request, defaulting to the latest upload.
+    """
+    dataset_id = dataset_id or datasets.default_id
+    if dataset_id is None:
         raise HTTPException(status_code=400, detail="No database available. Please upload a file first.")
-    
-    schema_info = db_instance.get_db_schema()
+    db = datasets.get(dataset_id)
+    if db is None:
+        raise HTTPException(status_code=404, detail=f"Dataset not found: {dataset_id}")
+    return dataset_id, db
+
+@app.post("/query")
+async def execute_query(request: QueryRequest, http_request: Request, accept: Optional[str] = Header(None)):
+    # An Arrow IPC or Parquet Accept header takes precedence over the format field
+    request.format = negotiate_arrow_format(accept) or request.format
+    if request.format not in RESULT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported format. Use one of: {', '.join(RESULT_FORMATS)}.")
+
+    # Follow-up pages skip generation entirely; the signed cursor carries the SQL and offset
+    if request.cursor:
+        try:
+            sql_query, offset, cursor_dataset_id = decode_cursor(request.cursor)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        dataset_id, db = resolve_dataset(cursor_dataset_id or request.dataset_id)
+        return await cancel_on_disconnect(http_request, run_cancellable(
+            fetch_result_page, db, dataset_id, sql_query, offset, request.page_size or DEFAULT_PAGE_SIZE, request.format))
+
+    if not request.question:
+        raise HTTPException(status_code=400, detail="A question or a cursor is required.")
+    dataset_id, db = resolve_dataset(request.dataset_id)
+
+    # Database work stays blocking and runs in the threadpool; the LLM call is awaited
+    schema_version = await run_in_threadpool(db.schema_fingerprint)
     backend = db_config.get("LLM_BACKEND")
     model_name = db_config.get("MODEL")
+
+    # Identical requests on the same dataset arriving while one is in flight share its pipeline execution
+    flight_key = (dataset_id, normalize_question(request.question), schema_version, backend, model_name, request.use_cache)
+    started = time.perf_counter()
+
+    if request.page_size or request.format in STREAM_FORMATS or request.format in ARROW_FORMATS:
+        # Responses are produced per request, so only the SQL generation is shared
+        sql_query = await cancel_on_disconnect(http_request, query_flight.do(
+            ("sql",) + flight_key,
+            lambda: generate_query_sql(db, request.question, schema_version, backend, model_name, request.use_cache)))
+        if is_read_query(sql_query):
+            # Streams record their outcome in the history once they ended or failed
+            record = functools.partial(log_query, db, request.question, sql_query, backend, model_name, started)
+            if request.format in ARROW_FORMATS:
+                return await cancel_on_disconnect(http_request, run_cancellable(
+                    functools.partial(stream_arrow_result, record=record), db, sql_query, request.format))
+            if request.page_size:
+                try:
+                    page = await cancel_on_disconnect(http_request, run_cancellable(
+                        fetch_result_page, db, dataset_id, sql_query, 0, request.page_size, request.format))
+                except HTTPException as e:
+                    await run_in_threadpool(record, str(e.detail), status="error")
+                    raise
+                await run_in_threadpool(record, status="streamed")
+                return page
+            return StreamingResponse(await cancel_on_disconnect(http_request, run_cancellable(
+                functools.partial(stream_query_result, record=record), db, sql_query, request.format)),
+                                     media_type=STREAM_FORMATS[request.format])
+        query_result = await cancel_on_disconnect(http_request, run_cancellable(db.run_query, sql_query))
+        datasets.changed(dataset_id)
+        await record_history(db, request.question, sql_query, backend, model_name, started, query_result)
+        return {"query": sql_query, "result": query_result}
+
+    # A shared pipeline is cancelled, stopping its query, once every client waiting for it has gone
+    return await cancel_on_disconnect(http_request, query_flight.do(
+        flight_key + (request.format,),
+        lambda: run_query_pipeline(db, dataset_id, request.question, schema_version, backend, model_name,
+                                   request.use_cache, request.format)))
+
+async def cancel_on_disconnect(http_request, awaitable):
+    """
+    Awaits `awaitable`, cancelling it if the client disconnects first.
+    """
+    task = asyncio.ensure_future(awaitable)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=DISCONNECT_POLL_INTERVAL)
+            if done:
+                return task.result()
+            if await http_request.is_disconnected():
+                task.cancel()
+                raise HTTPException(status_code=499, detail="Client disconnected.")
+    except asyncio.CancelledError:
+        task.cancel()
+        raise
+
+async def run_cancellable(func, *args, wait=False):
+    """
+    Runs a connector call in the threadpool, passing it a fresh CancelToken. If the awaiting
+    task is cancelled, the token interrupts the call's query instead of waiting for it.
+    With `wait`, the cancelled task still finishes only once the interrupted call returned,
+    e.g. before the connection it runs on is closed.
+    """
+    cancel_token = CancelToken()
+    return await await_in_threadpool(cancel_token, functools.partial(func, *args, cancel_token=cancel_token), wait)
+
+async def await_in_threadpool(cancel_token, call, wait=False):
+    future = asyncio.ensure_future(run_in_threadpool(call))
+    try:
+        return await asyncio.shield(future)
+    except asyncio.CancelledError:
+        cancel_token.cancel()
+        if wait:
+            await asyncio.wait({future})
+        # The interrupted call still finishes in its thread; collect its outcome there
+        future.add_done_callback(lambda done: done.cancelled() or done.exception())
+        raise
+
+async def iter_cancellable(iterator, cancel_token):
+    """
+    Iterates a blocking response body in the threadpool. If the response is aborted, e.g.
+    because the client disconnected, the token stops the query feeding the body.
+    """
+    finished = object()
+    try:
+        while True:
+            chunk = await await_in_threadpool(cancel_token, functools.partial(next, iterator, finished))
+            if chunk is finished:
+                return
+            yield chunk
+    finally:
+        cancel_token.cancel()
+
+async def generate_query_sql(db, question, schema_version, backend, model_name, use_cache):
+    schema_info = await run_in_threadpool(db.get_relevant_db_schema, question)
     inference_client = LLMClientFactory.get_client(
         backend=backend, server_url=db_config.get("LLM_ENDPOINT"), model_name=model_name,
         api_key=db_config.get("LLM_API_KEY"))
-    sql_query = inference_client.generate_sql(request.question, schema_info)
+    sql_query = await inference_client.generate_sql_async(
+        question, schema_info, schema_version=schema_version, use_cache=use_cache)
     
     if not sql_query:
+        await run_in_threadpool(record_query, question, None, backend, model_name, "error", error="SQL Query generation failed")
         raise HTTPException(status_code=400, detail="SQL Query generation failed")
-    
-    query_result = db_instance.run_query(sql_query)
-    query_history.append((request.question, sql_query))
-    save_query_history(query_history)
-    
-    return {"query": sql_query, "result": query_result.to_markdown()}
+    return sql_query
+
+async def record_history(db, question, sql_query, backend, model_name, started, query_result=None, status=None):
+    """
+    Appends a query on dataset `db` to the history store with its outcome and latency since `started`.
+    """
+    await run_in_threadpool(log_query, db, question, sql_query, backend, model_name, started, query_result, status)
+
+def log_query(db, question, sql_query, backend, model_name, started, query_result=None, status=None):
+    """
+    Blocking variant of `record_history`, e.g. for a stream finishing in the threadpool.
+    """
+    error = query_result if status == "error" or is_error_result(query_result) else None
+    row_count = len(query_result) if isinstance(query_result, pd.DataFrame) else None
+    entry_id = record_query(question, sql_query, backend, model_name, status or ("error" if error else "ok"),
+                            (time.perf_counter() - started) * 1000, row_count, error)
+
+    # Periodically let the index advisor look at the latest queries, off the request path
+    auto_every = index_advisor_settings()["auto_every"]
+    if auto_every and entry_id % auto_every == 0:
+        start_index_advisor(db, apply=True)
+
+def start_index_advisor(db, apply=True):
+    if not hasattr(db, "advise_indexes"):
+        return False
+    # The history is shared by all datasets; queries on other datasets fail EXPLAIN and are skipped
+    queries = get_query_history_store().executed_queries(index_advisor_settings()["history"])
+    return index_advisor.start(db, queries, apply=apply)
+
+async def run_query_pipeline(db, dataset_id, question, schema_version, backend, model_name, use_cache,
+                             result_format="markdown"):
+    started = time.perf_counter()
+    sql_query = await generate_query_sql(db, question, schema_version, backend, model_name, use_cache)
+    query_result, truncated = await run_cancellable(db.run_query_preview, sql_query)
+    if not is_read_query(sql_query):
+        datasets.changed(dataset_id)  # Other workers drop their cached results of this dataset
+    await record_history(db, question, sql_query, backend, model_name, started, query_result)
+    response = {"query": sql_query, "result": format_query_result(query_result, result_format), "truncated": truncated}
+    if isinstance(query_result, pd.DataFrame) and query_result.attrs.get("warnings"):
+        response["warnings"] = query_result.attrs["warnings"]  # Plans the query guard flagged as expensive
+    if truncated:
+        # Continue with paginated fetches of the original query: POST /query with this cursor
+        response["next_cursor"] = encode_cursor(sql_query, len(query_result), dataset_id)
+    return response
+
+def format_query_result(query_result, result_format="markdown"):
+    if not isinstance(query_result, pd.DataFrame):
+        return query_result
+    if result_format == "json":
+        return json.loads(query_result.to_json(orient="records", date_format="iso"))
+    return query_result.to_markdown()
+
+def is_read_query(sql_query):
+    query_info = analyze_query(sql_query)
+    return not query_info["write"] and not query_info["ddl"]
+
+def fetch_result_page(db, dataset_id, sql_query, offset, page_size, result_format, cancel_token=None):
+    """
+    Returns one page of a query's result with a cursor for the next page, if any.
+    """
+    page, has_more = db.run_query_page(sql_query, offset, page_size, cancel_token=cancel_token)
+    if is_error_result(page):
+        raise HTTPException(status_code=400, detail=page)
+    return {
+        "query": sql_query,
+        "result": format_query_result(page, result_format),
+        "offset": offset,
+        "next_cursor": encode_cursor(sql_query, offset + page_size, dataset_id) if has_more else None
+    }
+
+def stream_arrow_result(db, sql_query, result_format, filename="result", record=None, cancel_token=None):
+    """
+    Streams a SELECT's result as an Arrow IPC stream or a Parquet file, built from
+    Arrow record batches without going through pandas.
+    """
+    cancel_token = cancel_token or CancelToken()
+    batches = open_result_stream(record_outcome(db.iter_arrow_batches(sql_query, cancel_token=cancel_token), record))
+    body = iter_arrow_ipc(batches) if result_format == "arrow" else iter_parquet(batches)
+    extension = "arrows" if result_format == "arrow" else "parquet"
+    return StreamingResponse(iter_cancellable(body, cancel_token), media_type=ARROW_FORMATS[result_format],
+                             headers={"Content-Disposition": f'attachment; filename="{filename}.{extension}"'})
+
+def stream_query_result(db, sql_query, result_format, record=None, cancel_token=None):
+    """
+    Streams a SELECT's rows as NDJSON or CSV, one server-side cursor chunk at a time.
+    """
+    cancel_token = cancel_token or CancelToken()
+    chunks = open_result_stream(record_outcome(
+        db.iter_query(sql_query, chunk_size=RESULT_CHUNK_SIZE, cancel_token=cancel_token), record))
+    return iter_cancellable(iter_ndjson(chunks) if result_format == "ndjson" else iter_csv(chunks), cancel_token)
+
+def open_result_stream(chunks):
+    """
+    Runs a streamed query up to its first chunk, so a failing query is answered with a 400
+    instead of an empty 200 response whose headers were already sent.
+    """
+    try:
+        first = next(chunks)
+    except StopIteration:
+        return iter(())
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=stream_error_message(e))
+
+    def resume():
+        yield first
+        yield from chunks  # Closing the body closes the query's cursor and connection
+    return resume()
+
+def record_outcome(chunks, record=None):
+    """
+    Passes a streamed query's chunks through and calls `record` with its outcome once the
+    stream ended, failed or was closed early.
+    """
+    if record is None:
+        yield from chunks
+        return
+    try:
+        yield from chunks
+    except Exception as e:
+        record(stream_error_message(e), status="error")
+        raise
+    except GeneratorExit:
+        record(status="cancelled")  # The client stopped reading
+        raise
+    record(status="streamed")
+
+def stream_error_message(error):
+    if isinstance(error, (ValueError, QueryInterrupted)):
+        return str(error)  # Rejected by the query guard, timed out or cancelled
+    return f"Query execution failed: {getattr(error, 'orig', None) or error}"
+
+def is_error_result(query_result):
+    return isinstance(query_result, str) and query_result.startswith(("Query execution failed", "An error occurred", "Query blocked"))
+
+def get_backend_semaphore(backend):
+    """
+    Returns the semaphore bounding concurrent batch LLM calls for a backend, sized by
+    LLM_BATCH_CONCURRENCY_<BACKEND> or LLM_BATCH_CONCURRENCY (default: 4).
+    """
+    if backend not in backend_semaphores:
+        limit = os.getenv(f"LLM_BATCH_CONCURRENCY_{backend.upper()}", os.getenv("LLM_BATCH_CONCURRENCY", 4))
+        backend_semaphores[backend] = asyncio.Semaphore(int(limit))
+    return backend_semaphores[backend]
+
+@app.post("/query/batch")
+async def execute_query_batch(request: BatchQueryRequest):
+    """
+    Translates and executes a list of questions, streaming one NDJSON line per question
+    as soon as it finishes. Failures are reported per item in an "error" field.
+    """
+    dataset_id, db = resolve_dataset(request.dataset_id)
+
+    # Reflect once up front; every question below reuses the cached tables and index
+    schema_version = await run_in_threadpool(db.schema_fingerprint)
+    backend = db_config.get("LLM_BACKEND")
+    model_name = db_config.get("MODEL")
+    inference_client = LLMClientFactory.get_client(
+        backend=backend, server_url=db_config.get("LLM_ENDPOINT"), model_name=model_name,
+        api_key=db_config.get("LLM_API_KEY"))
+    semaphore = get_backend_semaphore(backend)
+    connection = await run_in_threadpool(db.engine.connect)
+    connection_lock = asyncio.Lock()
+
+    async def run_item(index, question):
+        item = {"index": index, "question": question}
+        started = time.perf_counter()
+        try:
+            schema_info = await run_in_threadpool(db.get_relevant_db_schema, question)
+            async with semaphore:
+                sql_query = await inference_client.generate_sql_async(
+                    question, schema_info, schema_version=schema_version, use_cache=request.use_cache)
+            if not sql_query or sql_query.startswith("Error:"):
+                item["error"] = sql_query or "SQL Query generation failed"
+                await run_in_threadpool(record_query, question, None, backend, model_name, "error",
+                                        (time.perf_counter() - started) * 1000, error=item["error"])
+                return item
+
+            item["query"] = sql_query
+            async with connection_lock:
+                query_result = await run_cancellable(db.run_query, sql_query, connection, wait=True)
+            if not is_read_query(sql_query):
+                datasets.changed(dataset_id)
+            await record_history(db, question, sql_query, backend, model_name, started, query_result)
+            if is_error_result(query_result):
+                item["error"] = query_result
+            else:
+                item["result"] = format_query_result(query_result)
+        except Exception as e:
+            item["error"] = str(e)
+        return item
+
+    async def stream_results():
+        tasks = [asyncio.ensure_future(run_item(index, question)) for index, question in enumerate(request.questions)]
+        try:
+            for finished in asyncio.as_completed(tasks):
+                yield json.dumps(await finished, default=str) + "\n"
+        finally:
+            for task in tasks:
+                task.cancel()
+            # Cancelled items return once their interrupted query did; only then is the connection free
+            await asyncio.gather(*tasks, return_exceptions=True)
+            await run_in_threadpool(connection.close)
+
+    return StreamingResponse(stream_results(), media_type="application/x-ndjson")
 
 @app.get("/schema")
-def get_schema():
-    if db_instance is None:
-        raise HTTPException(status_code=400, detail="No database available. Please upload a file first.")
-    return {"schema": db_instance.show_db_schema_md()}
+def get_schema(dataset_id: Optional[str] = None):
+    _, db = resolve_dataset(dataset_id)
+    return {"schema": db.show_db_schema_md()}
+
+@app.get("/cache/stats")
+def get_cache_stats(dataset_id: Optional[str] = None):
+    _, db = resolve_dataset(dataset_id)
+    sql_cache = get_sql_cache()
+    return {
+        "schema": db.schema_cache_stats(),
+        "sql": sql_cache.stats() if sql_cache else None,
+        "results": db.result_cache_stats(),
+        "pool": db.pool_stats(),
+        "llm_clients": LLMClientFactory.stats(),
+        "query_coalescing": query_flight.stats(),
+        "datasets": datasets.stats()
+    }
 
 @app.post("/config/update")
-async def update_config(request: Request):
-    body = await request.json()
-    print("Received JSON:", body)  # Debugging: Print full request body
-    return {"message": "Check logs for JSON"}
+def update_config(request: ConfigUpdateRequest):
+    """
+    Updates settings at runtime for every worker, e.g. the LLM backend or model.
+    """
+    unknown = sorted(set(request.updates) - set(db_config.defaults))
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown settings: {', '.join(unknown)}.")
+    db_config.update(request.updates)
+    return {"message": "Configuration updated", "updated": sorted(request.updates)}
+
+@app.get("/config")
+def get_config():
+    """
+    Returns the configuration in effect, with secrets masked, and which settings were updated at runtime.
+    """
+    return {"config": db_config.masked(), "overrides": sorted(db_config.overrides)}
+
+@app.delete("/config/update")
+def reset_config(key: Optional[List[str]] = Query(None)):
+    """
+    Removes runtime updates of the given settings, or of all settings, so the .env values apply again.
+    """
+    return {"message": "Configuration reset", "reset": db_config.reset(key)}
 
 @app.get("/export")
-def export_data(output_path: Optional[str] = None):
-    if db_instance is None:
-        raise HTTPException(status_code=400, detail="No database available. Please upload a file first.")
-    
-    # Set a default path if none provided
-    output_path = Path(output_path or (Path.cwd() / "exported_data.xlsx"))
+def export_data(format: Optional[str] = None, table: Optional[str] = None, sql: Optional[str] = None,
+                dataset_id: Optional[str] = None, accept: Optional[str] = Header(None)):
+    """
+    Streams a dataset's database, one table, or one query's result (`sql`) as an Excel workbook
+    (default), a zip of CSV or Parquet files, or a single Arrow IPC / Parquet stream.
+    """
+    _, db = resolve_dataset(dataset_id)
 
-    # Generate the Excel file
-    result_path = db_instance.export_to_excel(str(output_path))
+    export_format = negotiate_arrow_format(accept) or format or "xlsx"
+    if export_format not in EXPORT_FORMATS and export_format not in ARROW_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported format. Use one of: {', '.join(list(EXPORT_FORMATS) + list(ARROW_FORMATS))}.")
+    if sql and not is_read_query(sql):
+        raise HTTPException(status_code=400, detail="Only SELECT queries can be exported.")
+    if table and table not in db.get_table_names():
+        raise HTTPException(status_code=404, detail=f"Table not found: {table}")
 
-    # Check if the file was actually created
-    if not Path(result_path).exists():
-        raise HTTPException(status_code=500, detail="Failed to export Excel file.")
+    export_tables = db.get_export_tables(sql)
+    if table and not sql:
+        export_tables = [(name, query) for name, query in export_tables if name == table]
+    if not export_tables:
+        raise HTTPException(status_code=404, detail="No tables found in the database to export.")
 
-    # Open file as binary stream for download
-    file_stream = open(result_path, "rb")
+    # Arrow IPC / Parquet exports stream a single table or result straight to the response
+    if export_format in ARROW_FORMATS:
+        name, query = export_tables[0] if (table or sql) else next(
+            (entry for entry in export_tables if entry[0] == db.table_name), export_tables[0])
+        return stream_arrow_result(db, query, export_format, filename=name)
 
-    return StreamingResponse(
-        file_stream,
-        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        headers={
-            "Content-Disposition": f'attachment; filename="{Path(result_path).name}"'
-        }
-    )
+    settings = export_settings()
+    if export_format == "xlsx":
+        body = iter_xlsx((name, db.iter_query(query, chunk_size=settings["chunk_rows"])) for name, query in export_tables)
+    else:
+        body = iter_zip(db, export_tables, export_format.split(".")[0], settings["workers"], settings["chunk_rows"])
+    filename = f"{export_tables[0][0] if (table or sql) else db.db_name}.{export_format}"
+    return StreamingResponse(body, media_type=EXPORT_FORMATS[export_format],
+                             headers={"Content-Disposition": f'attachment; filename="{filename}"'})
+
+@app.post("/indexes/advise")
+def advise_indexes(apply: bool = True, dataset_id: Optional[str] = None):
+    """
+    Starts an index advisor run for a dataset over the query history in the background;
+    poll GET /indexes for the report.
+    """
+    _, db = resolve_dataset(dataset_id)
+    if not hasattr(db, "advise_indexes"):
+        raise HTTPException(status_code=400, detail="The index advisor supports uploaded SQLite databases only.")
+    started = start_index_advisor(db, apply=apply)
+    return {"status": "started" if started else "already running"}
+
+@app.get("/indexes")
+def get_index_advice():
+    return index_advisor.status()
 
 @app.get("/history")
-def get_query_history():
-    return {"history": query_history}
+def get_query_history(limit: int = 50, cursor: Optional[int] = None, status: Optional[str] = None,
+                      backend: Optional[str] = None, model: Optional[str] = None,
+                      since: Optional[str] = None, until: Optional[str] = None, q: Optional[str] = None):
+    """
+    Returns query history entries, newest first. `cursor` is the next_cursor of the previous
+    page; `since`/`until` take ISO dates or Unix timestamps; `q` searches questions and SQL.
+    """
+    try:
+        since, until = parse_timestamp(since), parse_timestamp(until)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="since and until must be ISO dates or Unix timestamps.")
+    entries, next_cursor = get_query_history_store().search(
+        limit=max(1, min(limit, 500)), before_id=cursor, status=status, backend=backend, model=model,
+        since=since, until=until, text=q)
+    return {"history": entries, "next_cursor": next_cursor}
+
+def parse_timestamp(value):
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value).timestamp()
 
 @app.post("/chat")
 async def chat(request: ChatRequest):
@@ -154,6 +680,23 @@ async def chat(request: ChatRequest):
         model_name=model_name,
         api_key=db_config.get("LLM_API_KEY")
     )
-    response = inference_client.generate_generic_response(request.message)
+    if request.stream:
+        return StreamingResponse(stream_chat_events(inference_client, request.message), media_type="text/event-stream")
+
+    response = await inference_client.generate_generic_response_async(request.message)
     
     return {"response": response}
+
+async def stream_chat_events(inference_client, message):
+    """
+    Relays streamed completion chunks to the client as server-sent events.
+
+    A backend failure is sent as an error event so the stream still ends with [DONE].
+    """
+    try:
+        async for chunk in inference_client.stream_generic_response_async(message):
+            yield f"data: {json.dumps({'token': chunk})}\n\n"
+    except Exception as e:
+        logger.error(f"Chat stream failed: {e}")
+        yield f"data: {json.dumps({'error': f'Chat generation failed: {e}'})}\n\n"
+    yield "data: [DONE]\n\n"
@@ -1,11 +1,21 @@
 from sqlalchemy import create_engine, text , MetaData , select, inspect
 from sqlalchemy.types import NullType
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
 from sqlalchemy.schema import CreateTable
 from helpers.validation import is_safe_query
+from helpers.schema_cache import SchemaCache, is_ddl_statement
+from helpers.schema_retrieval import SchemaIndex, render_create_table, schema_retrieval_settings
+from helpers.result_cache import analyze_query, result_cache_from_env
+from helpers.result_stream import paginate_sql, has_star_projection, column_probe_sql
+from helpers.sql_budget import result_budget_settings, apply_row_limit, enforce_result_budget
+from helpers.query_guard import query_guard_settings, check_query_plan, interruptible
+from helpers.db_pool import pool_settings, replica_urls, is_read_only, ReplicaRouter
+from helpers.arrow_fetch import adbc_postgresql, adbc_record_batches, rows_to_record_batches
 import pandas as pd
+import hashlib
 import os
+from contextlib import nullcontext
+from urllib.parse import quote_plus
 from dotenv import load_dotenv
 
 load_dotenv(override=True)
@@ -17,6 +27,34 @@ engine_uri = {
     "oracle": "oracle+cx_oracle://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
 }
 
+# sqlglot dialect used to canonicalize queries for each driver
+sqlglot_dialects = {
+    "mysql": "mysql",
+    "postgres": "postgres",
+    "mssql": "tsql",
+    "oracle": "oracle"
+}
+
+# Cheap catalog queries whose result changes whenever a table or column is created, altered or dropped
+schema_fingerprint_queries = {
+    "postgres": """
+        SELECT md5(string_agg(c.oid::text || ':' || c.relfilenode::text || ':' || a.attname || ':' || a.atttypid::text,
+                              ',' ORDER BY c.oid, a.attnum))
+        FROM pg_class c
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        JOIN pg_attribute a ON a.attrelid = c.oid AND a.attnum > 0 AND NOT a.attisdropped
+        WHERE c.relkind IN ('r', 'v', 'm', 'p')
+          AND n.nspname NOT IN ('pg_catalog', 'information_schema')
+    """,
+    "mysql": """
+        SELECT COUNT(*), SUM(CRC32(CONCAT_WS(':', table_name, column_name, column_type, ordinal_position)))
+        FROM information_schema.columns
+        WHERE table_schema = DATABASE()
+    """,
+    "mssql": "SELECT COUNT(*), MAX(modify_date) FROM sys.objects WHERE type IN ('U', 'V')",
+    "oracle": "SELECT COUNT(*), MAX(last_ddl_time) FROM user_objects WHERE object_type IN ('TABLE', 'VIEW')"
+}
+
 class SqlAlchemy:
     def __init__(self):
         load_dotenv(override=True)
@@ -45,43 +83,93 @@ class SqlAlchemy:
         except KeyError as e:
             raise ValueError(f"Missing configuration for {e}")
 
-        # Create the SQLAlchemy engine
+        # Create the SQLAlchemy engine; read-only queries go to DB_REPLICA_URLS when set
         try:
-            self.engine = create_engine(self.CONNECTION_STRING)
+            self.engine = create_engine(self.CONNECTION_STRING, **pool_settings())
             self.base = declarative_base()
+            urls = replica_urls()
+            self.replicas = ReplicaRouter(self.engine, urls, pool_settings()) if urls else None
         except Exception as e:
             raise ConnectionError(f"Failed to create SQLAlchemy engine: {e}")
 
-    def run_query(self, query):
+        self.schema_cache = SchemaCache()
+        self.result_cache = result_cache_from_env()
+        self.sqlglot_dialect = sqlglot_dialects.get(self.DB_DRIVER)
+
+    def run_query(self, query, connection=None, cancel_token=None):
+        """Run a query and return a DataFrame for SELECTs or a status message.
+
+            Executes on a pooled connection in a plain transaction, without an ORM session.
+            Read-only statements go to a read replica when DB_REPLICA_URLS is set; pass
+            `connection` to run on an already open connection instead, e.g. across a batch.
+            SELECTs pass the query guard (see `helpers.query_guard`) and every statement
+            runs under QUERY_TIMEOUT; cancelling `cancel_token` interrupts the query.
+        """
         try:
-            # Validate query before creating session
+            # Validate query before connecting
             if not is_safe_query(query):
                 return "Query blocked: Potentially unsafe SQL detected."
-            
-            Session = sessionmaker(bind=self.engine)
-            session = Session()  # Only create session if query is safe
 
-            result = session.execute(text(query))  # Execute query
+            query_info = None
+            if self.result_cache is not None or self.replicas is not None:
+                query_info = analyze_query(query, self.sqlglot_dialect)
+            if self.result_cache is not None and query_info["cacheable"]:
+                cached_result = self.result_cache.get(query_info["canonical"])
+                if cached_result is not None:
+                    return cached_result
 
-            if query.strip().lower().startswith("select"):
-                fetched_data = result.fetchall()
-                
-                if not fetched_data:
-                    return "No data found."
+            guard = query_guard_settings()
+            is_select = query.strip().lower().startswith("select")
+            with self._connect(connection, read_only=is_read_only(query_info)) as connection:
+                with connection.begin() as transaction:
+                    blocked, warnings = check_query_plan(connection, query, self.DB_DRIVER, guard)
+                    if blocked:
+                        transaction.rollback()
+                        return blocked
+                    with interruptible(connection, self.DB_DRIVER, guard["timeout"], cancel_token):
+                        result = connection.execute(text(query))  # Execute query
+                        fetched_data = result.fetchall() if is_select else None
+                    columns = list(result.keys()) if is_select else None
+                # Leaving the block commits DML and ends the read transaction of SELECTs
 
-                return pd.DataFrame(fetched_data, columns=result.keys())
+            if is_select:
+                query_result = pd.DataFrame(fetched_data, columns=columns) if fetched_data else "No data found."
+                if warnings and isinstance(query_result, pd.DataFrame):
+                    query_result.attrs["warnings"] = warnings
+                if query_info and query_info["cacheable"] and self.result_cache is not None:
+                    self.result_cache.put(query_info["canonical"], query_result, query_info["tables"])
+                return query_result
             else:
-                session.commit()  # Commit for DML queries
+                if is_ddl_statement(query):
+                    self.schema_cache.invalidate()
+                self._invalidate_results(query_info)
                 return "Query executed successfully."
-        
+
         except Exception as e:
-            if 'session' in locals():  # Ensure session exists before rollback
-                session.rollback()  # Rollback in case of error
             return f"An error occurred: {e}"
-        
-        finally:
-            if 'session' in locals():  # Close session only if it was created
-                session.close()
+
+    def _connect(self, connection=None, read_only=False):
+        """Return a context manager yielding the given connection, or a new one that is
+            closed on exit: to a read replica for read-only work, when replicas are configured.
+        """
+        if connection is not None:
+            return nullcontext(connection)
+        if read_only and self.replicas is not None:
+            return self.replicas.connect()
+        return self.engine.connect()
+
+    def pool_stats(self):
+        """Return the connection pool status of the primary and of each read replica."""
+        return {
+            "primary": self.engine.pool.status(),
+            "replicas": self.replicas.stats() if self.replicas is not None else None,
+        }
+
+    def dispose(self):
+        """Close the pooled connections of the primary and of every read replica."""
+        self.engine.dispose()
+        if self.replicas is not None:
+            self.replicas.dispose()
 
 
 
@@ -104,13 +192,131 @@ class SqlAlchemy:
         return schema_info
     
     def get_sample_rows(self, table, sample_row_limit):
-        engine = self.engine
+        return self._format_sample_rows(self._fetch_sample_rows(table, sample_row_limit))
+
+    def _fetch_sample_rows(self, table, sample_row_limit):
         command = select(table).limit(sample_row_limit)
-        with engine.connect() as connection:
-            rows = connection.execute(command).fetchall()
-            rows_str = "\n".join("\t".join(str(col)[:100] for col in row) for row in rows)
-        return rows_str
-    
+        with self.engine.connect() as connection:
+            return [tuple(row) for row in connection.execute(command).fetchall()]
+
+    @staticmethod
+    def _format_sample_rows(rows, columns=None):
+        return "\n".join(
+            "\t".join(str(row[i])[:100] for i in (columns if columns is not None else range(len(row))))
+            for row in rows
+        )
+
+    def schema_fingerprint(self):
+        """Return a cheap fingerprint of the database catalog.
+
+            Uses a per-driver catalog query (see `schema_fingerprint_queries`); drivers
+            without one fall back to hashing the inspector's table and column listing.
+        """
+        query = schema_fingerprint_queries.get(self.DB_DRIVER)
+        if query:
+            with self.engine.connect() as connection:
+                row = connection.execute(text(query)).fetchone()
+            return f"{self.DB_DRIVER}:{tuple(row)}"
+
+        inspector = inspect(self.engine)
+        digest = hashlib.sha256()
+        for table_name in sorted(inspector.get_table_names(schema=self.DB_NAME)):
+            for column in inspector.get_columns(table_name, schema=self.DB_NAME):
+                digest.update(f"{table_name}:{column['name']}:{column['type']};".encode())
+        return f"{self.DB_DRIVER}:{digest.hexdigest()}"
+
+    def schema_cache_stats(self):
+        return self.schema_cache.stats()
+
+    def iter_query(self, query, chunk_size=10000, cancel_token=None):
+        """Yield the result of a SELECT as DataFrames of at most `chunk_size` rows.
+
+            Uses a server-side cursor (`stream_results`/`yield_per`), so the full result
+            never has to fit in memory. The query passes the query guard first; on Postgres
+            QUERY_TIMEOUT applies to each fetch, on MySQL to the whole query.
+        """
+        if not is_safe_query(query):
+            raise ValueError("Query blocked: Potentially unsafe SQL detected.")
+        guard = query_guard_settings()
+        with self._connect(read_only=True) as connection:
+            self._check_stream_query(connection, query, guard)
+            with interruptible(connection, self.DB_DRIVER, guard["timeout"], cancel_token) as deadline:
+                result = connection.execution_options(stream_results=True, yield_per=chunk_size).execute(text(query))
+                columns = list(result.keys())
+                for rows in result.partitions(chunk_size):
+                    yield pd.DataFrame(rows, columns=columns)
+                    deadline.reset()
+
+    def iter_arrow_batches(self, query, batch_size=65536, cancel_token=None):
+        """Yield the result of a SELECT as Arrow record batches.
+
+            Postgres goes through the ADBC driver when it is installed; other drivers
+            build batches column by column from a server-side cursor, under QUERY_TIMEOUT
+            and `cancel_token`. Either way the query passes the query guard first.
+        """
+        if not is_safe_query(query):
+            raise ValueError("Query blocked: Potentially unsafe SQL detected.")
+        guard = query_guard_settings()
+        with self._connect(read_only=True) as connection:
+            self._check_stream_query(connection, query, guard)
+            if self.DB_DRIVER != "postgres" or adbc_postgresql is None:
+                with interruptible(connection, self.DB_DRIVER, guard["timeout"], cancel_token) as deadline:
+                    result = connection.execution_options(stream_results=True, yield_per=batch_size).execute(text(query))
+                    for batch in rows_to_record_batches(result, batch_size):
+                        yield batch
+                        deadline.reset()
+                return
+        uri = f"postgresql://{quote_plus(self.DB_USER or '')}:{quote_plus(self.DB_PASSWORD or '')}@{self.DB_HOST}:{self.DB_PORT}/{self.DB_NAME}"
+        yield from adbc_record_batches(adbc_postgresql.connect, uri, query)
+
+    def _check_stream_query(self, connection, query, guard):
+        """Apply the query guard before a streamed query; rejected plans raise ValueError."""
+        blocked, warnings = check_query_plan(connection, query, self.DB_DRIVER, guard)
+        if blocked:
+            raise ValueError(blocked)
+        if warnings:
+            print("Warning:", *warnings)
+
+    def run_query_preview(self, query, cancel_token=None):
+        """Run a query within the result budget (see `helpers.sql_budget`).
+
+            SELECTs get a LIMIT added or clamped before execution and oversized results
+            are trimmed; returns (result, whether the result was truncated).
+        """
+        budget = result_budget_settings()
+        limited_query, _ = apply_row_limit(query, budget["max_rows"], self.sqlglot_dialect)
+        return enforce_result_budget(self.run_query(limited_query, cancel_token=cancel_token),
+                                     budget["max_rows"], budget["max_bytes"])
+
+    def run_query_page(self, query, offset=0, page_size=100, cancel_token=None):
+        """Run one page of a SELECT; returns (page DataFrame or message, whether more rows follow)."""
+        columns = None
+        if has_star_projection(query, self.sqlglot_dialect):
+            # Pages are ordered by every output column, which the query text does not list
+            probe = self.run_query(column_probe_sql(query, self.sqlglot_dialect), cancel_token=cancel_token)
+            if not isinstance(probe, pd.DataFrame):
+                return probe, False
+            columns = list(probe.columns)
+        try:
+            page_query = paginate_sql(query, offset, page_size + 1, self.sqlglot_dialect, columns=columns)
+        except ValueError as e:
+            return f"Query execution failed: {e}", False
+        page = self.run_query(page_query, cancel_token=cancel_token)
+        if not isinstance(page, pd.DataFrame):
+            return page, False
+        return page.iloc[:page_size].reset_index(drop=True), len(page) > page_size
+
+    def _invalidate_results(self, query_info):
+        if self.result_cache is None:
+            return
+        if query_info is None or query_info["ddl"]:
+            self.result_cache.clear()
+        else:
+            self.result_cache.invalidate_tables(query_info["tables"])
+
+    def result_cache_stats(self):
+        return self.result_cache.stats() if self.result_cache is not None else None
+
     def get_db_schema(self, schema=None, sample_rows_in_table_info=3, indexes_in_table_info=False):
         """Get information about specified tables.
 
@@ -120,36 +326,103 @@ class SqlAlchemy:
             If `sample_rows_in_table_info`, the specified number of sample rows will be
             appended to each table description. This can increase performance as
             demonstrated in the paper.
+
+            The reflected tables are cached against `schema_fingerprint()`, so reflection and the
+            sample-row queries only run again after the catalog changes.
         """
+        tables = self._get_schema_tables(schema, sample_rows_in_table_info, indexes_in_table_info)
+        return "\n\n".join(self._render_table(table) for table in tables)
+
+    def get_relevant_db_schema(self, question, schema=None, sample_rows_in_table_info=3, indexes_in_table_info=False):
+        """Get information about the tables relevant to a question.
+
+            Tables are ranked with a BM25 index over table/column names, comments and
+            sample values, built once per schema fingerprint. Falls back to the full
+            schema when pruning is disabled or nothing matches the question.
+            See `helpers.schema_retrieval.schema_retrieval_settings` for the settings.
+        """
+        settings = schema_retrieval_settings()
+        tables = self._get_schema_tables(schema, sample_rows_in_table_info, indexes_in_table_info)
+        small_schema = len(tables) <= settings["top_k"] and \
+            all(len(table["columns"]) <= settings["max_columns"] for table in tables)
+        if not settings["enabled"] or small_schema:
+            return "\n\n".join(self._render_table(table) for table in tables)
+
+        index = self._get_schema_index(schema, sample_rows_in_table_info, indexes_in_table_info)
+        matches = index.search(question, settings["top_k"], settings["max_columns"], settings["min_score"])
+        if not matches:
+            return "\n\n".join(self._render_table(table) for table in tables)
+        return "\n\n".join(self._render_table(table, columns) for table, columns in matches)
+
+    def _get_schema_tables(self, schema, sample_rows_in_table_info, indexes_in_table_info):
+        cache_key = ("tables", self.schema_fingerprint(), schema, sample_rows_in_table_info, indexes_in_table_info)
+        tables = self.schema_cache.get(cache_key)
+        if tables is None:
+            tables = self._reflect_schema_tables(schema, sample_rows_in_table_info, indexes_in_table_info)
+            self.schema_cache.put(cache_key, tables)
+        return tables
+
+    def _get_schema_index(self, schema, sample_rows_in_table_info, indexes_in_table_info):
+        cache_key = ("index", self.schema_fingerprint(), schema, sample_rows_in_table_info, indexes_in_table_info)
+        index = self.schema_cache.get(cache_key)
+        if index is None:
+            index = SchemaIndex(self._get_schema_tables(schema, sample_rows_in_table_info, indexes_in_table_info))
+            self.schema_cache.put(cache_key, index)
+        return index
+
+    def _reflect_schema_tables(self, schema, sample_rows_in_table_info, indexes_in_table_info):
         engine = self.engine
         metadata = MetaData()
         metadata.reflect(bind=engine, schema=schema)
-        
+        inspector = inspect(engine)
+
         tables = []
         for table in metadata.sorted_tables:
             # Exclude tables with SQLite system prefix
             if table.name.startswith("sqlite_"):
                 continue
-                
+
             # Exclude columns with JSON/unsupported datatypes
-            for column in table.columns:
+            for column in list(table.columns):
                 if isinstance(column.type, NullType):
                     table._columns.remove(column)
-                    
-            # Generate table creation statement
-            create_table = str(CreateTable(table).compile(engine))
-            table_info = f"{create_table.rstrip()}"
-            
+
+            entry = {
+                "name": table.name,
+                "comment": table.comment,
+                "columns": [
+                    {"name": column.name, "type": str(column.type.compile(engine.dialect)), "comment": column.comment}
+                    for column in table.columns
+                ],
+                # Generate table creation statement
+                "ddl": str(CreateTable(table).compile(engine)).rstrip(),
+                "indexes": None,
+                "sample_rows": [],
+            }
+
             # Add indexes and sample rows
             if indexes_in_table_info:
-                indexes = engine.execute(f"PRAGMA index_list({table.name})").fetchall()
-                indexes_str = "\n".join([f"Index: {idx[1]}, Unique: {idx[2]}" for idx in indexes])
-                table_info += f"\nTable Indexes:\n{indexes_str}"
-            
+                indexes = inspector.get_indexes(table.name, schema=table.schema)
+                entry["indexes"] = "\n".join([f"Index: {idx['name']}, Unique: {idx['unique']}" for idx in indexes])
+
             if sample_rows_in_table_info > 0:
-                sample_rows_str = self.get_sample_rows(table, sample_rows_in_table_info)
-                table_info += f"\nSample Rows:\n{sample_rows_str}"
-            
-            tables.append(table_info)
-            
-        return "\n\n".join(tables)
+                entry["sample_rows"] = self._fetch_sample_rows(table, sample_rows_in_table_info)
+
+            tables.append(entry)
+
+        return tables
+
+    def _render_table(self, table, columns=None):
+        if columns is None or len(columns) == len(table["columns"]):
+            table_info = table["ddl"]
+            columns = None
+        else:
+            table_info = render_create_table(table["name"], [table["columns"][i] for i in columns]).rstrip()
+
+        if table["indexes"] is not None:
+            table_info += f"\nTable Indexes:\n{table['indexes']}"
+
+        if table["sample_rows"]:
+            table_info += f"\nSample Rows:\n{self._format_sample_rows(table['sample_rows'], columns)}"
+
+        return table_info
@@ -2,10 +2,24 @@ from sqlalchemy import create_engine, text, MetaData, inspect
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.schema import CreateTable
 from helpers.validation import is_safe_query
+from helpers.schema_cache import SchemaCache, is_ddl_statement
+from helpers.schema_retrieval import SchemaIndex, render_create_table, schema_retrieval_settings
+from helpers.result_cache import analyze_query, result_cache_from_env
+from helpers.result_stream import paginate_sql, has_star_projection, column_probe_sql
+from helpers.sql_budget import result_budget_settings, apply_row_limit, enforce_result_budget
+from helpers.bulk_load import ingestion_settings, detect_file_type, clean_table_name, iter_file_tables, bulk_load_sqlite
+from helpers.column_types import type_inference_settings, visible_table_names
+from helpers.index_advisor import index_advisor_settings, advise_indexes
+from helpers.export_stream import export_settings, write_xlsx
+from helpers.query_guard import query_guard_settings, check_query_plan, interruptible
+from helpers.arrow_fetch import adbc_sqlite, adbc_record_batches, rows_to_record_batches
 from sqlalchemy.orm import sessionmaker
 import pandas as pd
+import hashlib
 import os
 import re
+import time
+from contextlib import nullcontext
 from dotenv import load_dotenv
 from pathlib import Path
 
@@ -18,14 +32,20 @@ class SqlAlchemySQLite:
 
         :param db_path: Directory path for the SQLite database (default: current directory).
         :param db_name: Name of the SQLite database (default: 'students').
-        :param uploaded_file: The uploaded file (BytesIO) from Streamlit.
-        :param file_type: File type ('excel' or 'csv').
+        :param uploaded_file: The uploaded file (BytesIO) from Streamlit, or a list of uploaded files.
+        :param file_type: File type ('excel' or 'csv'); detected from the file names for a list.
         """
         self.current_directory = Path.cwd()
         self.db_path = db_path or os.getenv("SQLITE_DB_PATH", str(self.current_directory))
         self.db_name = db_name
         self.connection_string = f"sqlite:///{self.db_path}/{self.db_name}.db"
         self.table_name = self.db_name  # Table name is same as the database name
+        self.table_names = [self.table_name]
+        self.schema_cache = SchemaCache()
+        self._fingerprints = {}  # include_indexes -> (schema_version, DDL hash)
+        self.result_cache = result_cache_from_env()
+        self.sqlglot_dialect = "sqlite"
+        self.load_stats = None
 
         try:
             self.engine = create_engine(self.connection_string)
@@ -34,7 +54,11 @@ class SqlAlchemySQLite:
             raise ConnectionError(f"Failed to create SQLAlchemy engine: {e}")
 
         # Automatically load file if provided
-        if uploaded_file and file_type:
+        if isinstance(uploaded_file, list):
+            self.load_uploaded_files_to_sqlite([
+                (file, detect_file_type(file.name), file.name) for file in uploaded_file
+            ])
+        elif uploaded_file and file_type:
             self.load_uploaded_file_to_sqlite(uploaded_file, file_type)
 
     @staticmethod
@@ -54,49 +78,129 @@ class SqlAlchemySQLite:
 
     def load_uploaded_file_to_sqlite(self, file, file_type):
         """
-        Loads an uploaded Excel or CSV file directly into SQLite, using the database name as the table name.
+        Loads an uploaded Excel or CSV file into SQLite, using the database name as the table name.
+        Workbooks with several sheets get one table per sheet, named after the sheet.
 
-        :param file: Uploaded file object (BytesIO).
+        :param file: Uploaded file object (BytesIO) or file path.
         :param file_type: File type ('excel' or 'csv').
+        :return: Load statistics (see ``load_uploaded_files_to_sqlite``), or None on error.
+        """
+        return self.load_uploaded_files_to_sqlite([(file, file_type, getattr(file, "name", str(file)))])
+
+    def load_uploaded_files_to_sqlite(self, files):
+        """
+        Loads uploaded Excel and CSV files into SQLite, one table per CSV file and per sheet.
+
+        A single single-sheet file keeps the database name as its table name; otherwise tables
+        are named after the file and/or sheet. Files are read in chunks of INGEST_CHUNK_ROWS rows
+        and bulk-inserted (see ``helpers.bulk_load``); sheets of multi-sheet workbooks are parsed
+        in a process pool while already parsed sheets are being written. Load statistics are
+        kept in ``self.load_stats``.
+
+        :param files: List of (file object or path, file type, file name) tuples.
+        :return: Dict with total rows, elapsed seconds, rows per second and per-table statistics,
+                 or None on error.
         """
         try:
-            if file_type.lower() == 'excel':
-                df = pd.read_excel(file)
-            elif file_type.lower() == 'csv':
-                df = pd.read_csv(file)
-            else:
-                raise ValueError("Unsupported file type. Use 'excel' or 'csv'.")
-
-            # Clean column names
-            df = self.clean_column_names(df)
-
-            # Load data into SQLite
-            df.to_sql(self.table_name, con=self.engine, if_exists='replace', index=False)
-            print(f"Data successfully loaded into '{self.table_name}'.")
+            settings = ingestion_settings()
+            db_file = os.path.join(self.db_path, f"{self.db_name}.db")
+            started = time.perf_counter()
+            tables = {}
+            for file, file_type, file_name in files:
+                base_name = self.table_name if len(files) == 1 else clean_table_name(Path(file_name).stem)
+                for sheet_name, chunks in iter_file_tables(file, file_type, settings["chunk_rows"], settings["workers"]):
+                    if sheet_name is None:
+                        table_name = base_name
+                    elif len(files) == 1:
+                        table_name = clean_table_name(sheet_name)
+                    else:
+                        table_name = f"{base_name}_{clean_table_name(sheet_name)}"
+                    while table_name in tables:
+                        table_name += "_"
+
+                    # Clean column names chunk by chunk; the cleaning is deterministic
+                    chunks = (self.clean_column_names(chunk) for chunk in chunks)
+                    stats = bulk_load_sqlite(db_file, table_name, chunks, settings["cache_mb"], type_inference_settings())
+                    if stats is not None:
+                        tables[table_name] = stats
+                        print(f"Loaded '{table_name}': {stats['rows']} rows ({stats['rows_per_second']} rows/s).")
+
+            if not tables:
+                raise ValueError("The uploaded files contain no data.")
+            self.table_names = list(tables)
+            self.table_name = self.table_names[0]
+            self.schema_cache.invalidate()
+            if self.result_cache is not None:
+                self.result_cache.invalidate_tables(self.table_names)
+
+            rows = sum(stats["rows"] for stats in tables.values())
+            seconds = time.perf_counter() - started
+            self.load_stats = {
+                "rows": rows,
+                "seconds": round(seconds, 3),
+                "rows_per_second": round(rows / seconds) if seconds else rows,
+                "tables": tables,
+            }
+            print(
+                f"Data successfully loaded into {', '.join(self.table_names)}: {rows} rows "
+                f"in {self.load_stats['seconds']}s ({self.load_stats['rows_per_second']} rows/s)."
+            )
+            return self.load_stats
         except Exception as e:
             print(f"Error loading file into SQLite: {e}")
 
-    def run_query(self, query):
+    def run_query(self, query, connection=None, cancel_token=None):
         """
         Runs a given SQL query on the SQLite database without using a session.
 
+        Deterministic SELECTs are answered from the result cache when possible; DML and DDL
+        drop the cached results of the tables they touch. Other SELECTs pass the query guard
+        first (see ``helpers.query_guard``), and every statement runs under QUERY_TIMEOUT.
+
         :param query: SQL query string.
+        :param connection: Open connection to reuse, e.g. across a batch (default: a new one).
+        :param cancel_token: Optional CancelToken that interrupts the query when cancelled.
         :return: Query results as a Pandas DataFrame or success/error message.
         """
+        query_info = analyze_query(query, self.sqlglot_dialect) if self.result_cache is not None else None
+        if query_info and query_info["cacheable"]:
+            cached_result = self.result_cache.get(query_info["canonical"])
+            if cached_result is not None:
+                return cached_result
+
+        guard = query_guard_settings()
         try:
-            with self.engine.connect() as connection:
+            with self._connect(connection) as connection:
                 transaction = connection.begin()  # Begin transaction (for non-SELECT queries)
                 
                 try:
-                    result = connection.execute(text(query))
+                    blocked, warnings = check_query_plan(connection, query, "sqlite", guard)
+                    if blocked:
+                        transaction.rollback()
+                        print("Warning:", blocked)
+                        return blocked
 
-                    if query.strip().lower().startswith("select"):
-                        data = result.fetchall()
-                        return pd.DataFrame(data, columns=result.keys()) if data else "No data found."
+                    is_select = query.strip().lower().startswith("select")
+                    with interruptible(connection, "sqlite", guard["timeout"], cancel_token):
+                        result = connection.execute(text(query))
+                        data = result.fetchall() if is_select else None
+
+                    if is_select:
+                        transaction.commit()  # Ends the read transaction so a shared connection stays reusable
+                        query_result = pd.DataFrame(data, columns=result.keys()) if data else "No data found."
+                        if warnings and isinstance(query_result, pd.DataFrame):
+                            print("Warning:", *warnings)
+                            query_result.attrs["warnings"] = warnings
+                        if query_info and query_info["cacheable"]:
+                            self.result_cache.put(query_info["canonical"], query_result, query_info["tables"])
+                        return query_result
                     
                     else:
                         affected_rows = result.rowcount  # ✅ Get number of rows affected
                         transaction.commit()  # ✅ Commit changes for UPDATE/INSERT/DELETE
+                        if is_ddl_statement(query):
+                            self.schema_cache.invalidate()
+                        self._invalidate_results(query_info)
                         
                         if affected_rows == 0:
                             message = "Query executed successfully, but no rows were affected."
@@ -118,6 +222,168 @@ class SqlAlchemySQLite:
             print("Critical Error:", error_message)
             return error_message
 
+    def iter_query(self, query, chunk_size=10000, cancel_token=None):
+        """
+        Runs a SELECT and yields its result as DataFrames of at most `chunk_size` rows,
+        fetching through a server-side cursor instead of loading every row at once.
+
+        The query passes the query guard first; QUERY_TIMEOUT applies to each chunk.
+
+        :param query: SQL SELECT statement.
+        :param chunk_size: Rows per chunk (default: 10000).
+        :param cancel_token: Optional CancelToken that interrupts the query when cancelled.
+        :return: Generator of Pandas DataFrames.
+        """
+        guard = query_guard_settings()
+        with self.engine.connect() as connection:
+            self._check_stream_query(connection, query, guard)
+            with interruptible(connection, "sqlite", guard["timeout"], cancel_token) as deadline:
+                result = connection.execution_options(stream_results=True, yield_per=chunk_size).execute(text(query))
+                columns = list(result.keys())
+                for rows in result.partitions(chunk_size):
+                    yield pd.DataFrame(rows, columns=columns)
+                    deadline.reset()
+
+    def iter_arrow_batches(self, query, batch_size=65536, cancel_token=None):
+        """
+        Runs a SELECT and yields its result as Arrow record batches.
+
+        Uses the ADBC SQLite driver when installed, which produces Arrow data natively;
+        otherwise batches are built column by column from the cursor without pandas.
+        The query passes the query guard first; the fallback path also applies QUERY_TIMEOUT
+        to each batch and honours `cancel_token`.
+
+        :param query: SQL SELECT statement.
+        :param batch_size: Rows per batch for the fallback path (default: 65536).
+        :param cancel_token: Optional CancelToken that interrupts the query when cancelled.
+        :return: Generator of pyarrow RecordBatches.
+        """
+        guard = query_guard_settings()
+        with self.engine.connect() as connection:
+            self._check_stream_query(connection, query, guard)
+            if adbc_sqlite is None:
+                with interruptible(connection, "sqlite", guard["timeout"], cancel_token) as deadline:
+                    result = connection.execution_options(stream_results=True, yield_per=batch_size).execute(text(query))
+                    for batch in rows_to_record_batches(result, batch_size):
+                        yield batch
+                        deadline.reset()
+                return
+        yield from adbc_record_batches(adbc_sqlite.connect, f"{self.db_path}/{self.db_name}.db", query)
+
+    def _check_stream_query(self, connection, query, guard):
+        """
+        Applies the query guard before a streamed query; rejected plans raise ValueError.
+        """
+        blocked, warnings = check_query_plan(connection, query, "sqlite", guard)
+        if blocked:
+            raise ValueError(blocked)
+        if warnings:
+            print("Warning:", *warnings)
+
+    def run_query_preview(self, query, cancel_token=None):
+        """
+        Runs a query within the result budget (see ``helpers.sql_budget``): SELECTs get a
+        LIMIT added or clamped before execution, and oversized results are trimmed.
+
+        :param query: SQL query string.
+        :param cancel_token: Optional CancelToken that interrupts the query when cancelled.
+        :return: Tuple of (query result, whether the result was truncated).
+        """
+        budget = result_budget_settings()
+        limited_query, _ = apply_row_limit(query, budget["max_rows"], self.sqlglot_dialect)
+        return enforce_result_budget(self.run_query(limited_query, cancel_token=cancel_token),
+                                     budget["max_rows"], budget["max_bytes"])
+
+    def run_query_page(self, query, offset=0, page_size=100, cancel_token=None):
+        """
+        Runs one page of a SELECT.
+
+        :param query: SQL SELECT statement.
+        :param offset: Number of rows to skip (default: 0).
+        :param page_size: Rows per page (default: 100).
+        :param cancel_token: Optional CancelToken that interrupts the query when cancelled.
+        :return: Tuple of (page DataFrame or message, whether more rows follow).
+        """
+        columns = None
+        if has_star_projection(query, self.sqlglot_dialect):
+            # Pages are ordered by every output column, which the query text does not list
+            probe = self.run_query(column_probe_sql(query, self.sqlglot_dialect), cancel_token=cancel_token)
+            if not isinstance(probe, pd.DataFrame):
+                return probe, False
+            columns = list(probe.columns)
+        try:
+            page_query = paginate_sql(query, offset, page_size + 1, self.sqlglot_dialect, columns=columns)
+        except ValueError as e:
+            return f"Query execution failed: {e}", False
+        page = self.run_query(page_query, cancel_token=cancel_token)
+        if not isinstance(page, pd.DataFrame):
+            return page, False
+        return page.iloc[:page_size].reset_index(drop=True), len(page) > page_size
+
+    def _connect(self, connection=None):
+        """
+        Returns a context manager yielding the given connection, or a new one that is
+        closed on exit.
+        """
+        return nullcontext(connection) if connection is not None else self.engine.connect()
+
+    def _invalidate_results(self, query_info):
+        """
+        Drops cached results made stale by a statement that was just committed.
+        """
+        if self.result_cache is None:
+            return
+        if query_info is None or query_info["ddl"]:
+            self.result_cache.clear()
+        else:
+            self.result_cache.invalidate_tables(query_info["tables"])
+
+    def result_cache_stats(self):
+        """
+        Returns hit/miss statistics of the query result cache.
+
+        :return: Dictionary of cache counters, or None when the cache is disabled.
+        """
+        return self.result_cache.stats() if self.result_cache is not None else None
+
+    def pool_stats(self):
+        """
+        Returns the connection pool status; SQLite files have no read replicas.
+
+        :return: Dictionary shaped like `SqlAlchemy.pool_stats()`.
+        """
+        return {"primary": self.engine.pool.status(), "replicas": None}
+
+    def dispose(self):
+        """
+        Closes the engine's pooled connections and file handles.
+        """
+        self.engine.dispose()
+
+    def advise_indexes(self, queries, apply=True):
+        """
+        Builds indexes for the filter, join and group-by columns of executed queries that
+        currently scan whole tables (see ``helpers.index_advisor``).
+
+        :param queries: Executed SQL statements, e.g. from the query history.
+        :param apply: Create the indexes (default: True); otherwise only report candidates.
+        :return: Report with candidates, created indexes and latency before and after.
+        """
+        settings = index_advisor_settings()
+        return advise_indexes(self.engine, queries, apply=apply,
+                              max_indexes=settings["max_indexes"], timing_runs=settings["timing_runs"],
+                              min_rows=settings["min_rows"])
+
+    def get_table_names(self):
+        """
+        Returns the user-facing tables, with dictionary-encoded tables listed by their view
+        name instead of their internal data and lookup tables.
+
+        :return: Sorted list of table names.
+        """
+        inspector = inspect(self.engine)
+        return visible_table_names(inspector.get_table_names(), inspector.get_view_names())
+
     def show_db_schema(self):
         """
         Retrieves and returns the database schema information.
@@ -126,7 +392,7 @@ class SqlAlchemySQLite:
         """
         try:
             inspector = inspect(self.engine)
-            tables = inspector.get_table_names()
+            tables = self.get_table_names()
             schema_info = ""
             for table in tables:
                 columns = inspector.get_columns(table)
@@ -146,7 +412,7 @@ class SqlAlchemySQLite:
         """
         try:
             inspector = inspect(self.engine)
-            tables = inspector.get_table_names()
+            tables = self.get_table_names()
             schema_info = ""
 
             for table in tables:
@@ -164,58 +430,207 @@ class SqlAlchemySQLite:
         except Exception as e:
             return f"**Error retrieving schema:** `{e}`"
 
+    def schema_fingerprint(self, include_indexes=False):
+        """
+        Returns a cheap fingerprint of the database structure.
+
+        Hashes the table and view DDL in ``sqlite_master``, so it changes whenever the rendered
+        schema could change but not when only indexes are created or dropped, e.g. by the index
+        advisor. The hash is recomputed only after SQLite bumped ``PRAGMA schema_version``,
+        which every DDL statement does.
+
+        :param include_indexes: Whether index DDL is part of the fingerprint (default: False).
+        :return: Fingerprint string.
+        """
+        with self.engine.connect() as connection:
+            schema_version = connection.execute(text("PRAGMA schema_version")).scalar()
+            cached = self._fingerprints.get(include_indexes)
+            if cached is None or cached[0] != schema_version:
+                types = "'table', 'view', 'index'" if include_indexes else "'table', 'view'"
+                rows = connection.execute(text(
+                    f"SELECT type, name, sql FROM sqlite_master WHERE type IN ({types}) ORDER BY type, name")).fetchall()
+                cached = (schema_version, hashlib.sha256(repr(rows).encode()).hexdigest()[:16])
+                self._fingerprints[include_indexes] = cached
+        return f"{self.connection_string}:{cached[1]}"
+
+    def schema_cache_stats(self):
+        """
+        Returns hit/miss statistics of the schema cache.
+
+        :return: Dictionary of cache counters.
+        """
+        return self.schema_cache.stats()
+
+    def get_sample_rows(self, table_name, sample_row_limit):
+        """
+        Returns the first rows of a table as tab-separated text.
+
+        :param table_name: Name of the table to sample.
+        :param sample_row_limit: Number of rows to return.
+        :return: Sample rows as a string.
+        """
+        return self._format_sample_rows(self._fetch_sample_rows(table_name, sample_row_limit))
+
+    def _fetch_sample_rows(self, table_name, sample_row_limit):
+        with self.engine.connect() as connection:
+            return [tuple(row) for row in connection.execute(
+                text(f'SELECT * FROM "{table_name}" LIMIT {int(sample_row_limit)}')).fetchall()]
+
+    @staticmethod
+    def _format_sample_rows(rows, columns=None):
+        return "\n".join(
+            "\t".join(str(row[i])[:100] for i in (columns if columns is not None else range(len(row))))
+            for row in rows
+        )
+
     def get_db_schema(self, sample_rows=3, include_indexes=False):
         """
         Retrieves detailed database schema, including table structures and sample data.
 
+        The reflected tables are cached against ``schema_fingerprint()`` so repeated calls only
+        cost a single PRAGMA until the structure changes or a new file is uploaded.
+
         :param sample_rows: Number of sample rows to display (default: 3).
         :param include_indexes: Whether to include index information (default: False).
         :return: Database schema as a formatted string.
         """
         try:
-            metadata = MetaData()
-            metadata.reflect(bind=self.engine)
-            schema_info = ""
-            
-            for table in metadata.sorted_tables:
-                if table.name.startswith("sqlite_"):
-                    continue
-                
-                create_table_stmt = str(CreateTable(table).compile(self.engine))
-                schema_info += create_table_stmt + "\n"
-                
-                if include_indexes:
-                    indexes = self.engine.execute(f"PRAGMA index_list({table.name})").fetchall()
-                    schema_info += "Indexes:\n" + "\n".join([f"  {idx[1]} (Unique: {idx[2]})" for idx in indexes]) + "\n"
-                
-                if sample_rows > 0:
-                    schema_info += "Sample Rows:\n" + str(self.get_sample_rows(table.name, sample_rows)) + "\n"
-            
-            return schema_info
+            return "".join(self._render_table(table) for table in self._get_schema_tables(sample_rows, include_indexes))
         except Exception as e:
             return f"Error retrieving DB schema: {e}"
-        
-    def export_to_excel(self, output_path=None):
+
+    def get_relevant_db_schema(self, question, sample_rows=3, include_indexes=False):
+        """
+        Retrieves only the part of the schema relevant to a question.
+
+        Tables are ranked with a BM25 index over table/column names, comments and sample
+        values (built once per schema fingerprint). Falls back to the full schema when
+        pruning is disabled or nothing in the schema matches the question.
+        See ``helpers.schema_retrieval.schema_retrieval_settings`` for the settings.
+
+        :param question: Natural language question.
+        :param sample_rows: Number of sample rows to display (default: 3).
+        :param include_indexes: Whether to include index information (default: False).
+        :return: Database schema as a formatted string.
+        """
+        try:
+            settings = schema_retrieval_settings()
+            tables = self._get_schema_tables(sample_rows, include_indexes)
+            small_schema = len(tables) <= settings["top_k"] and \
+                all(len(table["columns"]) <= settings["max_columns"] for table in tables)
+            if not settings["enabled"] or small_schema:
+                return "".join(self._render_table(table) for table in tables)
+
+            index = self._get_schema_index(sample_rows, include_indexes)
+            matches = index.search(question, settings["top_k"], settings["max_columns"], settings["min_score"])
+            if not matches:
+                return "".join(self._render_table(table) for table in tables)
+            return "".join(self._render_table(table, columns) for table, columns in matches)
+        except Exception as e:
+            return f"Error retrieving DB schema: {e}"
+
+    def _get_schema_tables(self, sample_rows, include_indexes):
+        cache_key = ("tables", self.schema_fingerprint(include_indexes), sample_rows, include_indexes)
+        tables = self.schema_cache.get(cache_key)
+        if tables is None:
+            tables = self._reflect_schema_tables(sample_rows, include_indexes)
+            self.schema_cache.put(cache_key, tables)
+        return tables
+
+    def _get_schema_index(self, sample_rows, include_indexes):
+        cache_key = ("index", self.schema_fingerprint(include_indexes), sample_rows, include_indexes)
+        index = self.schema_cache.get(cache_key)
+        if index is None:
+            index = SchemaIndex(self._get_schema_tables(sample_rows, include_indexes))
+            self.schema_cache.put(cache_key, index)
+        return index
+
+    def _reflect_schema_tables(self, sample_rows, include_indexes):
+        metadata = MetaData()
+        metadata.reflect(bind=self.engine, views=True)
+        visible_tables = set(self.get_table_names())
+        tables = []
+
+        for table in metadata.sorted_tables:
+            if table.name not in visible_tables:
+                continue
+
+            entry = {
+                "name": table.name,
+                "comment": table.comment,
+                "columns": [
+                    {"name": column.name, "type": str(column.type.compile(self.engine.dialect)), "comment": column.comment}
+                    for column in table.columns
+                ],
+                "ddl": str(CreateTable(table).compile(self.engine)),
+                "indexes": None,
+                "sample_rows": [],
+            }
+
+            if include_indexes:
+                with self.engine.connect() as connection:
+                    indexes = connection.execute(text(f'PRAGMA index_list("{table.name}")')).fetchall()
+                entry["indexes"] = "\n".join([f"  {idx[1]} (Unique: {idx[2]})" for idx in indexes])
+
+            if sample_rows > 0:
+                entry["sample_rows"] = self._fetch_sample_rows(table.name, sample_rows)
+
+            tables.append(entry)
+
+        return tables
+
+    def _render_table(self, table, columns=None):
+        """
+        Renders a reflected table entry, optionally limited to the given column positions.
+        """
+        if columns is None or len(columns) == len(table["columns"]):
+            schema_info = table["ddl"] + "\n"
+            columns = None
+        else:
+            schema_info = render_create_table(table["name"], [table["columns"][i] for i in columns]) + "\n"
+
+        if table["indexes"] is not None:
+            schema_info += "Indexes:\n" + table["indexes"] + "\n"
+
+        if table["sample_rows"]:
+            schema_info += "Sample Rows:\n" + self._format_sample_rows(table["sample_rows"], columns) + "\n"
+
+        return schema_info
+
+    def export_to_excel(self, output_path=None, query=None):
         """
         Exports the SQLite database into an Excel file with each table as a separate sheet.
 
+        Tables are read in chunks and written in xlsxwriter's constant_memory mode, so memory
+        use does not grow with the size of the database.
+
         :param output_path: The directory where the Excel file will be saved (default: current directory).
+        :param query: SELECT whose result is exported instead of the whole database (default: None).
         :return: Path to the saved Excel file or an error message.
         """
         try:
             output_path = output_path or self.db_path
             excel_file = os.path.join(output_path, f"{self.db_name}.xlsx")
-            inspector = inspect(self.engine)
-            table_names = [table for table in inspector.get_table_names() if not table.startswith("sqlite_")]
+            export_tables = self.get_export_tables(query)
             
-            if not table_names:
+            if not export_tables:
                 return "No tables found in the database to export."
             
-            with pd.ExcelWriter(excel_file, engine='xlsxwriter') as writer:
-                for table in table_names:
-                    df = pd.read_sql(f"SELECT * FROM {table}", self.engine)
-                    df.to_excel(writer, sheet_name=table, index=False)
+            chunk_rows = export_settings()["chunk_rows"]
+            write_xlsx(excel_file, ((name, self.iter_query(sql, chunk_size=chunk_rows)) for name, sql in export_tables))
             
             return f"Database successfully exported to {excel_file}"        
         except Exception as e:
-            return f"Error exporting database to Excel: {e}"
\ No newline at end of file
+            return f"Error exporting database to Excel: {e}"
+
+    def get_export_tables(self, query=None):
+        """
+        Returns what an export contains: every user-facing table, or the result of one query.
+
+        :param query: SELECT whose result is exported instead of the tables (default: None).
+        :return: List of (sheet or file name, SELECT statement) pairs.
+        """
+        if query:
+            return [("result", query)]
+        quote = self.engine.dialect.identifier_preparer.quote
+        return [(table, f"SELECT * FROM {quote(table)}") for table in self.get_table_names()]
\ No newline at end of file
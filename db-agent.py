@@ -10,6 +10,7 @@ from helpers.css_settings import *
 from helpers.dp_charts import *
 from helpers.supported_models import *
 import logging
+import time
 import os
 from dotenv import load_dotenv
 
@@ -46,7 +47,7 @@ if "config" not in st.session_state:
 # Handle File Upload
 with st.sidebar:
     with st.expander("Import Data From Excel or CSV"):
-        uploaded_file = st.file_uploader("Select Excel or CSV file", type=["xlsx", "xls", "csv"], key="file_upload")
+        uploaded_file = st.file_uploader("Select Excel or CSV files", type=["xlsx", "xls", "csv"], key="file_upload", accept_multiple_files=True)
         
         if uploaded_file:
             db_options = ["sqlite"]
@@ -69,9 +70,9 @@ with st.sidebar:
 def get_sqlalchemy_instance(uploaded_file):
     if uploaded_file:
         st.session_state["db_class"] = "sqlite"
+        # Each CSV file and each Excel sheet becomes a table; file types come from the file names
         return SqlAlchemySQLite(
             uploaded_file=uploaded_file, 
-            file_type="excel", 
             db_path=st.session_state.config["SQLITE_DB_PATH"], 
             db_name=st.session_state.config["SQLITE_DB_NAME"]
         )
@@ -81,6 +82,8 @@ def get_sqlalchemy_instance(uploaded_file):
 
 
 sql_alchemy = get_sqlalchemy_instance(uploaded_file)
+if uploaded_file and sql_alchemy.load_stats:
+    st.caption(f"Loaded {sql_alchemy.load_stats['rows']} rows in {sql_alchemy.load_stats['seconds']}s ({sql_alchemy.load_stats['rows_per_second']} rows/s).")
 
 with st.sidebar:
     with st.expander("Database Configuration"):
@@ -142,10 +145,24 @@ with st.sidebar:
         schema_info = sql_alchemy.show_db_schema()
         st.text(schema_info)
 
+    if isinstance(sql_alchemy, SqlAlchemySQLite):
+        with st.expander("Index Advisor"):
+            if st.button("Build indexes from query history"):
+                with st.spinner("Analyzing executed queries"):
+                    report = sql_alchemy.advise_indexes(get_query_history_store().executed_queries())
+                if report["created"]:
+                    st.success(f"Created {len(report['created'])} index(es); the affected queries went from "
+                               f"{report['total_before_ms']} ms to {report['total_after_ms']} ms.")
+                else:
+                    st.info("No beneficial indexes found.")
+                st.json(report)
+
     with st.expander("Export Data as Excel file"):
         output_path = st.text_input("Select Output Path:", value=str(Path.cwd()))
+        last_query_only = st.checkbox("Only export the last query's result", disabled=not st.session_state["query_history"])
         if st.button("Export"):
-            result = sql_alchemy.export_to_excel(output_path)
+            query = st.session_state["query_history"][-1][1] if last_query_only else None
+            result = sql_alchemy.export_to_excel(output_path, query=query)
             st.success(result)
 
 # Natural Language Query Input
@@ -156,6 +173,7 @@ if st.button("▶️  Execute"):
         model_name = st.session_state.config.get("MODEL")
         backend = st.session_state.config.get("LLM_BACKEND")
 
+        started = time.perf_counter()
         with st.spinner(f"Generating SQL Query using {model_name}"):
             inference_client = LLMClientFactory.get_client(
                 backend=backend,
@@ -163,10 +181,12 @@ if st.button("▶️  Execute"):
                 model_name=model_name,
                 api_key=st.session_state.config.get("LLM_API_KEY")
             )
-            schema_info_detail = sql_alchemy.get_db_schema
-            sql_query = inference_client.generate_sql(nl_query, schema_info_detail)  # ✅ Moved here
+            schema_info_detail = sql_alchemy.get_relevant_db_schema(nl_query)
+            sql_query = inference_client.generate_sql(
+                nl_query, schema_info_detail, schema_version=sql_alchemy.schema_fingerprint())  # ✅ Moved here
 
         if not sql_query:  # ✅ Check if query generation failed
+            record_query(nl_query, None, backend, model_name, "error", error="SQL Query generation failed")
             st.error("SQL Query generation failed. Please try again.")
             st.stop()
 
@@ -177,20 +197,31 @@ if st.button("▶️  Execute"):
         if "query_history" not in st.session_state:
             st.session_state.query_history = []
         st.session_state.query_history.append((nl_query, sql_query))
-        save_query_history(st.session_state["query_history"])
 
         with st.spinner(f"Executing SQL on {st.session_state.config['DB_DRIVER']}"):
-            query_result = sql_alchemy.run_query(sql_query)
-
-            if isinstance(query_result, str) and "error" in query_result.lower():
+            query_result, truncated = sql_alchemy.run_query_preview(sql_query)
+            failed = isinstance(query_result, str) and \
+                query_result.startswith(("Query execution failed", "An error occurred", "Query blocked"))
+            record_query(
+                nl_query, sql_query, backend, model_name, "error" if failed else "ok",
+                (time.perf_counter() - started) * 1000,
+                len(query_result) if isinstance(query_result, pd.DataFrame) else None,
+                query_result if failed else None)
+
+            if failed:
                 st.error(f"SQL Execution Error: {query_result}")
             else:
                 st.success("Query executed successfully!")
+                if isinstance(query_result, pd.DataFrame):
+                    for warning in query_result.attrs.get("warnings", []):
+                        st.warning(warning)
 
                 if isinstance(query_result, pd.DataFrame):
                     st.subheader("Query Results")
                     if not query_result.empty:
                         st.dataframe(query_result)
+                        if truncated:
+                            st.info(f"Showing the first {len(query_result)} rows. Export the data or refine the question to see more.")
                     else:
                         st.info("Query executed successfully, but no data was returned.")
 
@@ -0,0 +1,179 @@
+import io
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# ADBC drivers return Arrow data natively; they are optional and used when installed
+try:
+    import adbc_driver_sqlite.dbapi as adbc_sqlite
+except ImportError:
+    adbc_sqlite = None
+
+try:
+    import adbc_driver_postgresql.dbapi as adbc_postgresql
+except ImportError:
+    adbc_postgresql = None
+
+ARROW_FORMATS = {
+    "arrow": "application/vnd.apache.arrow.stream",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+
+def negotiate_arrow_format(accept):
+    """
+    Returns "arrow" or "parquet" when the Accept header asks for one of them, else None.
+    """
+    accept = (accept or "").lower()
+    for result_format, media_type in ARROW_FORMATS.items():
+        if media_type in accept:
+            return result_format
+    if "application/x-parquet" in accept:
+        return "parquet"
+    return None
+
+
+def adbc_record_batches(connect, uri, query):
+    """
+    Runs a query through an ADBC driver and yields its record batches.
+
+    :param connect: The driver's dbapi ``connect`` function.
+    :param uri: Database URI or SQLite file path.
+    :param query: SQL SELECT statement.
+    """
+    with connect(uri) as connection:
+        with connection.cursor() as cursor:
+            cursor.execute(query)
+            for batch in cursor.fetch_record_batch():
+                yield batch
+
+
+def rows_to_record_batches(result, batch_size=65536):
+    """
+    Builds Arrow record batches column by column from a SQLAlchemy result, without pandas.
+
+    Column types are inferred from the first batch; columns that were entirely NULL in it
+    become strings. A later value that does not fit its column's type widens the type
+    (integers to doubles, anything else to strings) instead of being truncated, so later
+    batches may carry a wider schema than the first.
+    """
+    columns = list(result.keys())
+    types = [None] * len(columns)
+    empty = True
+    for rows in result.partitions(batch_size):
+        empty = False
+        values = list(zip(*rows)) if rows else [[] for _ in columns]
+        arrays = [_to_array(column, arrow_type) for column, arrow_type in zip(values, types)]
+        types = [array.type for array in arrays]
+        yield pa.RecordBatch.from_arrays(arrays, names=columns)
+
+    if empty:
+        # Empty result: still emit the column names so readers see a schema
+        schema = pa.schema([pa.field(name, pa.string()) for name in columns])
+        yield pa.RecordBatch.from_arrays([pa.array([], type=pa.string()) for _ in columns], schema=schema)
+
+
+def _to_array(values, arrow_type=None):
+    # Infer from the values themselves, then cast safely: pa.array(values, type=...) truncates 2.5 to 2
+    try:
+        array = pa.array(values, from_pandas=False)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        return _to_string_array(values)  # Mixed types, e.g. 1 and 'x'
+    if arrow_type is None:
+        return array.cast(pa.string()) if pa.types.is_null(array.type) else array
+    if array.type == arrow_type:
+        return array
+    try:
+        return array.cast(arrow_type, safe=True)
+    except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+        pass
+    if _is_number(arrow_type) and _is_number(array.type):
+        try:
+            return array.cast(pa.float64(), safe=True)
+        except pa.ArrowInvalid:
+            pass  # Integers beyond 2**53 do not fit a double exactly
+    return _to_string_array(values)
+
+
+def _is_number(arrow_type):
+    return pa.types.is_integer(arrow_type) or pa.types.is_floating(arrow_type)
+
+
+def _to_string_array(values):
+    return pa.array([None if value is None else str(value) for value in values], type=pa.string())
+
+
+def _conform(batch, schema):
+    """
+    Casts a batch to the schema a stream was started with, which writers cannot change.
+
+    :raises ValueError: If a column widened beyond what that schema can hold without loss.
+    """
+    if batch.schema.equals(schema):
+        return batch
+    try:
+        return batch.cast(schema, safe=True)
+    except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+        changed = [f"{field.name} ({field.type} -> {batch.schema.field(field.name).type})"
+                   for field in schema if batch.schema.field(field.name).type != field.type]
+        raise ValueError(f"Column types changed after the first batch was sent: {', '.join(changed)}. "
+                         "Cast these columns in the query, e.g. CAST(column AS REAL).")
+
+
+def iter_arrow_ipc(batches):
+    """
+    Serializes record batches as an Arrow IPC stream, yielding bytes as each batch is written.
+    """
+    sink = ChunkSink()
+    writer = None
+    for batch in batches:
+        if writer is None:
+            schema = batch.schema
+            writer = pa.ipc.new_stream(sink, schema)
+        writer.write_batch(_conform(batch, schema))
+        yield sink.drain()
+    if writer is not None:
+        writer.close()
+        yield sink.drain()
+
+
+def iter_parquet(batches):
+    """
+    Serializes record batches as a Parquet file, yielding bytes as each row group is written.
+    """
+    sink = ChunkSink()
+    writer = None
+    for batch in batches:
+        if writer is None:
+            schema = batch.schema
+            writer = pq.ParquetWriter(sink, schema)
+        writer.write_batch(_conform(batch, schema))
+        yield sink.drain()
+    if writer is not None:
+        writer.close()
+        yield sink.drain()
+
+
+class ChunkSink(io.RawIOBase):
+    """
+    Write-only file object that hands written bytes back to the caller in chunks.
+    """
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self):
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
@@ -0,0 +1,262 @@
+import io
+import os
+import re
+import sqlite3
+import time
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from helpers.column_types import INTEGER, infer_column_types, convert_chunk, encode_dictionary
+
+# calamine (Rust) parses workbooks several times faster than openpyxl; it is optional
+try:
+    import python_calamine  # noqa: F401
+    EXCEL_ENGINE = "calamine"
+except ImportError:
+    EXCEL_ENGINE = None  # pandas default: openpyxl in read-only mode for .xlsx
+
+# Values sqlite3 binds natively; object columns holding anything else are stored as text
+SQLITE_NATIVE_TYPES = {"string", "empty", "integer", "floating", "mixed-integer-float", "boolean", "bytes"}
+
+
+def ingestion_settings():
+    """
+    Reads bulk ingestion settings from the environment.
+
+    INGEST_CHUNK_ROWS: Rows read and inserted per chunk (default: 50000).
+    INGEST_CACHE_MB: SQLite page cache used while loading (default: 256).
+    INGEST_WORKERS: Processes parsing Excel sheets in parallel (default: CPU count, at most 4).
+    """
+    return {
+        "chunk_rows": int(os.getenv("INGEST_CHUNK_ROWS", 50000)),
+        "cache_mb": int(os.getenv("INGEST_CACHE_MB", 256)),
+        "workers": int(os.getenv("INGEST_WORKERS", min(os.cpu_count() or 1, 4))),
+    }
+
+
+def detect_file_type(file_name):
+    """
+    Returns 'excel' or 'csv' based on the file extension, or None if unsupported.
+    """
+    extension = str(file_name).rsplit(".", 1)[-1].lower()
+    return "excel" if extension in ["xls", "xlsx", "xlsm"] else "csv" if extension == "csv" else None
+
+
+def clean_table_name(name):
+    """
+    Turns a file or sheet name into an SQL-friendly table name.
+    """
+    name = re.sub(r'[^a-zA-Z0-9_]', '', str(name).strip().replace(' ', '_').replace('-', '_')).lower()
+    return name if name and not name[0].isdigit() else f"t_{name}"
+
+
+def iter_file_tables(file, file_type, chunk_rows, workers=1):
+    """
+    Yields the tables contained in an uploaded file as (sheet name, chunk iterator) pairs.
+
+    CSV files and single-sheet workbooks yield one pair with a sheet name of None. Sheets of
+    larger workbooks are parsed in a pool of `workers` processes and yielded as soon as each
+    one is ready, so the caller can write one sheet while the others are still being parsed.
+
+    :param file: Path or file object.
+    :param file_type: File type ('excel' or 'csv').
+    :param chunk_rows: Rows per chunk.
+    :param workers: Processes used to parse Excel sheets.
+    """
+    if file_type.lower() == 'csv':
+        yield None, pd.read_csv(file, chunksize=chunk_rows)
+        return
+    if file_type.lower() != 'excel':
+        raise ValueError("Unsupported file type. Use 'excel' or 'csv'.")
+
+    # Worker processes need something picklable: a path, or the raw bytes of an in-memory upload
+    source = file if isinstance(file, (str, os.PathLike)) else file.read()
+    with pd.ExcelFile(_excel_source(source), engine=EXCEL_ENGINE) as workbook:
+        sheet_names = workbook.sheet_names
+        if len(sheet_names) == 1 or workers <= 1:
+            for sheet_name in sheet_names:
+                label = sheet_name if len(sheet_names) > 1 else None
+                yield label, _frame_chunks(workbook.parse(sheet_name), chunk_rows)
+            return
+
+    with ProcessPoolExecutor(max_workers=min(workers, len(sheet_names))) as pool:
+        futures = {pool.submit(_read_excel_sheet, source, sheet_name): sheet_name for sheet_name in sheet_names}
+        for future in as_completed(futures):
+            yield futures[future], _frame_chunks(future.result(), chunk_rows)
+
+
+def _excel_source(source):
+    return io.BytesIO(source) if isinstance(source, bytes) else source
+
+
+def _read_excel_sheet(source, sheet_name):
+    return pd.read_excel(_excel_source(source), sheet_name=sheet_name, engine=EXCEL_ENGINE)
+
+
+def _frame_chunks(df, chunk_rows):
+    for start in range(0, max(len(df), 1), chunk_rows):
+        yield df.iloc[start:start + chunk_rows]
+
+
+def bulk_load_sqlite(db_file, table_name, chunks, cache_mb=256, typing=None):
+    """
+    Replaces `table_name` with the rows of `chunks` in a single transaction.
+
+    The load runs on a dedicated connection with load-time pragmas (in-memory journal
+    unless the database is in WAL mode, synchronous off, a large page cache) and multi-row
+    `executemany` inserts. Indexes that existed on the table are dropped with it and
+    rebuilt once all rows are in.
+
+    With `typing` settings (see ``helpers.column_types``), column types are inferred from
+    the first chunk. Dictionary-encoded columns are then stored as integer codes in
+    ``<table>__data`` with one ``<table>__<column>`` lookup table each, and `table_name`
+    becomes a view joining them back, so queries see the original values. Such a view
+    cannot be written to, which is why dictionary encoding is off by default.
+
+    :param db_file: Path of the SQLite database file.
+    :param table_name: Table to (re)create.
+    :param chunks: Iterable of DataFrames with identical columns.
+    :param cache_mb: Page cache size for the load, in MB.
+    :param typing: Dict from `type_inference_settings()`, or None to use pandas' types.
+    :return: Dict with rows loaded, elapsed seconds, rows per second and column types, or
+             None if the chunks had no columns (e.g. a blank sheet) and nothing was written.
+    """
+    started = time.perf_counter()
+    rows = 0
+    insert_statement = None
+    column_types = None
+    dictionaries = {}
+    connection = sqlite3.connect(db_file, isolation_level=None)
+    try:
+        if connection.execute("PRAGMA journal_mode").fetchone()[0].lower() != "wal":
+            connection.execute("PRAGMA journal_mode=MEMORY")
+        connection.execute("PRAGMA synchronous=OFF")
+        connection.execute(f"PRAGMA cache_size=-{int(cache_mb) * 1024}")
+        connection.execute("PRAGMA temp_store=MEMORY")
+
+        data_table = f"{table_name}__data"
+        index_statements = [row[0] for row in connection.execute(
+            "SELECT sql FROM sqlite_master WHERE type = 'index' AND tbl_name IN (?, ?) AND sql IS NOT NULL",
+            (table_name, data_table),
+        )]
+
+        connection.execute("BEGIN")
+        try:
+            for chunk in chunks:
+                if len(chunk.columns) == 0:
+                    break  # Blank sheet
+                if insert_statement is None:
+                    _drop_relation(connection, table_name)
+                    if typing is not None and typing["enabled"]:
+                        column_types = infer_column_types(chunk, typing)
+                        dictionaries = {column: {} for column, column_type in column_types.items() if column_type["dictionary"]}
+                    insert_statement = _create_relation(connection, table_name, chunk, column_types)
+                if chunk.empty:
+                    continue
+                if column_types is not None:
+                    chunk = convert_chunk(chunk, column_types)
+                    for column, mapping in dictionaries.items():
+                        added = encode_dictionary(chunk, column, mapping)
+                        connection.executemany(
+                            f"INSERT INTO {_quote(f'{table_name}__{column}')} (id, value) VALUES (?, ?)", added)
+                connection.executemany(insert_statement, _chunk_rows(chunk))
+                rows += len(chunk)
+
+            # Build indexes once, after the data is in, instead of maintaining them per row
+            for statement in index_statements:
+                try:
+                    connection.execute(statement)
+                except sqlite3.OperationalError:
+                    pass  # Indexed column or table no longer exists in the new layout
+            connection.execute("COMMIT")
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
+    finally:
+        connection.close()
+
+    if insert_statement is None:
+        return None
+    seconds = time.perf_counter() - started
+    return {
+        "rows": rows,
+        "seconds": round(seconds, 3),
+        "rows_per_second": round(rows / seconds) if seconds else rows,
+        "column_types": {
+            column: column_type["type"] + (" (dictionary)" if column_type["dictionary"] else "")
+            for column, column_type in (column_types or {}).items()
+        },
+    }
+
+
+def _quote(name):
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _drop_relation(connection, table_name):
+    """
+    Drops a table, or a dictionary-encoded view together with its data and lookup tables.
+    """
+    kind = connection.execute("SELECT type FROM sqlite_master WHERE name = ?", (table_name,)).fetchone()
+    if kind is None:
+        return
+    if kind[0] == "view":
+        connection.execute(f"DROP VIEW {_quote(table_name)}")
+        prefix = f"{table_name}__"
+        for (name,) in connection.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'table' AND substr(name, 1, ?) = ?",
+                (len(prefix), prefix)).fetchall():
+            connection.execute(f"DROP TABLE {_quote(name)}")
+    else:
+        connection.execute(f"DROP TABLE {_quote(table_name)}")
+
+
+def _create_relation(connection, table_name, chunk, column_types):
+    """
+    Creates the table (or data table, lookup tables and view) for a load and returns the
+    INSERT statement for its rows.
+    """
+    if column_types is None:
+        connection.execute(pd.io.sql.get_schema(chunk, table_name))
+        return f"INSERT INTO {_quote(table_name)} VALUES ({', '.join('?' * len(chunk.columns))})"
+
+    encoded = [column for column, column_type in column_types.items() if column_type["dictionary"]]
+    target = f"{table_name}__data" if encoded else table_name
+    column_lines = ",\n  ".join(
+        f"{_quote(column)} {INTEGER if column_type['dictionary'] else column_type['type']}"
+        for column, column_type in column_types.items()
+    )
+    connection.execute(f"CREATE TABLE {_quote(target)} (\n  {column_lines}\n)")
+
+    if encoded:
+        select_list, joins = [], []
+        for position, (column, column_type) in enumerate(column_types.items()):
+            if column_type["dictionary"]:
+                lookup = _quote(f"{table_name}__{column}")
+                connection.execute(f"CREATE TABLE {lookup} (id INTEGER PRIMARY KEY, value TEXT NOT NULL)")
+                select_list.append(f"l{position}.value AS {_quote(column)}")
+                joins.append(f"LEFT JOIN {lookup} AS l{position} ON l{position}.id = d.{_quote(column)}")
+            else:
+                select_list.append(f"d.{_quote(column)}")
+        connection.execute(
+            f"CREATE VIEW {_quote(table_name)} AS SELECT {', '.join(select_list)} "
+            f"FROM {_quote(target)} AS d {' '.join(joins)}"
+        )
+    return f"INSERT INTO {_quote(target)} VALUES ({', '.join('?' * len(column_types))})"
+
+
+def _chunk_rows(chunk):
+    """
+    Converts a DataFrame chunk into tuples of values sqlite3 can bind.
+    """
+    chunk = chunk.copy()
+    for column in chunk.columns:
+        values = chunk[column]
+        if pd.api.types.is_datetime64_any_dtype(values):
+            # Same text layout SQLAlchemy's SQLite dialect writes for DATETIME columns
+            chunk[column] = values.dt.strftime("%Y-%m-%d %H:%M:%S.%f").where(values.notna(), None)
+        elif pd.api.types.is_timedelta64_dtype(values):
+            chunk[column] = values.astype(str).where(values.notna(), None)
+        elif values.dtype == object and pd.api.types.infer_dtype(values, skipna=True) not in SQLITE_NATIVE_TYPES:
+            chunk[column] = values.map(lambda value: value if value is None or pd.isna(value) else str(value))
+    chunk = chunk.astype(object).where(chunk.notna(), None)
+    return chunk.itertuples(index=False, name=None)
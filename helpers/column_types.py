@@ -0,0 +1,166 @@
+import os
+import pandas as pd
+
+BOOLEAN_VALUES = {
+    "true": 1, "false": 0, "yes": 1, "no": 0, "y": 1, "n": 0, "t": 1, "f": 0,
+}
+
+# Declared types are chosen for their SQLite affinity: INTEGER and REAL store numbers in
+# their compact binary forms, BOOLEAN/DATE/TIMESTAMP have NUMERIC affinity (0/1 integers,
+# ISO-8601 text) and tell the LLM what the column holds.
+INTEGER, REAL, BOOLEAN, DATE, TIMESTAMP, TEXT = "INTEGER", "REAL", "BOOLEAN", "DATE", "TIMESTAMP", "TEXT"
+
+
+def type_inference_settings():
+    """
+    Reads ingest-time typing settings from the environment.
+
+    INGEST_TYPE_INFERENCE: Infer compact column types at load time (default: on).
+    INGEST_DICTIONARY_ENCODING: Move low-cardinality text columns into lookup tables (default: off).
+        Encoded tables become read-only views, so UPDATE, INSERT and DELETE on them fail.
+    INGEST_DICTIONARY_MAX_VALUES: Most distinct values a dictionary-encoded column may have (default: 1000).
+    INGEST_DICTIONARY_MIN_SAVING: Fraction of a column's text size encoding must save (default: 0.5).
+    """
+    return {
+        "enabled": os.getenv("INGEST_TYPE_INFERENCE", "on").lower() not in ("0", "off", "false", "no"),
+        "dictionary": os.getenv("INGEST_DICTIONARY_ENCODING", "off").lower() in ("1", "on", "true", "yes"),
+        "max_values": int(os.getenv("INGEST_DICTIONARY_MAX_VALUES", 1000)),
+        "min_saving": float(os.getenv("INGEST_DICTIONARY_MIN_SAVING", 0.5)),
+    }
+
+
+def infer_column_types(df, settings):
+    """
+    Profiles a sample of a table and picks the tightest type for each column.
+
+    Detects booleans (bool dtype or true/false, yes/no style text), integers (including
+    float columns holding only whole numbers), dates and timestamps (datetime dtype or text
+    that parses as dates in full), and text columns worth dictionary-encoding: few distinct
+    values repeated often enough that integer codes plus a lookup table save at least
+    `min_saving` of the column's size.
+
+    :param df: Sample DataFrame, typically the first ingest chunk.
+    :param settings: Dict from `type_inference_settings()`.
+    :return: Dict of column name to {"type": declared type, "dictionary": bool}.
+    """
+    return {column: _infer_column_type(df[column], settings) for column in df.columns}
+
+
+def _infer_column_type(values, settings):
+    column_type = {"type": TEXT, "dictionary": False}
+    non_null = values.dropna()
+
+    if pd.api.types.is_bool_dtype(values):
+        column_type["type"] = BOOLEAN
+    elif pd.api.types.is_integer_dtype(values):
+        column_type["type"] = INTEGER
+    elif pd.api.types.is_float_dtype(values):
+        whole = len(non_null) > 0 and bool((non_null == non_null.round()).all())
+        column_type["type"] = INTEGER if whole and non_null.abs().max() < 2 ** 53 else REAL
+    elif pd.api.types.is_datetime64_any_dtype(values):
+        column_type["type"] = DATE if _is_midnight(non_null) else TIMESTAMP
+    elif pd.api.types.is_timedelta64_dtype(values) or len(non_null) == 0:
+        pass
+    elif pd.api.types.infer_dtype(non_null, skipna=True) == "string":
+        lowered = non_null.str.strip().str.lower()
+        if lowered.isin(list(BOOLEAN_VALUES)).all() and lowered.nunique() <= 2:
+            column_type["type"] = BOOLEAN
+        else:
+            dates = _parse_dates(non_null)
+            if dates is not None:
+                column_type["type"] = DATE if _is_midnight(dates) else TIMESTAMP
+            elif settings["dictionary"]:
+                column_type["dictionary"] = _worth_encoding(non_null, settings)
+    return column_type
+
+
+def _parse_dates(values):
+    # Require a date separator so codes like "2024" or "1e5" are not read as dates
+    if not values.str.contains(r"\d[-/.]\d", regex=True).all():
+        return None
+    try:
+        parsed = pd.to_datetime(values, errors="coerce")
+    except (ValueError, TypeError, OverflowError):
+        return None
+    return parsed if parsed.notna().all() else None
+
+
+def _is_midnight(values):
+    return len(values) > 0 and bool((values == values.dt.normalize()).all())
+
+
+def _worth_encoding(values, settings):
+    distinct = values.nunique()
+    if distinct > settings["max_values"] or distinct * 2 > len(values):
+        return False
+    text_bytes = values.str.len().sum()
+    # Codes take 1-2 bytes per row; each distinct value is stored once plus a rowid
+    encoded_bytes = 2 * len(values) + values.drop_duplicates().str.len().sum() + 8 * distinct
+    return encoded_bytes <= (1 - settings["min_saving"]) * text_bytes
+
+
+def convert_chunk(df, column_types):
+    """
+    Converts a chunk to the inferred column types, returning a new, compact DataFrame.
+
+    Values that do not fit the type inferred from the sample (e.g. a stray word in an
+    integer column) are kept as they are; SQLite's flexible typing stores them unchanged.
+    Dictionary-encoded columns become pandas categoricals, ready for `encode_dictionary`.
+    """
+    df = df.copy()
+    for column, column_type in column_types.items():
+        values = df[column]
+        declared = column_type["type"]
+        if column_type["dictionary"]:
+            df[column] = values.astype("category")
+        elif declared == INTEGER and pd.api.types.is_numeric_dtype(values) and not pd.api.types.is_bool_dtype(values):
+            non_null = values.dropna()
+            if bool((non_null == non_null.round()).all()):
+                df[column] = pd.to_numeric(values, downcast="integer") if not values.isna().any() else values.astype("Int64")
+        elif declared == BOOLEAN:
+            if pd.api.types.is_bool_dtype(values):
+                df[column] = values.astype("Int8")
+            else:
+                mapped = values.astype(str).str.strip().str.lower().map(BOOLEAN_VALUES)
+                df[column] = mapped.where(mapped.notna(), values)
+        elif declared in (DATE, TIMESTAMP):
+            parsed = values if pd.api.types.is_datetime64_any_dtype(values) else pd.to_datetime(values, errors="coerce")
+            if declared == DATE:
+                date_format = "%Y-%m-%d"
+            else:
+                date_format = "%Y-%m-%d %H:%M:%S.%f" if (parsed.dt.microsecond > 0).any() else "%Y-%m-%d %H:%M:%S"
+            text = parsed.dt.strftime(date_format)
+            df[column] = text.where(parsed.notna(), values.where(values.notna(), None)).astype(object)
+    return df
+
+
+def encode_dictionary(df, column, mapping):
+    """
+    Replaces a column's values by integer codes, extending `mapping` with unseen values.
+
+    :param df: Chunk returned by `convert_chunk`.
+    :param column: Dictionary-encoded column.
+    :param mapping: Dict of value to code, shared by all chunks of a load.
+    :return: List of (code, value) pairs added to `mapping`.
+    """
+    values = df[column]
+    new_values = [value for value in pd.unique(values.dropna()) if value not in mapping]
+    added = []
+    for value in new_values:
+        mapping[value] = len(mapping) + 1
+        added.append((mapping[value], value))
+    df[column] = values.astype(object).map(mapping).astype("Int64")
+    return added
+
+
+def visible_table_names(table_names, view_names):
+    """
+    Returns the user-facing relations of a database: tables and views, minus the internal
+    data and lookup tables (``<view>__*``) behind dictionary-encoded tables.
+    """
+    internal_prefixes = tuple(f"{view}__" for view in view_names)
+    tables = [
+        name for name in table_names
+        if not name.startswith("sqlite_") and not (internal_prefixes and name.startswith(internal_prefixes))
+    ]
+    return sorted(tables + list(view_names))
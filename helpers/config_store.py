@@ -1,6 +1,9 @@
 from dotenv import load_dotenv
+import hashlib
+import json
 import os
 import streamlit as st
+from collections.abc import Mapping
 from pathlib import Path
 
 
@@ -32,5 +35,81 @@ def load_from_env():
             "LLM_ENDPOINT": os.getenv("LLM_ENDPOINT"),
             "MODEL": os.getenv("MODEL")
         }
-    
 
+
+# Settings masked whenever the configuration is printed or returned
+SECRET_SETTINGS = ("PASSWORD", "API_KEY", "SECRET", "TOKEN")
+
+
+class SharedConfig(Mapping):
+    """
+    Configuration read from the environment, overlaid with the updates made at runtime.
+
+    The updates live in the state backend, so a change made through one API worker
+    applies to all of them. They are tied to the settings they were made on: once the
+    .env file changes, earlier runtime updates no longer apply.
+    """
+
+    def __init__(self, defaults, state):
+        """
+        :param defaults: Settings from `load_from_env()`; None when there is no .env file.
+        :param state: `StateBackend` holding the updates.
+        """
+        self.defaults = dict(defaults or {})
+        self._state = state
+        self._version = hashlib.sha256(json.dumps(self.defaults, sort_keys=True, default=str).encode()).hexdigest()[:16]
+
+    @property
+    def overrides(self):
+        """
+        Runtime updates in effect, by setting.
+        """
+        stored = self._state.get("config") or {}
+        return stored.get("overrides", {}) if stored.get("version") == self._version else {}
+
+    def _settings(self):
+        return {**self.defaults, **self.overrides}
+
+    def __getitem__(self, key):
+        return self._settings()[key]
+
+    def __iter__(self):
+        return iter(self._settings())
+
+    def __len__(self):
+        return len(self._settings())
+
+    def update(self, updates):
+        """
+        Stores runtime updates of settings and returns the resulting configuration.
+        """
+        with self._state.lock("config", timeout=30):
+            self._store({**self.overrides, **updates})
+        return self._settings()
+
+    def reset(self, keys=None):
+        """
+        Removes the runtime updates of `keys`, or all of them, so the .env values apply again.
+
+        :return: Keys whose update was removed.
+        """
+        with self._state.lock("config", timeout=30):
+            overrides = self.overrides
+            removed = sorted(overrides if keys is None else set(keys) & set(overrides))
+            self._store({key: value for key, value in overrides.items() if key not in removed})
+        return removed
+
+    def _store(self, overrides):
+        self._state.set("config", {"version": self._version, "overrides": overrides})
+
+    def masked(self):
+        """
+        Returns the configuration with passwords and API keys hidden.
+        """
+        return {
+            key: "***" if value and any(secret in key.upper() for secret in SECRET_SETTINGS) else value
+            for key, value in self._settings().items()
+        }
+
+    def __repr__(self):
+        return repr(self.masked())
@@ -0,0 +1,177 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+def dataset_registry_settings():
+    """
+    Reads dataset registry settings from the environment.
+
+    DATASET_MAX_OPEN: Most datasets with an open engine at a time; opening another closes the
+        least recently used one (default: 16).
+    DATASET_IDLE_SECONDS: Close the engine of a dataset unused for this long, 0 to keep engines
+        until they are pushed out (default: 600).
+    """
+    return {
+        "max_open": int(os.getenv("DATASET_MAX_OPEN", 16)),
+        "idle_seconds": float(os.getenv("DATASET_IDLE_SECONDS", 600)),
+    }
+
+
+class DatasetRegistry:
+    """
+    Connectors of many datasets by ID, opened lazily and kept in an LRU.
+
+    A dataset's connector is created by `opener` on first use and closed again, disposing
+    its engine's pooled connections and file handles, when it is pushed out by
+    `max_open` more recently used datasets or has been idle for `idle_seconds`. A closed
+    dataset is simply reopened on its next use, so eviction only costs the warm caches.
+
+    With a state backend (see ``helpers.state_backend``) the default dataset and a change
+    counter per dataset are shared by all workers: a worker that sees another worker's
+    write to a dataset drops its cached results for it.
+    """
+
+    def __init__(self, opener, max_open=16, idle_seconds=600, state=None):
+        """
+        :param opener: Callable returning the connector of a dataset ID, or None if unknown.
+        :param max_open: Most connectors kept open.
+        :param idle_seconds: Idle time after which a connector is closed, 0 to disable.
+        :param state: Optional `StateBackend` shared with other workers.
+        """
+        self._opener = opener
+        self.max_open = max(max_open, 1)
+        self.idle_seconds = idle_seconds
+        self._open = OrderedDict()  # dataset ID -> (connector, last used)
+        self._lock = threading.Lock()
+        self._open_locks = {}
+        self._state = state
+        self._default_id = None
+        self._generations = {}  # dataset ID -> change counter the open connector's caches reflect
+        self.opened = 0
+        self.evicted = 0
+
+    @property
+    def default_id(self):
+        """
+        Dataset used by requests that do not name one: the latest upload.
+        """
+        return self._state.get("datasets:default") if self._state is not None else self._default_id
+
+    @default_id.setter
+    def default_id(self, dataset_id):
+        if self._state is not None:
+            self._state.set("datasets:default", dataset_id)
+        else:
+            self._default_id = dataset_id
+
+    def changed(self, dataset_id):
+        """
+        Records a write to a dataset, so other workers drop their cached results for it.
+        """
+        if self._state is None:
+            return
+        generation = self._state.incr(f"dataset:{dataset_id}:generation")
+        with self._lock:
+            if self._generations.get(dataset_id, generation - 1) != generation - 1:
+                # Another worker wrote in between, which this worker's cache has not seen
+                self._clear_results(dataset_id)
+            self._generations[dataset_id] = generation
+
+    def _sync(self, dataset_id, connector):
+        if self._state is None:
+            return connector
+        generation = self._state.get(f"dataset:{dataset_id}:generation") or 0
+        with self._lock:
+            if self._generations.get(dataset_id, generation) != generation:
+                self._clear_results(dataset_id, connector)
+            self._generations[dataset_id] = generation
+        return connector
+
+    def _clear_results(self, dataset_id, connector=None):
+        if connector is None and dataset_id in self._open:
+            connector = self._open[dataset_id][0]
+        if connector is not None and getattr(connector, "result_cache", None) is not None:
+            connector.result_cache.clear()
+
+    def get(self, dataset_id):
+        """
+        Returns the connector of a dataset, opening it if needed, or None if it does not exist.
+        """
+        self.evict_idle()
+        with self._lock:
+            if dataset_id in self._open:
+                connector = self._touch(dataset_id)
+                open_lock = None
+            else:
+                open_lock = self._open_locks.setdefault(dataset_id, threading.Lock())
+        if open_lock is None:
+            return self._sync(dataset_id, connector)
+
+        with open_lock:  # Concurrent first uses of a dataset open it once
+            with self._lock:
+                connector = self._touch(dataset_id) if dataset_id in self._open else None
+            if connector is not None:
+                return self._sync(dataset_id, connector)
+            connector = self._opener(dataset_id)
+            if connector is None:
+                with self._lock:
+                    self._open_locks.pop(dataset_id, None)
+                return None
+            self.add(dataset_id, connector)
+            return self._sync(dataset_id, connector)
+
+    def add(self, dataset_id, connector):
+        """
+        Registers an already open connector, e.g. right after an upload was loaded.
+        """
+        with self._lock:
+            previous = self._open.pop(dataset_id, None)
+            self._open[dataset_id] = (connector, time.monotonic())
+            self._generations.pop(dataset_id, None)  # A new connector starts with empty caches
+            self.opened += 1
+            evicted = [self._open.popitem(last=False)[1][0] for _ in range(len(self._open) - self.max_open)]
+        if previous is not None and previous[0] is not connector:
+            evicted.append(previous[0])
+        self._close(evicted)
+
+    def evict_idle(self):
+        """
+        Closes the connectors of datasets idle for longer than `idle_seconds`.
+        """
+        if not self.idle_seconds:
+            return
+        cutoff = time.monotonic() - self.idle_seconds
+        with self._lock:
+            idle = [dataset_id for dataset_id, (_, last_used) in self._open.items() if last_used < cutoff]
+            evicted = [self._open.pop(dataset_id)[0] for dataset_id in idle]
+        self._close(evicted)
+
+    def close_all(self):
+        with self._lock:
+            evicted = [connector for connector, _ in self._open.values()]
+            self._open.clear()
+        self._close(evicted)
+
+    def _touch(self, dataset_id):
+        connector, _ = self._open[dataset_id]
+        self._open[dataset_id] = (connector, time.monotonic())
+        self._open.move_to_end(dataset_id)
+        return connector
+
+    def _close(self, connectors):
+        for connector in connectors:
+            self.evicted += 1
+            # Checked-out connections, e.g. of a running export, are closed when returned
+            connector.dispose()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "open": list(self._open),
+                "max_open": self.max_open,
+                "opened": self.opened,
+                "evicted": self.evicted,
+                "default": self.default_id,
+            }
@@ -0,0 +1,103 @@
+import itertools
+import os
+import threading
+from sqlalchemy import create_engine
+
+
+def pool_settings():
+    """
+    Reads connection pool settings from the environment, as `create_engine` keyword arguments.
+
+    DB_POOL_SIZE: Connections kept open per engine (default: 5).
+    DB_MAX_OVERFLOW: Extra connections opened under load beyond the pool size (default: 10).
+    DB_POOL_TIMEOUT: Seconds to wait for a free connection before failing (default: 30).
+    DB_POOL_RECYCLE: Seconds after which a connection is replaced, ahead of server or
+        firewall idle timeouts; -1 to disable (default: 1800).
+    DB_POOL_PRE_PING: Test connections when they are checked out and transparently replace
+        stale ones (default: on).
+    """
+    return {
+        "pool_size": int(os.getenv("DB_POOL_SIZE", 5)),
+        "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", 10)),
+        "pool_timeout": float(os.getenv("DB_POOL_TIMEOUT", 30)),
+        "pool_recycle": int(os.getenv("DB_POOL_RECYCLE", 1800)),
+        "pool_pre_ping": os.getenv("DB_POOL_PRE_PING", "on").lower() not in ("0", "off", "false", "no"),
+    }
+
+
+def replica_urls():
+    """
+    Returns the read replica URLs from DB_REPLICA_URLS, a comma-separated list of
+    SQLAlchemy URLs (default: none).
+    """
+    return [url.strip() for url in os.getenv("DB_REPLICA_URLS", "").split(",") if url.strip()]
+
+
+def is_read_only(query_info):
+    """
+    True when a statement classified by `helpers.result_cache.analyze_query` only reads,
+    so it may run on a replica. Unclassified statements (None) are not.
+    """
+    return query_info is not None and not query_info["write"] and not query_info["ddl"]
+
+
+class ReplicaRouter:
+    """
+    Hands out read replica engines round-robin, falling back to the primary.
+
+    A replica that fails to connect is skipped until `retry_after` other checkouts have
+    gone by, so one dead replica does not slow every read down.
+    """
+
+    def __init__(self, primary, urls, engine_options=None, retry_after=100):
+        """
+        :param primary: Engine of the primary database; used when no replica is available.
+        :param urls: SQLAlchemy URLs of the replicas.
+        :param engine_options: Keyword arguments for each replica's `create_engine`, e.g. `pool_settings()`.
+        :param retry_after: Checkouts a failed replica sits out.
+        """
+        self.primary = primary
+        self.replicas = [create_engine(url, **(engine_options or {})) for url in urls]
+        self.retry_after = retry_after
+        self._lock = threading.Lock()
+        self._order = itertools.cycle(range(len(self.replicas)))
+        self._skip = {}
+        self.reads = [0] * len(self.replicas)
+        self.fallbacks = 0
+
+    def connect(self):
+        """
+        Returns a new connection to the next healthy replica, or to the primary.
+        """
+        for _ in range(len(self.replicas)):
+            with self._lock:
+                index = next(self._order)
+                if self._skip.get(index, 0) > 0:
+                    self._skip[index] -= 1
+                    continue
+            try:
+                connection = self.replicas[index].connect()
+            except Exception:
+                with self._lock:
+                    self._skip[index] = self.retry_after
+                continue
+            with self._lock:
+                self.reads[index] += 1
+            return connection
+        with self._lock:
+            self.fallbacks += 1
+        return self.primary.connect()
+
+    def stats(self):
+        return {
+            "replicas": [
+                {"url": engine.url.render_as_string(hide_password=True), "reads": reads,
+                 "pool": engine.pool.status()}
+                for engine, reads in zip(self.replicas, self.reads)
+            ],
+            "fallbacks": self.fallbacks,
+        }
+
+    def dispose(self):
+        for engine in self.replicas:
+            engine.dispose()
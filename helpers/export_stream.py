@@ -0,0 +1,136 @@
+import os
+import re
+import tempfile
+import zipfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import xlsxwriter
+from helpers.arrow_fetch import iter_parquet, ChunkSink
+from helpers.result_stream import iter_csv
+
+EXPORT_FORMATS = {
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "csv.zip": "application/zip",
+    "parquet.zip": "application/zip",
+}
+
+EXCEL_MAX_ROWS = 1048576
+COPY_BLOCK_SIZE = 1024 * 1024
+
+
+def export_settings():
+    """
+    Reads export settings from the environment.
+
+    EXPORT_CHUNK_ROWS: Rows fetched per chunk while exporting (default: 10000).
+    EXPORT_WORKERS: Tables exported concurrently into zip archives (default: 4).
+    """
+    return {
+        "chunk_rows": int(os.getenv("EXPORT_CHUNK_ROWS", 10000)),
+        "workers": int(os.getenv("EXPORT_WORKERS", 4)),
+    }
+
+
+def write_xlsx(file, tables):
+    """
+    Writes tables to an Excel workbook, one sheet per table, in xlsxwriter's constant_memory
+    mode: rows are flushed to disk as they are written, so only one chunk is held in memory.
+    Tables longer than an Excel sheet continue on numbered extra sheets.
+
+    :param file: Output path or writable binary file object.
+    :param tables: Iterable of (name, DataFrame chunk iterator) pairs.
+    """
+    workbook = xlsxwriter.Workbook(file, {"constant_memory": True, "strings_to_urls": False})
+    used_names = set()
+    try:
+        for name, chunks in tables:
+            worksheet, row = None, 0
+            for chunk in chunks:
+                if worksheet is None:
+                    worksheet, row = _add_sheet(workbook, name, chunk.columns, used_names), 1
+                values = chunk.astype(object).where(chunk.notna(), None)
+                for record in values.itertuples(index=False, name=None):
+                    if row == EXCEL_MAX_ROWS:
+                        worksheet, row = _add_sheet(workbook, name, chunk.columns, used_names), 1
+                    worksheet.write_row(row, 0, record)
+                    row += 1
+            if worksheet is None:
+                _add_sheet(workbook, name, [], used_names)
+    finally:
+        workbook.close()
+
+
+def _add_sheet(workbook, name, columns, used_names):
+    base_name = re.sub(r"[\[\]:*?/\\]", "_", str(name))[:28] or "Sheet"
+    sheet_name, counter = base_name, 1
+    while sheet_name.lower() in used_names:
+        counter += 1
+        sheet_name = f"{base_name} {counter}"
+    used_names.add(sheet_name.lower())
+    worksheet = workbook.add_worksheet(sheet_name)
+    worksheet.write_row(0, 0, [str(column) for column in columns])
+    return worksheet
+
+
+def iter_xlsx(tables):
+    """
+    Builds an Excel workbook in a temporary file and yields its bytes in blocks.
+
+    xlsx is a zip of per-sheet XML parts that xlsxwriter assembles on close, so the
+    workbook cannot be sent before it is complete; memory use still stays constant.
+    """
+    with tempfile.TemporaryFile() as file:
+        write_xlsx(file, tables)
+        file.seek(0)
+        yield from iter(lambda: file.read(COPY_BLOCK_SIZE), b"")
+
+
+def iter_zip(db, tables, member_format, workers=4, chunk_rows=10000):
+    """
+    Streams a zip archive with one CSV or Parquet file per table.
+
+    Tables are exported concurrently by `workers` threads into temporary files; each
+    finished file is then copied into the archive, which is written to the response as it
+    grows (zip data descriptors make this possible without seeking).
+
+    :param db: Connector providing `iter_query` and `iter_arrow_batches`.
+    :param tables: List of (name, SELECT statement) pairs.
+    :param member_format: "csv" or "parquet".
+    :param workers: Tables exported concurrently.
+    :param chunk_rows: Rows fetched per chunk.
+    """
+    sink = ChunkSink()
+    compression = zipfile.ZIP_STORED if member_format == "parquet" else zipfile.ZIP_DEFLATED
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(tables)))) as pool, \
+            zipfile.ZipFile(sink, "w", compression=compression) as archive:
+        futures = {
+            pool.submit(_export_member, db, query, member_format, chunk_rows): name
+            for name, query in tables
+        }
+        try:
+            for future in as_completed(futures):
+                with future.result() as member_file:
+                    member_file.seek(0)
+                    with archive.open(f"{futures[future]}.{member_format}", "w", force_zip64=True) as member:
+                        for block in iter(lambda: member_file.read(COPY_BLOCK_SIZE), b""):
+                            member.write(block)
+                            yield sink.drain()
+        finally:
+            for future in futures:
+                future.cancel()
+    yield sink.drain()
+
+
+def _export_member(db, query, member_format, chunk_rows):
+    member_file = tempfile.TemporaryFile()
+    try:
+        if member_format == "parquet":
+            for data in iter_parquet(db.iter_arrow_batches(query, batch_size=chunk_rows)):
+                member_file.write(data)
+        else:
+            for text in iter_csv(db.iter_query(query, chunk_size=chunk_rows)):
+                member_file.write(text.encode())
+    except Exception:
+        member_file.close()
+        raise
+    return member_file
+
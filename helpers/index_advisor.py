@@ -0,0 +1,280 @@
+import os
+import statistics
+import threading
+import time
+from collections import defaultdict
+import sqlglot
+from sqlglot import exp
+from sqlglot.optimizer.qualify import qualify
+from sqlalchemy import inspect, text
+from helpers.result_cache import analyze_query
+
+ADVISOR_INDEX_PREFIX = "ix_advisor_"
+
+# How much a column's use in a query counts towards indexing it
+USAGE_WEIGHTS = {"filter": 3, "join": 2, "group": 1}
+RANGE_PREDICATES = (exp.EQ, exp.GT, exp.GTE, exp.LT, exp.LTE, exp.In, exp.Between, exp.Is)
+
+
+def index_advisor_settings():
+    """
+    Reads index advisor settings from the environment.
+
+    INDEX_ADVISOR_AUTO_EVERY: Run the advisor in the background after every N recorded queries and create the
+        indexes it recommends, 0 to only run it on request (default: 0).
+    INDEX_ADVISOR_MAX_INDEXES: Most indexes created per run (default: 5).
+    INDEX_ADVISOR_HISTORY: Most recent distinct queries analyzed (default: 200).
+    INDEX_ADVISOR_TIMING_RUNS: Executions per query when measuring latency (default: 3).
+    INDEX_ADVISOR_MIN_ROWS: Smallest table worth indexing (default: 10000).
+    """
+    return {
+        "auto_every": int(os.getenv("INDEX_ADVISOR_AUTO_EVERY", 0)),
+        "max_indexes": int(os.getenv("INDEX_ADVISOR_MAX_INDEXES", 5)),
+        "history": int(os.getenv("INDEX_ADVISOR_HISTORY", 200)),
+        "timing_runs": int(os.getenv("INDEX_ADVISOR_TIMING_RUNS", 3)),
+        "min_rows": int(os.getenv("INDEX_ADVISOR_MIN_ROWS", 10000)),
+    }
+
+
+def query_column_usage(query, schema, dialect="sqlite"):
+    """
+    Returns the (table, column, usage) triples of a query's filter, join and group-by columns.
+
+    Columns are resolved to their tables with sqlglot's qualifier; columns of subqueries and
+    CTEs are ignored. Unparseable queries yield nothing.
+
+    :param query: SQL SELECT statement.
+    :param schema: Dict of table name to {column name: type}.
+    :param dialect: sqlglot dialect name.
+    """
+    try:
+        expression = qualify(sqlglot.parse_one(query, read=dialect), schema=schema, dialect=dialect)
+    except Exception:
+        return set()
+
+    usage = set()
+    for select in expression.find_all(exp.Select):
+        tables = {table.alias_or_name: table.name for table in select.find_all(exp.Table)}
+
+        def add(node, kind):
+            for column in ([node] if isinstance(node, exp.Column) else node.find_all(exp.Column)):
+                table = tables.get(column.table)
+                if table in schema and column.name in schema[table]:
+                    usage.add((table, column.name, kind))
+
+        where = select.args.get("where")
+        if where is not None:
+            for predicate in where.find_all(*RANGE_PREDICATES):
+                if isinstance(predicate.this, exp.Column):
+                    add(predicate.this, "filter")
+        for join in select.args.get("joins") or []:
+            on = join.args.get("on")
+            if on is not None:
+                for predicate in on.find_all(exp.EQ):
+                    add(predicate, "join")
+        group = select.args.get("group")
+        if group is not None:
+            for node in group.expressions:
+                if isinstance(node, exp.Column):
+                    add(node, "group")
+    return usage
+
+
+def explain_query_plan(connection, query):
+    """
+    Returns the detail lines of SQLite's EXPLAIN QUERY PLAN for a query.
+    """
+    return [row[-1] for row in connection.execute(text(f"EXPLAIN QUERY PLAN {query}")).fetchall()]
+
+
+def has_full_scan(plan):
+    """
+    True when a query plan scans a table without any index.
+    """
+    return any(line.startswith("SCAN ") and "INDEX" not in line for line in plan)
+
+
+def time_query(connection, query, runs=3):
+    """
+    Returns the median latency of a query over `runs` executions, in milliseconds.
+    """
+    timings = []
+    for _ in range(max(runs, 1)):
+        started = time.perf_counter()
+        connection.execute(text(query)).fetchall()
+        timings.append((time.perf_counter() - started) * 1000)
+    return round(statistics.median(timings), 2)
+
+
+def advise_indexes(engine, queries, apply=True, max_indexes=5, timing_runs=3, min_rows=10000):
+    """
+    Suggests and optionally builds single-column indexes for the filter, join and group-by
+    columns of executed queries whose plans do full table scans.
+
+    Candidates are ranked by weighted usage across queries. When applied, each index is
+    kept only if EXPLAIN QUERY PLAN shows at least one of its queries using it, and the
+    median latency of the affected queries is measured before and after.
+
+    Dictionary-encoded tables (see ``helpers.column_types``) are indexed on their
+    ``<table>__data`` table, behind the view the queries use.
+
+    :param engine: SQLAlchemy engine of a SQLite database.
+    :param queries: SQL statements, e.g. from the query history.
+    :param apply: Build the indexes; otherwise only report candidates.
+    :param max_indexes: Most indexes to build.
+    :param timing_runs: Executions per query when measuring latency.
+    :param min_rows: Tables with fewer rows are never indexed; scanning them is cheap.
+    :return: Report dictionary.
+    """
+    started_at = time.time()
+    inspector = inspect(engine)
+    table_names = set(inspector.get_table_names())
+    relations = [name for name in table_names | set(inspector.get_view_names()) if not name.startswith("sqlite_")]
+    schema = {name: {column["name"]: str(column["type"]) for column in inspector.get_columns(name)} for name in relations}
+    indexed = {
+        (table, index["column_names"][0])
+        for table in table_names for index in inspector.get_indexes(table) if index["column_names"]
+    }
+
+    scores = defaultdict(int)
+    candidate_queries = defaultdict(set)
+    analyzed = 0
+    table_rows = {}
+    with engine.connect() as connection:
+        for query in dict.fromkeys(queries):
+            info = analyze_query(query, "sqlite")
+            if info["write"] or info["ddl"] or not info["tables"]:
+                continue
+            try:
+                plan = explain_query_plan(connection, query)
+            except Exception:
+                continue  # Refers to tables or columns this database does not have
+            analyzed += 1
+            if not has_full_scan(plan):
+                continue
+            for table, column, kind in query_column_usage(query, schema):
+                target = f"{table}__data" if table not in table_names and f"{table}__data" in table_names else table
+                if target not in table_names or column not in schema.get(target, {}) or (target, column) in indexed:
+                    continue
+                if target not in table_rows:
+                    # MAX(rowid) is a single b-tree seek, a good enough size estimate
+                    quoted = engine.dialect.identifier_preparer.quote(target)
+                    table_rows[target] = connection.execute(text(f"SELECT MAX(rowid) FROM {quoted}")).scalar() or 0
+                if table_rows[target] < min_rows:
+                    continue
+                scores[(target, column)] += USAGE_WEIGHTS[kind]
+                candidate_queries[(target, column)].add(query)
+
+        ranked = sorted(scores, key=lambda key: (-scores[key], key))[:max_indexes]
+        candidates = [
+            {"table": table, "column": column, "score": scores[(table, column)],
+             "queries": len(candidate_queries[(table, column)])}
+            for table, column in ranked
+        ]
+        report = {"applied": apply, "queries_analyzed": analyzed, "candidates": candidates,
+                  "created": [], "discarded": [], "started_at": started_at}
+        if not apply or not ranked:
+            report["finished_at"] = time.time()
+            return report
+
+        affected = sorted(set().union(*(candidate_queries[key] for key in ranked)))
+        before = {query: time_query(connection, query, timing_runs) for query in affected}
+
+        for table, column in ranked:
+            index_name = f"{ADVISOR_INDEX_PREFIX}{table}_{column}"[:60]
+            quote = engine.dialect.identifier_preparer.quote
+            connection.execute(text(f"CREATE INDEX IF NOT EXISTS {quote(index_name)} ON {quote(table)} ({quote(column)})"))
+            connection.commit()
+            used = any(index_name in " ".join(explain_query_plan(connection, query))
+                       for query in candidate_queries[(table, column)])
+            entry = {"table": table, "column": column, "index": index_name}
+            if used:
+                report["created"].append(entry)
+            else:
+                connection.execute(text(f"DROP INDEX {quote(index_name)}"))
+                connection.commit()
+                report["discarded"].append(entry)
+
+        connection.execute(text("PRAGMA optimize"))
+        after = {query: time_query(connection, query, timing_runs) for query in affected}
+
+    report["latency"] = [
+        {"query": query, "before_ms": before[query], "after_ms": after[query]} for query in affected
+    ]
+    total_before, total_after = sum(before.values()), sum(after.values())
+    report["total_before_ms"] = round(total_before, 2)
+    report["total_after_ms"] = round(total_after, 2)
+    report["speedup"] = round(total_before / total_after, 2) if total_after else None
+    report["finished_at"] = time.time()
+    return report
+
+
+class IndexAdvisor:
+    """
+    Runs the index advisor in a background thread, one run at a time, and keeps the last report.
+
+    With a state backend the one-run-at-a-time lock and the last report are shared, so only
+    one worker runs the advisor and every worker reports its outcome.
+    """
+
+    def __init__(self, state=None):
+        """
+        :param state: Optional `StateBackend` shared with other workers.
+        """
+        self._lock = threading.Lock()
+        self._thread = None
+        self._state = state
+        self._token = None
+        self._last = {"report": None, "error": None}
+
+    @property
+    def running(self):
+        if self._state is not None:
+            return self._state.is_locked("index_advisor")
+        return self._thread is not None and self._thread.is_alive()
+
+    @property
+    def last_report(self):
+        return self._outcome()["report"]
+
+    @property
+    def last_error(self):
+        return self._outcome()["error"]
+
+    def start(self, db, queries, apply=True):
+        """
+        Starts a run against a connector exposing `advise_indexes`.
+
+        :return: False if a run is already in progress.
+        """
+        with self._lock:
+            if self._state is not None:
+                # Expires on its own should the worker die mid-run
+                self._token = self._state.try_lock("index_advisor", ttl=3600)
+                if self._token is None:
+                    return False
+            elif self.running:
+                return False
+            self._thread = threading.Thread(target=self._run, args=(db, list(queries), apply), daemon=True)
+            self._thread.start()
+            return True
+
+    def _run(self, db, queries, apply):
+        try:
+            outcome = {"report": db.advise_indexes(queries, apply=apply), "error": None}
+        except Exception as e:
+            outcome = {"report": self.last_report, "error": str(e)}
+        if self._state is not None:
+            self._state.set("index_advisor:last", outcome)
+            self._state.unlock("index_advisor", self._token)
+        else:
+            self._last = outcome
+
+    def _outcome(self):
+        if self._state is not None:
+            return self._state.get("index_advisor:last") or {"report": None, "error": None}
+        return self._last
+
+    def status(self):
+        outcome = self._outcome()
+        return {"running": self.running, "report": outcome["report"], "error": outcome["error"]}
@@ -0,0 +1,286 @@
+import json
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+import sqlglot
+from sqlglot import exp
+from sqlalchemy import text
+
+# SQLite VM instructions between two checks of the deadline and the cancel token
+SQLITE_PROGRESS_STEPS = 1000
+
+
+class QueryInterrupted(Exception):
+    """
+    Raised when a query is stopped by its timeout or cancelled.
+    """
+
+
+def query_guard_settings():
+    """
+    Reads the query guard settings from the environment.
+
+    QUERY_TIMEOUT: Seconds a query may run, 0 to disable (default: 30). Streamed results get
+        this long for every chunk.
+    QUERY_MAX_COST: Highest planner cost estimate a SELECT may have, 0 to disable (default: 100000000).
+        Postgres' total cost, MySQL's and SQLite's estimated rows examined.
+    QUERY_MAX_FULL_SCANS: Most unindexed full table scans nested in one join, 0 to disable
+        (default: 0). 1 catches every cartesian join, including harmless ones over small tables.
+    QUERY_GUARD_MODE: "reject" expensive plans or only "flag" them with a warning (default: reject).
+    """
+    return {
+        "timeout": float(os.getenv("QUERY_TIMEOUT", 30)),
+        "max_cost": float(os.getenv("QUERY_MAX_COST", 100000000)),
+        "max_full_scans": int(os.getenv("QUERY_MAX_FULL_SCANS", 0)),
+        "mode": os.getenv("QUERY_GUARD_MODE", "reject").lower(),
+    }
+
+
+def check_query_plan(connection, query, driver, settings):
+    """
+    Runs EXPLAIN for a SELECT and compares its cost estimate and nested full scans to the limits.
+
+    Statements other than SELECTs, drivers without a plan parser (mssql, oracle) and plans
+    that cannot be obtained pass unchecked; execution reports their errors.
+
+    :param connection: Open SQLAlchemy connection.
+    :param query: SQL statement about to be executed.
+    :param driver: "sqlite", "postgres" or "mysql".
+    :param settings: Dict from `query_guard_settings()`.
+    :return: Tuple of (error message when the query is rejected or None, list of warnings).
+    """
+    if not (settings["max_cost"] or settings["max_full_scans"]):
+        return None, []
+    if not query.strip().lower().startswith(("select", "with")) or driver not in PLAN_ESTIMATORS:
+        return None, []
+    try:
+        cost, full_scans = PLAN_ESTIMATORS[driver](connection, query)
+    except Exception:
+        return None, []
+
+    problems = []
+    if settings["max_cost"] and cost > settings["max_cost"]:
+        problems.append(f"estimated cost {cost:,.0f} exceeds the limit of {settings['max_cost']:,.0f}")
+    if settings["max_full_scans"] and full_scans > settings["max_full_scans"]:
+        problems.append(f"{full_scans} full table scans are joined without an index "
+                        f"(limit: {settings['max_full_scans']})")
+    if not problems:
+        return None, []
+    if settings["mode"] == "flag":
+        return None, [f"Expensive query: {'; '.join(problems)}."]
+    return (f"Query blocked: {'; '.join(problems)}. "
+            "Check the join conditions or add more selective filters."), []
+
+
+def _sqlite_plan_estimate(connection, query):
+    # Rows are (id, parent, notused, detail); siblings under one parent form a loop nest
+    plan = connection.execute(text(f"EXPLAIN QUERY PLAN {query}")).fetchall()
+    relations = _sqlite_relations(connection, query)
+    sizes = {}
+
+    def table_rows(name):
+        table = relations.get(name, name)
+        if table not in sizes:
+            quoted = connection.engine.dialect.identifier_preparer.quote(table)
+            try:
+                # MAX(rowid) is a single b-tree seek, a good enough size estimate
+                sizes[table] = connection.execute(text(f"SELECT MAX(rowid) FROM {quoted}")).scalar() or 0
+            except Exception:
+                sizes[table] = None  # CTE, subquery, view or WITHOUT ROWID table
+        return sizes[table]
+
+    nests = {}
+    for _, parent, _, detail in plan:
+        if not detail.startswith("SCAN ") or detail == "SCAN CONSTANT ROW":
+            continue
+        name = detail[5:].split(" ")[0]
+        nests.setdefault(parent, []).append((name, "INDEX" not in detail))
+
+    # Scans that do not resolve to a table, e.g. materialized CTEs and subqueries, are
+    # assumed to be as large as the largest table of the database
+    largest = None
+    cost, full_scans = 0, 0
+    for scans in nests.values():
+        rows = [table_rows(name) for name, _ in scans]
+        if largest is None and None in rows:
+            tables = connection.execute(text(
+                "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'")).scalars()
+            largest = max([size for size in map(table_rows, tables) if size is not None], default=1)
+        cost += math.prod(max(largest if size is None else size, 1) for size in rows)
+        full_scans = max(full_scans, sum(unindexed for _, unindexed in scans))
+    return cost, full_scans
+
+
+def _sqlite_relations(connection, query):
+    # Plans of queries on views show the aliases inside the views, e.g. "SCAN d" for a
+    # dictionary-encoded table, so the views' own relations are resolved too
+    relations = _query_relations(query, "sqlite")
+    views = dict(connection.execute(text("SELECT name, sql FROM sqlite_master WHERE type = 'view'")).fetchall())
+    pending, seen = [table for table in relations.values() if table in views], set()
+    while pending:
+        view = pending.pop()
+        if view in seen:
+            continue
+        seen.add(view)
+        for name, table in _query_relations(views[view], "sqlite").items():
+            if table != view:
+                relations.setdefault(name, table)
+                if table in views:
+                    pending.append(table)
+    return relations
+
+
+def _postgres_plan_estimate(connection, query):
+    plan = connection.execute(text(f"EXPLAIN (FORMAT JSON) {query}")).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    root = plan[0]["Plan"]
+
+    def seq_scans(node):
+        return (node.get("Node Type") == "Seq Scan") + sum(seq_scans(child) for child in node.get("Plans", []))
+
+    def nested_scans(node):
+        own = seq_scans(node) if node.get("Node Type") == "Nested Loop" else 0
+        return max([own] + [nested_scans(child) for child in node.get("Plans", [])])
+
+    return float(root["Total Cost"]), nested_scans(root)
+
+
+def _mysql_plan_estimate(connection, query):
+    rows_by_select, scans_by_select = {}, {}
+    for row in connection.execute(text(f"EXPLAIN {query}")).mappings():
+        select_id = row.get("id")
+        examined = float(row.get("rows") or 1) * float(row.get("filtered") or 100) / 100
+        rows_by_select[select_id] = rows_by_select.get(select_id, 1) * max(examined, 1)
+        scans_by_select[select_id] = scans_by_select.get(select_id, 0) + (row.get("type") == "ALL")
+    return sum(rows_by_select.values()), max(scans_by_select.values(), default=0)
+
+
+PLAN_ESTIMATORS = {
+    "sqlite": _sqlite_plan_estimate,
+    "postgres": _postgres_plan_estimate,
+    "mysql": _mysql_plan_estimate,
+}
+
+
+def _query_relations(query, dialect):
+    # Maps the names a plan may show (aliases and table names) to table names
+    try:
+        statement = sqlglot.parse_one(query, read=dialect)
+    except Exception:
+        return {}
+    ctes = {cte.alias_or_name for cte in statement.find_all(exp.CTE)}
+    return {table.alias_or_name: table.name for table in statement.find_all(exp.Table) if table.name not in ctes}
+
+
+class CancelToken:
+    """
+    Lets another thread stop the query a connector is running, e.g. when the HTTP client
+    that asked for it disconnects.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._callbacks = []
+        self.cancelled = False
+
+    def cancel(self):
+        with self._lock:
+            self.cancelled = True
+            callbacks = list(self._callbacks)
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception:
+                pass  # The query finished or its connection closed meanwhile
+
+    @contextmanager
+    def on_cancel(self, callback):
+        """
+        Calls `callback` if the token is cancelled while the block runs.
+        """
+        with self._lock:
+            self._callbacks.append(callback)
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._callbacks.remove(callback)
+
+
+class QueryDeadline:
+    """
+    Deadline of a running query; `reset()` grants a new period, e.g. for each streamed chunk.
+    """
+
+    def __init__(self, timeout):
+        self.timeout = timeout
+        self.reset()
+
+    def reset(self):
+        self.expires_at = time.monotonic() + self.timeout if self.timeout else None
+
+    def expired(self):
+        return self.expires_at is not None and time.monotonic() >= self.expires_at
+
+
+@contextmanager
+def interruptible(connection, driver, timeout=None, cancel_token=None):
+    """
+    Runs the statements of the block under a timeout and lets `cancel_token` stop them.
+
+    SQLite checks the deadline and the token from a progress handler and is interrupted
+    in-process. Postgres gets a `SET LOCAL statement_timeout` and is cancelled through the
+    driver; MySQL gets `max_execution_time` (SELECTs only) and is cancelled with `KILL QUERY`
+    from a second connection. Other drivers run without a timeout.
+
+    :param connection: Open SQLAlchemy connection the block executes on.
+    :param driver: "sqlite", "postgres", "mysql", ...
+    :param timeout: Seconds, None or 0 for no timeout.
+    :param cancel_token: Optional `CancelToken`.
+    :return: Context manager yielding the `QueryDeadline`.
+    :raises QueryInterrupted: When the timeout expired or the token was cancelled.
+    """
+    if cancel_token is not None and cancel_token.cancelled:
+        raise QueryInterrupted("Query cancelled.")
+    deadline = QueryDeadline(timeout)
+    raw_connection = connection.connection.driver_connection
+    cancel, cleanup = None, None
+
+    if driver == "sqlite":
+        def progress():
+            return int(deadline.expired() or (cancel_token is not None and cancel_token.cancelled))
+
+        raw_connection.set_progress_handler(progress, SQLITE_PROGRESS_STEPS)
+        cancel, cleanup = raw_connection.interrupt, lambda: raw_connection.set_progress_handler(None, 0)
+    elif driver == "postgres":
+        if timeout:
+            connection.execute(text(f"SET LOCAL statement_timeout = {int(timeout * 1000)}"))
+        cancel = raw_connection.cancel
+    elif driver == "mysql":
+        if timeout:
+            connection.execute(text(f"SET SESSION max_execution_time = {int(timeout * 1000)}"))
+            cleanup = lambda: connection.execute(text("SET SESSION max_execution_time = 0"))
+        thread_id = int(raw_connection.thread_id())
+
+        def cancel():
+            with connection.engine.connect() as killer:
+                killer.execute(text(f"KILL QUERY {thread_id}"))
+
+    try:
+        with cancel_token.on_cancel(cancel) if cancel_token is not None and cancel else nullcontext():
+            yield deadline
+    except Exception as e:
+        if cancel_token is not None and cancel_token.cancelled:
+            raise QueryInterrupted("Query cancelled.") from e
+        if deadline.expired():
+            raise QueryInterrupted(f"Query timed out after {timeout:g}s.") from e
+        raise
+    finally:
+        if cleanup is not None:
+            try:
+                cleanup()
+            except Exception:
+                pass
@@ -1,19 +1,293 @@
-import os, json
+import os, json, re, sqlite3, threading, time
 import streamlit as st
+from helpers.state_backend import get_state_backend
 
-PERSISTENCE_FILE = "query_history.json"
+PERSISTENCE_FILE = "query_history.json"  # Legacy store, imported once into the database
+HISTORY_DB_FILE = "query_history.db"
 
-# Function to load query history from file
-def load_query_history():
-    if os.path.exists(PERSISTENCE_FILE):
-        with open(PERSISTENCE_FILE, "r") as file:
-            return json.load(file)
-    return []
 
-# Function to save query history to file
-def save_query_history(history):
-    with open(PERSISTENCE_FILE, "w") as file:
-        json.dump(history, file)
+class QueryHistoryStore:
+    """
+    Append-only query history in a SQLite file (WAL mode), safe to share between workers.
+
+    Every entry records when a question was asked, the generated SQL, the LLM backend and
+    model, the outcome and how long it took. Questions and SQL are indexed with FTS5 for
+    full-text search when the SQLite build supports it; otherwise search uses LIKE.
+    """
+
+    def __init__(self, path=HISTORY_DB_FILE, legacy_file=PERSISTENCE_FILE):
+        """
+        :param path: SQLite file holding the history (default: query_history.db).
+        :param legacy_file: JSON history imported on first use, if present (default: query_history.json).
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS query_history ("
+            "id INTEGER PRIMARY KEY, created_at REAL NOT NULL, question TEXT, sql TEXT, "
+            "backend TEXT, model TEXT, status TEXT NOT NULL, latency_ms REAL, row_count INTEGER, error TEXT)"
+        )
+        self._connection.execute("CREATE INDEX IF NOT EXISTS query_history_created_at ON query_history(created_at)")
+        self.full_text_search = self._create_fts_index()
+        self._connection.commit()
+        self._import_legacy_file(legacy_file)
+
+    def _create_fts_index(self):
+        try:
+            self._connection.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS query_history_fts USING fts5("
+                "question, sql, content='query_history', content_rowid='id')"
+            )
+        except sqlite3.OperationalError:
+            return False  # SQLite built without FTS5
+        self._connection.execute(
+            "CREATE TRIGGER IF NOT EXISTS query_history_fts_insert AFTER INSERT ON query_history BEGIN "
+            "INSERT INTO query_history_fts(rowid, question, sql) VALUES (new.id, new.question, new.sql); END"
+        )
+        return True
+
+    def _import_legacy_file(self, legacy_file):
+        if not legacy_file or not os.path.exists(legacy_file):
+            return
+        with self._lock:
+            if self._connection.execute("SELECT 1 FROM query_history LIMIT 1").fetchone():
+                return
+            with open(legacy_file, "r") as file:
+                entries = json.load(file)
+            created_at = os.path.getmtime(legacy_file)
+            self._connection.executemany(
+                "INSERT INTO query_history (created_at, question, sql, status) VALUES (?, ?, ?, 'unknown')",
+                [(created_at, question, sql) for question, sql in entries],
+            )
+            self._connection.commit()
+
+    def append(self, question, sql, backend=None, model=None, status="ok", latency_ms=None, row_count=None, error=None):
+        """
+        Records one query.
+
+        :param status: "ok", "error" (generation or execution failed) or "streamed".
+        :param latency_ms: Time from question to result, in milliseconds.
+        :return: Id of the new entry.
+        """
+        with self._lock:
+            cursor = self._connection.execute(
+                "INSERT INTO query_history (created_at, question, sql, backend, model, status, latency_ms, row_count, error) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (time.time(), question, sql, backend, model, status,
+                 round(latency_ms, 1) if latency_ms is not None else None, row_count, error),
+            )
+            self._connection.commit()
+            return cursor.lastrowid
+
+    def search(self, limit=50, before_id=None, status=None, backend=None, model=None, since=None, until=None, text=None):
+        """
+        Returns history entries, newest first, with keyset pagination.
+
+        :param limit: Maximum number of entries.
+        :param before_id: Only entries older than this id (the previous page's next_cursor).
+        :param status: Only entries with this status.
+        :param backend: Only entries generated by this LLM backend.
+        :param model: Only entries generated by this model.
+        :param since: Only entries at or after this Unix timestamp.
+        :param until: Only entries before this Unix timestamp.
+        :param text: Full-text search over questions and SQL.
+        :return: Tuple of (list of entry dicts, id to pass as before_id for the next page or None).
+        """
+        conditions, params = [], []
+        for column, value in (("status", status), ("backend", backend), ("model", model)):
+            if value is not None:
+                conditions.append(f"h.{column} = ?")
+                params.append(value)
+        if before_id is not None:
+            conditions.append("h.id < ?")
+            params.append(int(before_id))
+        if since is not None:
+            conditions.append("h.created_at >= ?")
+            params.append(float(since))
+        if until is not None:
+            conditions.append("h.created_at < ?")
+            params.append(float(until))
+
+        source = "query_history AS h"
+        terms = re.findall(r"\w+", text or "")
+        if terms and self.full_text_search:
+            source += " JOIN query_history_fts AS f ON f.rowid = h.id"
+            conditions.append("query_history_fts MATCH ?")
+            params.append(" AND ".join(f'"{term}"*' for term in terms))
+        else:
+            for term in terms:
+                conditions.append("(h.question LIKE ? OR h.sql LIKE ?)")
+                params.extend([f"%{term}%", f"%{term}%"])
+
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        with self._lock:
+            cursor = self._connection.execute(
+                f"SELECT h.* FROM {source} {where} ORDER BY h.id DESC LIMIT ?", params + [int(limit) + 1])
+            columns = [column[0] for column in cursor.description]
+            rows = [dict(zip(columns, row)) for row in cursor.fetchall()]
+        next_cursor = rows[limit - 1]["id"] if len(rows) > limit else None
+        return rows[:limit], next_cursor
+
+    def executed_queries(self, limit=200):
+        """
+        Returns the most recently executed distinct SQL statements that succeeded.
+        """
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT sql FROM query_history WHERE sql IS NOT NULL AND status IN ('ok', 'streamed') "
+                "GROUP BY sql ORDER BY MAX(id) DESC LIMIT ?", (limit,)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def recent_pairs(self, limit=100):
+        """
+        Returns the latest (question, SQL) pairs, oldest first.
+        """
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT question, sql FROM query_history WHERE sql IS NOT NULL ORDER BY id DESC LIMIT ?", (limit,)
+            ).fetchall()
+        return [tuple(row) for row in reversed(rows)]
+
+    def stats(self):
+        with self._lock:
+            entries, errors, latency = self._connection.execute(
+                "SELECT COUNT(*), SUM(status = 'error'), AVG(latency_ms) FROM query_history").fetchone()
+        return {
+            "entries": entries,
+            "errors": errors or 0,
+            "avg_latency_ms": round(latency, 1) if latency is not None else None,
+            "full_text_search": self.full_text_search,
+        }
+
+
+class SharedQueryHistoryStore:
+    """
+    Query history kept as an append-only log in a shared state backend (see
+    ``helpers.state_backend``), so every node records into and reads the same history.
+
+    Offers the same methods as `QueryHistoryStore`. Filters and text search are applied while
+    scanning the log newest first, up to `scan_limit` entries per call; text search matches
+    substrings instead of using FTS.
+    """
+
+    LOG = "query_history"
+
+    def __init__(self, backend, scan_limit=20000, page_size=500):
+        """
+        :param backend: Shared `StateBackend`.
+        :param scan_limit: Most entries examined by one search.
+        :param page_size: Entries fetched from the backend at a time.
+        """
+        self.backend = backend
+        self.scan_limit = scan_limit
+        self.page_size = page_size
+        self.full_text_search = False
+
+    def append(self, question, sql, backend=None, model=None, status="ok", latency_ms=None, row_count=None, error=None):
+        latency_ms = round(latency_ms, 1) if latency_ms is not None else None
+        entry_id = self.backend.append(self.LOG, {
+            "created_at": time.time(), "question": question, "sql": sql, "backend": backend, "model": model,
+            "status": status, "latency_ms": latency_ms, "row_count": row_count, "error": error,
+        })
+        self.backend.incr(f"{self.LOG}:entries")
+        if status == "error":
+            self.backend.incr(f"{self.LOG}:errors")
+        if latency_ms is not None:
+            self.backend.incr(f"{self.LOG}:timed")
+            self.backend.incr(f"{self.LOG}:latency_ms", int(latency_ms))
+        return entry_id
+
+    def _entries(self, before_id=None):
+        scanned = 0
+        while scanned < self.scan_limit:
+            page = self.backend.scan(self.LOG, before_id, min(self.page_size, self.scan_limit - scanned))
+            for entry_id, record in page:
+                yield dict(record, id=entry_id)
+            if len(page) < self.page_size:
+                return
+            scanned += len(page)
+            before_id = page[-1][0]
+
+    def search(self, limit=50, before_id=None, status=None, backend=None, model=None, since=None, until=None, text=None):
+        terms = [term.lower() for term in re.findall(r"\w+", text or "")]
+        filters = {"status": status, "backend": backend, "model": model}
+        rows = []
+        for entry in self._entries(int(before_id) if before_id is not None else None):
+            if since is not None and entry["created_at"] < float(since):
+                break  # Entries are ordered by time, so older ones cannot match either
+            if until is not None and entry["created_at"] >= float(until):
+                continue
+            if any(value is not None and entry[column] != value for column, value in filters.items()):
+                continue
+            searchable = f"{entry['question'] or ''} {entry['sql'] or ''}".lower()
+            if not all(term in searchable for term in terms):
+                continue
+            rows.append(entry)
+            if len(rows) > limit:
+                break
+        next_cursor = rows[limit - 1]["id"] if len(rows) > limit else None
+        return rows[:limit], next_cursor
+
+    def executed_queries(self, limit=200):
+        queries = {}
+        for entry in self._entries():
+            if entry["sql"] and entry["status"] in ("ok", "streamed"):
+                queries.setdefault(entry["sql"], None)
+                if len(queries) == limit:
+                    break
+        return list(queries)
+
+    def recent_pairs(self, limit=100):
+        pairs = []
+        for entry in self._entries():
+            if entry["sql"]:
+                pairs.append((entry["question"], entry["sql"]))
+                if len(pairs) == limit:
+                    break
+        return list(reversed(pairs))
+
+    def stats(self):
+        timed = self.backend.get(f"{self.LOG}:timed") or 0
+        return {
+            "entries": self.backend.get(f"{self.LOG}:entries") or 0,
+            "errors": self.backend.get(f"{self.LOG}:errors") or 0,
+            "avg_latency_ms": round((self.backend.get(f"{self.LOG}:latency_ms") or 0) / timed, 1) if timed else None,
+            "full_text_search": False,
+        }
+
+
+_history_store = None
+_history_store_lock = threading.Lock()
+
+
+def get_query_history_store():
+    """
+    Returns the process-wide query history store: the shared state backend's log when the
+    backend is shared between nodes, otherwise a SQLite file at QUERY_HISTORY_PATH
+    (default: query_history.db) that the workers of a node share.
+    """
+    global _history_store
+    with _history_store_lock:
+        if _history_store is None:
+            state = get_state_backend()
+            if state.shared:
+                _history_store = SharedQueryHistoryStore(state)
+            else:
+                _history_store = QueryHistoryStore(path=os.getenv("QUERY_HISTORY_PATH", HISTORY_DB_FILE))
+        return _history_store
+
+
+# Function to load the latest query history entries
+def load_query_history(limit=100):
+    return get_query_history_store().recent_pairs(limit)
+
+# Function to record a query in the history
+def record_query(question, sql, backend=None, model=None, status="ok", latency_ms=None, row_count=None, error=None):
+    return get_query_history_store().append(question, sql, backend, model, status, latency_ms, row_count, error)
 
 def display_query_history():
     st.write("### Query History")
@@ -23,4 +297,3 @@ def display_query_history():
             st.markdown(f"**Description:** {nl_query}")
             st.markdown("**Generated SQL:**")
             st.code(sql_query, language="sql")
-
@@ -0,0 +1,161 @@
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+import pandas as pd
+import sqlglot
+from sqlglot import exp
+
+# Functions whose result changes between executions; queries using them are never cached
+VOLATILE_FUNCTIONS = {
+    "random", "rand", "randomblob", "now", "current_timestamp", "current_date", "current_time",
+    "localtimestamp", "localtime", "sysdate", "systimestamp", "getdate", "uuid", "gen_random_uuid", "newid",
+}
+
+READ_STATEMENTS = (exp.Select, exp.Union, exp.Intersect, exp.Except)
+WRITE_STATEMENTS = (exp.Insert, exp.Update, exp.Delete, exp.Merge)
+
+
+def analyze_query(query, dialect=None):
+    """
+    Parses a query with sqlglot and classifies it for the result cache.
+
+    :param query: SQL query string.
+    :param dialect: sqlglot dialect name (e.g. "sqlite", "postgres").
+    :return: Dictionary with "canonical" SQL, the "tables" it touches, and flags
+             "cacheable" (deterministic read), "write" (DML) and "ddl". Unparseable
+             queries are reported as DDL so callers fall back to a full invalidation.
+    """
+    try:
+        statements = [statement for statement in sqlglot.parse(query, read=dialect) if statement is not None]
+    except Exception:
+        statements = []
+    if len(statements) != 1:
+        return {"canonical": None, "tables": set(), "cacheable": False, "write": False, "ddl": True}
+
+    statement = statements[0]
+    cte_names = {cte.alias_or_name.lower() for cte in statement.find_all(exp.CTE)}
+    tables = {table.name.lower() for table in statement.find_all(exp.Table) if table.name} - cte_names
+    volatile = any(
+        (function.sql_name() if not isinstance(function, exp.Anonymous) else function.name).lower() in VOLATILE_FUNCTIONS
+        for function in statement.find_all(exp.Func)
+    ) or any(
+        # SQLite date functions read the clock through the 'now' modifier
+        literal.is_string and literal.this.lower() == "now"
+        for literal in statement.find_all(exp.Literal)
+    )
+    is_read = isinstance(statement, READ_STATEMENTS)
+    return {
+        "canonical": statement.sql(dialect=dialect) if is_read else None,
+        "tables": tables,
+        "cacheable": is_read and not volatile,
+        "write": isinstance(statement, WRITE_STATEMENTS),
+        "ddl": not is_read and not isinstance(statement, WRITE_STATEMENTS),
+    }
+
+
+def estimate_size(value):
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(index=True, deep=True).sum())
+    return sys.getsizeof(value)
+
+
+class QueryResultCache:
+    """
+    In-memory cache of query results keyed on canonicalized SQL.
+
+    Every entry remembers the tables it reads, so a DML statement or an upload touching one
+    of them drops exactly the affected results. Bounded by entry count and total size, with
+    a TTL as a safety net for writes made outside the connector.
+    """
+
+    def __init__(self, max_entries=256, max_bytes=256 * 1024 * 1024, ttl=300):
+        """
+        :param max_entries: Maximum number of cached results (default: 256).
+        :param max_bytes: Maximum total size of cached results (default: 256 MB).
+        :param ttl: Seconds an entry stays valid, 0 to never expire (default: 300).
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self.ttl and time.time() - entry["created_at"] > self.ttl:
+                self._remove(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            value = entry["value"]
+        return value.copy() if isinstance(value, pd.DataFrame) else value
+
+    def put(self, key, value, tables):
+        size = estimate_size(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = {"value": value, "tables": set(tables), "size": size, "created_at": time.time()}
+            self.total_bytes += size
+            while len(self._entries) > self.max_entries or self.total_bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+
+    def invalidate_tables(self, tables):
+        """
+        Drops every cached result that reads one of the given tables.
+        """
+        tables = {table.lower() for table in tables}
+        with self._lock:
+            stale = [key for key, entry in self._entries.items() if entry["tables"] & tables]
+            for key in stale:
+                self._remove(key)
+            self.invalidations += len(stale)
+
+    def clear(self):
+        with self._lock:
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+            self.total_bytes = 0
+
+    def _remove(self, key):
+        entry = self._entries.pop(key)
+        self.total_bytes -= entry["size"]
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self.total_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "invalidations": self.invalidations,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+def result_cache_from_env():
+    """
+    Builds a result cache from RESULT_CACHE ("on"/"off"), RESULT_CACHE_MAX_ENTRIES,
+    RESULT_CACHE_MAX_MB and RESULT_CACHE_TTL (seconds). Returns None when disabled.
+    """
+    if os.getenv("RESULT_CACHE", "on").lower() in {"off", "false", "0"}:
+        return None
+    return QueryResultCache(
+        max_entries=int(os.getenv("RESULT_CACHE_MAX_ENTRIES", 256)),
+        max_bytes=int(float(os.getenv("RESULT_CACHE_MAX_MB", 256)) * 1024 * 1024),
+        ttl=int(os.getenv("RESULT_CACHE_TTL", 300)),
+    )
@@ -0,0 +1,163 @@
+import base64
+import hashlib
+import hmac
+import json
+import os
+import secrets
+import sqlglot
+from sqlglot import exp
+from helpers.state_backend import get_state_backend
+
+STREAM_FORMATS = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+_cursor_secret = None
+
+
+def cursor_secret():
+    """
+    Returns the key signing pagination cursors: CURSOR_SECRET, or else one generated once
+    and kept in the state backend, so every worker accepts the cursors of the others.
+    """
+    global _cursor_secret
+    if _cursor_secret is None:
+        secret = os.getenv("CURSOR_SECRET")
+        if not secret:
+            state = get_state_backend()
+            state.add("cursor_secret", secrets.token_hex(32))  # The first worker's key wins
+            secret = state.get("cursor_secret")
+        _cursor_secret = secret
+    return _cursor_secret
+
+
+def paginate_sql(query, offset, limit, dialect=None, columns=None):
+    """
+    Wraps a SELECT so it returns `limit` rows starting at `offset`, in the given dialect.
+
+    Every page is a separate execution, and rows only come back in the same order each
+    time when that order is total. The page is therefore ordered by the query's own
+    ORDER BY, then by every output column, as positions so no column name is needed.
+
+    :param query: SELECT statement.
+    :param offset: Number of rows to skip.
+    :param limit: Maximum number of rows to return.
+    :param dialect: sqlglot dialect name (e.g. "sqlite", "postgres").
+    :param columns: Output column names; required when the select list has a star
+        (see `has_star_projection`).
+    :return: Paginated SQL string.
+    :raises ValueError: If the query is ordered by an expression missing from its output.
+    """
+    inner = sqlglot.parse_one(query.strip().rstrip(";"), read=dialect)
+    selects = inner.selects
+    if columns is None:
+        if _has_star(selects):
+            raise ValueError("Paginating a SELECT * needs its output column names")
+        columns = [select.alias_or_name for select in selects]
+
+    positions = []
+    for ordered in (inner.args.get("order") or exp.Order()).expressions:
+        position = _output_position(ordered.this, selects, columns)
+        if position is None:
+            raise ValueError(f"Cannot paginate: ORDER BY {ordered.this.sql(dialect=dialect)} "
+                             "is not in the select list; add it as a column")
+        ordered = ordered.copy()
+        ordered.set("this", exp.Literal.number(position))
+        positions.append(ordered)
+    used = {int(ordered.this.name) for ordered in positions}  # Positions already ordered on
+    positions += [str(position) for position in range(1, len(columns) + 1) if position not in used]
+
+    page = exp.select("*").from_(inner.subquery("page"))
+    if positions:
+        page = page.order_by(*positions, dialect=dialect)
+    return page.limit(limit).offset(offset).sql(dialect=dialect)
+
+
+def has_star_projection(query, dialect=None):
+    """
+    True when a SELECT's output columns cannot be read from its text (SELECT *, t.*).
+    """
+    return _has_star(sqlglot.parse_one(query.strip().rstrip(";"), read=dialect).selects)
+
+
+def column_probe_sql(query, dialect=None):
+    """
+    Returns a SELECT of at most one row with the same output columns as `query`; one row
+    rather than none, since connectors report an empty result as a message.
+    """
+    inner = sqlglot.parse_one(query.strip().rstrip(";"), read=dialect)
+    return exp.select("*").from_(inner.subquery("page")).limit(1).sql(dialect=dialect)
+
+
+def _has_star(selects):
+    return any(isinstance(select, exp.Star) or (isinstance(select, exp.Column) and select.is_star)
+               for select in selects)
+
+
+def _output_position(key, selects, columns):
+    """
+    Returns the 1-based output position an ORDER BY key refers to, or None.
+    """
+    if isinstance(key, exp.Literal) and key.is_int:
+        return int(key.name)
+    if not _has_star(selects):
+        for index, select in enumerate(selects):
+            if select.unalias() == key:
+                return index + 1
+    if isinstance(key, exp.Column):
+        names = [str(column).lower() for column in columns]
+        if key.name.lower() in names:
+            return names.index(key.name.lower()) + 1
+    return None
+
+
+def encode_cursor(query, offset, dataset_id=None):
+    """
+    Returns an opaque, signed token pointing at the next page of a query's result on a dataset.
+    """
+    data = {"sql": query, "offset": offset}
+    if dataset_id is not None:
+        data["dataset"] = dataset_id
+    payload = base64.urlsafe_b64encode(json.dumps(data).encode()).decode()
+    signature = hmac.new(cursor_secret().encode(), payload.encode(), hashlib.sha256).hexdigest()
+    return f"{payload}.{signature}"
+
+
+def decode_cursor(cursor):
+    """
+    Verifies a cursor token and returns its (query, offset, dataset ID or None).
+
+    :raises ValueError: If the token is malformed or was not issued by this server.
+    """
+    try:
+        payload, signature = cursor.rsplit(".", 1)
+    except ValueError:
+        raise ValueError("Malformed cursor")
+    expected = hmac.new(cursor_secret().encode(), payload.encode(), hashlib.sha256).hexdigest()
+    if not hmac.compare_digest(signature, expected):
+        raise ValueError("Invalid cursor")
+    data = json.loads(base64.urlsafe_b64decode(payload.encode()))
+    return data["sql"], int(data["offset"]), data.get("dataset")
+
+
+def iter_ndjson(chunks):
+    """
+    Converts DataFrame chunks into newline-delimited JSON records.
+
+    A query failing midway, after the response started, ends the stream with an
+    {"error": ...} record so clients can tell the result is incomplete.
+    """
+    try:
+        for chunk in chunks:
+            if not chunk.empty:
+                yield chunk.to_json(orient="records", lines=True, date_format="iso").rstrip("\n") + "\n"
+    except Exception as e:
+        yield json.dumps({"error": str(e)}) + "\n"
+
+
+def iter_csv(chunks):
+    """
+    Converts DataFrame chunks into CSV text, writing the header only once.
+    """
+    header = True
+    for chunk in chunks:
+        yield chunk.to_csv(index=False, header=header)
+        header = False
@@ -0,0 +1,66 @@
+import threading
+from collections import OrderedDict
+
+
+class SchemaCache:
+    """
+    Small thread-safe cache for rendered schema strings.
+
+    Entries are keyed on a cheap database fingerprint (e.g. SQLite ``PRAGMA schema_version``
+    or a hash of the Postgres catalog) plus the arguments used to render the schema, so a
+    DDL change or a new upload naturally produces a miss.
+    """
+
+    def __init__(self, max_entries=16):
+        """
+        :param max_entries: Maximum number of rendered schemas kept (default: 16).
+        """
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self):
+        """
+        Drops every cached schema. Called after uploads and DDL run through the connector.
+        """
+        with self._lock:
+            self._entries.clear()
+            self.invalidations += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "invalidations": self.invalidations,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+def is_ddl_statement(query):
+    """
+    Returns True if the query changes the database structure.
+    """
+    first_word = query.strip().split(None, 1)[0].lower() if query.strip() else ""
+    return first_word in {"create", "alter", "drop", "rename", "truncate"}
@@ -0,0 +1,161 @@
+import math
+import os
+import re
+from collections import Counter
+
+# Weight of each schema field when building a table's bag of words
+FIELD_WEIGHTS = {"table": 3, "column": 2, "comment": 1, "sample": 1}
+
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "each", "for", "from", "get", "give", "how",
+    "i", "in", "is", "it", "list", "me", "many", "much", "of", "on", "or", "per", "show", "than",
+    "that", "the", "their", "there", "to", "was", "what", "when", "where", "which", "who", "with",
+}
+
+
+def tokenize(text):
+    """
+    Splits text into lowercase search terms.
+
+    snake_case and camelCase identifiers are split into their parts and a trailing plural
+    "s" is dropped, so "OrderItems" and "order_item" match the question word "orders".
+    """
+    if text is None:
+        return []
+    text = re.sub(r"([a-z0-9])([A-Z])", r"\1 \2", str(text))
+    tokens = []
+    for token in re.split(r"[^A-Za-z0-9]+", text.lower()):
+        if not token or token in STOPWORDS:
+            continue
+        if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+            token = token[:-1]
+        tokens.append(token)
+    return tokens
+
+
+def render_create_table(table_name, columns):
+    """
+    Renders a CREATE TABLE statement for a subset of a table's columns.
+
+    :param table_name: Name of the table.
+    :param columns: List of column dictionaries with "name" and "type" keys.
+    :return: CREATE TABLE statement as a string.
+    """
+    column_lines = ",\n".join(f"\t{column['name']} {column['type']}" for column in columns)
+    return f"\nCREATE TABLE {table_name} (\n{column_lines}\n)\n\n"
+
+
+class SchemaIndex:
+    """
+    BM25 index over the tables of a database schema.
+
+    Each table is one document made of its name, column names, comments and sample values.
+    Built once per schema fingerprint and kept in the connector's schema cache.
+    """
+
+    def __init__(self, tables, k1=1.5, b=0.75):
+        """
+        :param tables: Table entries as produced by the connectors' schema reflection.
+        :param k1: BM25 term-frequency saturation (default: 1.5).
+        :param b: BM25 length normalization (default: 0.75).
+        """
+        self.tables = tables
+        self.k1 = k1
+        self.b = b
+        self.documents = [self._table_terms(table) for table in tables]
+        self.column_terms = [
+            [set(self._column_terms(table, position)) for position in range(len(table["columns"]))]
+            for table in tables
+        ]
+        self.avg_length = (sum(sum(doc.values()) for doc in self.documents) / len(self.documents)) if self.documents else 0
+        document_frequency = Counter(term for doc in self.documents for term in doc)
+        total = len(self.documents)
+        self.idf = {
+            term: math.log(1 + (total - freq + 0.5) / (freq + 0.5))
+            for term, freq in document_frequency.items()
+        }
+
+    @staticmethod
+    def _column_terms(table, position):
+        column = table["columns"][position]
+        terms = tokenize(column["name"]) + tokenize(column.get("comment"))
+        for row in table.get("sample_rows", []):
+            if position < len(row) and isinstance(row[position], str):
+                terms += tokenize(row[position])
+        return terms
+
+    def _table_terms(self, table):
+        terms = Counter()
+        for term in tokenize(table["name"]):
+            terms[term] += FIELD_WEIGHTS["table"]
+        for term in tokenize(table.get("comment")):
+            terms[term] += FIELD_WEIGHTS["comment"]
+        for column in table["columns"]:
+            for term in tokenize(column["name"]):
+                terms[term] += FIELD_WEIGHTS["column"]
+            for term in tokenize(column.get("comment")):
+                terms[term] += FIELD_WEIGHTS["comment"]
+        for row in table.get("sample_rows", []):
+            for value in row:
+                if isinstance(value, str):
+                    for term in tokenize(value):
+                        terms[term] += FIELD_WEIGHTS["sample"]
+        return terms
+
+    def score(self, question_terms, position):
+        document = self.documents[position]
+        length = sum(document.values())
+        score = 0.0
+        for term in question_terms:
+            frequency = document.get(term, 0)
+            if not frequency:
+                continue
+            norm = self.k1 * (1 - self.b + self.b * length / self.avg_length) if self.avg_length else self.k1
+            score += self.idf.get(term, 0.0) * frequency * (self.k1 + 1) / (frequency + norm)
+        return score
+
+    def search(self, question, top_k=5, max_columns=30, min_score=0.0):
+        """
+        Returns the tables most relevant to a question.
+
+        Tables with more than `max_columns` columns are narrowed to the columns that match
+        the question, topped up with the leading columns (usually keys) up to the limit.
+
+        :param question: Natural language question.
+        :param top_k: Maximum number of tables to return (default: 5).
+        :param max_columns: Column count above which a table's columns are pruned (default: 30).
+        :param min_score: Tables scoring at or below this are ignored (default: 0.0).
+        :return: List of (table, columns) tuples; empty when nothing matches.
+        """
+        question_terms = set(tokenize(question))
+        scored = [(self.score(question_terms, position), position) for position in range(len(self.tables))]
+        scored = sorted((item for item in scored if item[0] > min_score), key=lambda item: -item[0])[:top_k]
+
+        results = []
+        for _, position in scored:
+            table = self.tables[position]
+            columns = list(range(len(table["columns"])))
+            if len(columns) > max_columns:
+                matched = [i for i in columns if self.column_terms[position][i] & question_terms]
+                leading = [i for i in columns if i not in matched][:max(max_columns - len(matched), 0)]
+                columns = sorted(matched + leading)
+            results.append((table, columns))
+        return results
+
+
+def schema_retrieval_settings():
+    """
+    Reads schema retrieval settings from the environment.
+
+    SCHEMA_PRUNING: "on" to send only relevant tables, "off" to always send the full schema.
+    SCHEMA_TOP_K: Number of tables to keep (default: 5).
+    SCHEMA_MAX_COLUMNS: Columns per table above which columns are pruned (default: 30).
+    SCHEMA_MIN_SCORE: BM25 score a table needs to be kept; when no table reaches it the
+    full schema is sent instead (default: 0).
+    """
+    return {
+        "enabled": os.getenv("SCHEMA_PRUNING", "on").lower() not in {"off", "false", "0"},
+        "top_k": int(os.getenv("SCHEMA_TOP_K", 5)),
+        "max_columns": int(os.getenv("SCHEMA_MAX_COLUMNS", 30)),
+        "min_score": float(os.getenv("SCHEMA_MIN_SCORE", 0)),
+    }
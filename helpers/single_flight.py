@@ -0,0 +1,54 @@
+import asyncio
+
+
+class SingleFlight:
+    """
+    Coalesces identical concurrent async calls into a single execution.
+
+    The first caller for a key starts the work as a task; callers arriving while it is in
+    flight await the same task and receive the same result (or exception). The task is
+    shielded, so a disconnecting caller does not cancel the work for the others; it is
+    cancelled only once every caller waiting for it has been cancelled.
+    """
+
+    def __init__(self):
+        self._in_flight = {}
+        self._waiters = {}
+        self.executions = 0
+        self.coalesced = 0
+        self.abandoned = 0
+
+    async def do(self, key, func):
+        """
+        :param key: Hashable identity of the call.
+        :param func: Zero-argument coroutine function performing the work.
+        :return: Result of the shared execution.
+        """
+        task = self._in_flight.get(key)
+        if task is None:
+            self.executions += 1
+            task = asyncio.ensure_future(func())
+            self._in_flight[key] = task
+            task.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        else:
+            self.coalesced += 1
+        self._waiters[task] = self._waiters.get(task, 0) + 1
+        try:
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if self._waiters[task] == 1 and not task.done():
+                self.abandoned += 1
+                task.cancel()
+            raise
+        finally:
+            self._waiters[task] -= 1
+            if not self._waiters[task]:
+                del self._waiters[task]
+
+    def stats(self):
+        return {
+            "in_flight": len(self._in_flight),
+            "executions": self.executions,
+            "coalesced": self.coalesced,
+            "abandoned": self.abandoned,
+        }
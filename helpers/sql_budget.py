@@ -0,0 +1,77 @@
+import os
+import sqlglot
+from sqlglot import exp
+import pandas as pd
+
+LIMITABLE_STATEMENTS = (exp.Select, exp.Union, exp.Intersect, exp.Except)
+
+
+def result_budget_settings():
+    """
+    Reads the result-size budget from the environment.
+
+    RESULT_MAX_ROWS: Rows returned by a preview query, 0 to disable (default: 1000).
+    RESULT_MAX_MB: Memory a preview result may occupy, 0 to disable (default: 50).
+    """
+    return {
+        "max_rows": int(os.getenv("RESULT_MAX_ROWS", 1000)),
+        "max_bytes": int(float(os.getenv("RESULT_MAX_MB", 50)) * 1024 * 1024),
+    }
+
+
+def apply_row_limit(query, max_rows, dialect=None):
+    """
+    Adds or clamps the LIMIT of the outermost SELECT so at most `max_rows + 1` rows come back.
+
+    The extra row tells the caller whether the result was cut off. Queries whose own LIMIT
+    already fits the budget, non-SELECT statements and unparseable SQL are returned unchanged.
+
+    :param query: SQL query string.
+    :param max_rows: Row budget.
+    :param dialect: sqlglot dialect name (e.g. "sqlite", "postgres").
+    :return: Tuple of (SQL to execute, whether a limit was applied).
+    """
+    if not max_rows:
+        return query, False
+    try:
+        statement = sqlglot.parse_one(query.strip().rstrip(";"), read=dialect)
+    except Exception:
+        return query, False
+    if not isinstance(statement, LIMITABLE_STATEMENTS):
+        return query, False
+
+    limit = statement.args.get("limit")
+    if limit is not None:
+        expression = limit.expression
+        if not isinstance(expression, exp.Literal) or not expression.is_int:
+            return query, False
+        if int(expression.this) <= max_rows:
+            return query, False
+
+    return statement.limit(max_rows + 1).sql(dialect=dialect), True
+
+
+def enforce_result_budget(query_result, max_rows, max_bytes):
+    """
+    Trims a result to the row and byte budget.
+
+    :param query_result: DataFrame (other results are returned as is).
+    :param max_rows: Row budget, 0 to disable.
+    :param max_bytes: Byte budget, 0 to disable.
+    :return: Tuple of (trimmed result, whether rows were dropped).
+    """
+    if not isinstance(query_result, pd.DataFrame) or query_result.empty:
+        return query_result, False
+
+    rows = len(query_result)
+    if max_rows:
+        rows = min(rows, max_rows)
+    if max_bytes:
+        total_bytes = int(query_result.memory_usage(index=True, deep=True).sum())
+        if total_bytes > max_bytes:
+            bytes_per_row = total_bytes / len(query_result)
+            rows = min(rows, max(int(max_bytes / bytes_per_row), 1))
+
+    if rows < len(query_result):
+        return query_result.iloc[:rows].reset_index(drop=True), True
+    return query_result, False
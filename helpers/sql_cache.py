@@ -0,0 +1,191 @@
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+from helpers.state_backend import get_state_backend
+
+SQL_CACHE_FILE = "sql_cache.db"
+TOUCH_FLUSH_SIZE = 100  # Buffered last-used times written per batch
+
+
+def normalize_question(question):
+    """
+    Normalizes a natural language question for cache lookups: case, whitespace and
+    trailing punctuation are ignored.
+    """
+    question = re.sub(r"\s+", " ", question or "").strip().lower()
+    return question.rstrip("?.!; ")
+
+
+class SQLGenerationCache:
+    """
+    Persistent cache of generated SQL, backed by a SQLite file so it survives restarts.
+
+    Keys combine the normalized question, LLM backend, model and schema fingerprint.
+    Entries expire after `ttl` seconds and the least recently used ones are evicted once
+    the cache holds more than `max_entries`. Hits only note the use time in memory; it is
+    written in batches and before every eviction, so lookups do not write to disk.
+    """
+
+    def __init__(self, path=SQL_CACHE_FILE, max_entries=1000, ttl=7 * 24 * 3600):
+        """
+        :param path: SQLite file holding the cache (default: sql_cache.db).
+        :param max_entries: Maximum number of cached queries (default: 1000).
+        :param ttl: Seconds an entry stays valid, 0 to never expire (default: one week).
+        """
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._touched = {}  # key -> last use time not yet written to the file
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS sql_cache ("
+            "key TEXT PRIMARY KEY, question TEXT, backend TEXT, model TEXT, "
+            "sql TEXT NOT NULL, created_at REAL NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._connection.execute("CREATE INDEX IF NOT EXISTS sql_cache_last_used ON sql_cache(last_used)")
+        self._connection.commit()
+
+    @staticmethod
+    def make_key(question, backend, model, schema_version):
+        raw = "\x1f".join([normalize_question(question), str(backend), str(model), str(schema_version)])
+        return hashlib.sha256(raw.encode()).hexdigest()
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            row = self._connection.execute("SELECT sql, created_at FROM sql_cache WHERE key = ?", (key,)).fetchone()
+            if row and self.ttl and now - row[1] > self.ttl:
+                self._connection.execute("DELETE FROM sql_cache WHERE key = ?", (key,))
+                self._connection.commit()
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            self._touched[key] = now
+            if len(self._touched) >= TOUCH_FLUSH_SIZE:
+                self._flush_touched()
+                self._connection.commit()
+            self.hits += 1
+            return row[0]
+
+    def _flush_touched(self):
+        # Caller holds self._lock and commits
+        if self._touched:
+            self._connection.executemany(
+                "UPDATE sql_cache SET last_used = ? WHERE key = ?",
+                [(used, key) for key, used in self._touched.items()])
+            self._touched.clear()
+
+    def put(self, key, sql, question=None, backend=None, model=None):
+        now = time.time()
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO sql_cache (key, question, backend, model, sql, created_at, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, question, backend, model, sql, now, now),
+            )
+            self._touched.pop(key, None)
+            self._flush_touched()
+            self._connection.execute(
+                "DELETE FROM sql_cache WHERE key IN ("
+                "SELECT key FROM sql_cache ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+            self._connection.commit()
+
+    def clear(self):
+        with self._lock:
+            self._connection.execute("DELETE FROM sql_cache")
+            self._connection.commit()
+            self._touched.clear()
+
+    def stats(self):
+        with self._lock:
+            entries = self._connection.execute("SELECT COUNT(*) FROM sql_cache").fetchone()[0]
+            lookups = self.hits + self.misses
+            return {
+                "entries": entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+class SharedSQLGenerationCache:
+    """
+    Cache of generated SQL in a shared state backend (see ``helpers.state_backend``), so
+    every node reuses the SQL any of them generated.
+
+    Offers the same methods as `SQLGenerationCache`. Entries expire after `ttl` seconds;
+    the backend bounds memory instead of an entry count (e.g. Redis maxmemory with an LRU
+    policy). Hit and miss counters are per process.
+    """
+
+    make_key = staticmethod(SQLGenerationCache.make_key)
+
+    def __init__(self, backend, ttl=7 * 24 * 3600):
+        self.backend = backend
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+    def _key(self, key):
+        # Bumping the generation clears the cache without enumerating its keys
+        return f"sql_cache:{self.backend.get('sql_cache:generation') or 0}:{key}"
+
+    def get(self, key):
+        sql = self.backend.get(self._key(key))
+        if sql is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return sql
+
+    def put(self, key, sql, question=None, backend=None, model=None):
+        self.backend.set(self._key(key), sql, ttl=self.ttl or None)
+
+    def clear(self):
+        self.backend.incr("sql_cache:generation")
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "entries": None,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+_sql_cache = None
+_sql_cache_lock = threading.Lock()
+
+
+def get_sql_cache():
+    """
+    Returns the process-wide SQL generation cache, or None when disabled.
+
+    Configured through SQL_CACHE ("on"/"off"), SQL_CACHE_PATH, SQL_CACHE_MAX_ENTRIES and
+    SQL_CACHE_TTL (seconds). With a shared state backend the cache lives there instead of
+    in the SQLite file.
+    """
+    global _sql_cache
+    if os.getenv("SQL_CACHE", "on").lower() in {"off", "false", "0"}:
+        return None
+    with _sql_cache_lock:
+        if _sql_cache is None and get_state_backend().shared:
+            _sql_cache = SharedSQLGenerationCache(get_state_backend(), ttl=int(os.getenv("SQL_CACHE_TTL", 7 * 24 * 3600)))
+        if _sql_cache is None:
+            _sql_cache = SQLGenerationCache(
+                path=os.getenv("SQL_CACHE_PATH", SQL_CACHE_FILE),
+                max_entries=int(os.getenv("SQL_CACHE_MAX_ENTRIES", 1000)),
+                ttl=int(os.getenv("SQL_CACHE_TTL", 7 * 24 * 3600)),
+            )
+        return _sql_cache
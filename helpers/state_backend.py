@@ -0,0 +1,278 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+
+# Redis is optional; it is only needed for the shared backend
+try:
+    import redis
+except ImportError:
+    redis = None
+
+# fakeredis is optional; it is only needed for the in-process stand-in of the shared backend
+try:
+    import fakeredis
+except ImportError:
+    fakeredis = None
+
+STATE_FILE = "state.db"
+
+
+def state_backend_settings():
+    """
+    Reads state backend settings from the environment.
+
+    STATE_BACKEND: "local" keeps state in a SQLite file, shared by the workers of one node;
+        "redis" keeps it in Redis, shared by every node; "fakeredis" runs the Redis backend
+        against an in-process fakeredis server, private to one worker, for development and
+        tests (default: local).
+    STATE_PATH: SQLite file of the local backend (default: state.db).
+    STATE_REDIS_URL: Redis URL of the shared backend (default: redis://localhost:6379/0).
+    STATE_PREFIX: Prefix of every Redis key, to share one Redis between deployments (default: docgene:).
+
+    Dataset databases and uploads (SQLITE_DB_PATH) still live on the filesystem; with several
+    nodes it must be a volume all of them mount.
+    """
+    return {
+        "backend": os.getenv("STATE_BACKEND", "local").lower(),
+        "path": os.getenv("STATE_PATH", STATE_FILE),
+        "redis_url": os.getenv("STATE_REDIS_URL", "redis://localhost:6379/0"),
+        "prefix": os.getenv("STATE_PREFIX", "docgene:"),
+    }
+
+
+class StateBackend(ABC):
+    """
+    Mutable API state shared by all workers: JSON values with optional expiry, counters,
+    locks and append-only logs.
+
+    Subclasses implement the primitives; locks are built on `add`.
+    """
+
+    shared = False  # Whether the state is visible to other nodes, not only other local workers
+
+    @abstractmethod
+    def get(self, key):
+        pass
+
+    @abstractmethod
+    def set(self, key, value, ttl=None):
+        pass
+
+    @abstractmethod
+    def add(self, key, value, ttl=None):
+        """
+        Sets a key only if it is absent or expired; returns whether it was set.
+        """
+        pass
+
+    @abstractmethod
+    def delete(self, key):
+        pass
+
+    @abstractmethod
+    def incr(self, key, amount=1):
+        """
+        Atomically adds to an integer counter (missing counters start at 0) and returns the new value.
+        """
+        pass
+
+    @abstractmethod
+    def append(self, log, record):
+        """
+        Appends a JSON record to a log and returns its id; ids increase with every append.
+        """
+        pass
+
+    @abstractmethod
+    def scan(self, log, before_id=None, limit=100):
+        """
+        Returns up to `limit` (id, record) pairs of a log, newest first, older than `before_id`.
+        """
+        pass
+
+    def try_lock(self, name, ttl=600):
+        """
+        Takes a lock without waiting; returns its token, or None if it is held elsewhere.
+        The lock expires after `ttl` seconds, so a crashed worker cannot hold it forever.
+        """
+        token = uuid.uuid4().hex
+        return token if self.add(f"lock:{name}", token, ttl) else None
+
+    def unlock(self, name, token):
+        if self.get(f"lock:{name}") == token:
+            self.delete(f"lock:{name}")
+
+    def is_locked(self, name):
+        return self.get(f"lock:{name}") is not None
+
+    @contextmanager
+    def lock(self, name, ttl=600, timeout=None, poll_interval=0.1):
+        """
+        Holds a lock across workers for the duration of the block, waiting for it if needed.
+
+        :raises TimeoutError: If the lock is not acquired within `timeout` seconds.
+        """
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        token = self.try_lock(name, ttl)
+        while token is None:
+            if deadline is not None and time.monotonic() > deadline:
+                raise TimeoutError(f"Timed out waiting for lock '{name}'")
+            time.sleep(poll_interval)
+            token = self.try_lock(name, ttl)
+        try:
+            yield
+        finally:
+            self.unlock(name, token)
+
+
+class LocalStateBackend(StateBackend):
+    """
+    State in a SQLite file (WAL mode); every worker process on the node opening the same
+    file shares it.
+    """
+
+    def __init__(self, path=STATE_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False, timeout=30, isolation_level=None)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL)")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS logs (id INTEGER PRIMARY KEY AUTOINCREMENT, log TEXT NOT NULL, record TEXT NOT NULL)")
+        self._connection.execute("CREATE INDEX IF NOT EXISTS logs_log_id ON logs(log, id)")
+
+    @contextmanager
+    def _transaction(self):
+        # BEGIN IMMEDIATE takes the write lock up front, so read-modify-write is atomic across processes
+        with self._lock:
+            self._connection.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._connection
+                self._connection.execute("COMMIT")
+            except Exception:
+                self._connection.execute("ROLLBACK")
+                raise
+
+    def get(self, key):
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT value FROM state WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)",
+                (key, time.time())).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def set(self, key, value, ttl=None):
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO state (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, json.dumps(value), time.time() + ttl if ttl else None))
+
+    def add(self, key, value, ttl=None):
+        now = time.time()
+        with self._transaction() as connection:
+            connection.execute("DELETE FROM state WHERE key = ? AND expires_at <= ?", (key, now))
+            cursor = connection.execute(
+                "INSERT OR IGNORE INTO state (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, json.dumps(value), now + ttl if ttl else None))
+            return cursor.rowcount == 1
+
+    def delete(self, key):
+        with self._lock:
+            self._connection.execute("DELETE FROM state WHERE key = ?", (key,))
+
+    def incr(self, key, amount=1):
+        with self._transaction() as connection:
+            row = connection.execute("SELECT value FROM state WHERE key = ?", (key,)).fetchone()
+            value = (json.loads(row[0]) if row else 0) + amount
+            connection.execute("INSERT OR REPLACE INTO state (key, value, expires_at) VALUES (?, ?, NULL)",
+                               (key, json.dumps(value)))
+            return value
+
+    def append(self, log, record):
+        with self._lock:
+            cursor = self._connection.execute("INSERT INTO logs (log, record) VALUES (?, ?)", (log, json.dumps(record)))
+            return cursor.lastrowid
+
+    def scan(self, log, before_id=None, limit=100):
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT id, record FROM logs WHERE log = ? AND id < ? ORDER BY id DESC LIMIT ?",
+                (log, before_id if before_id is not None else 2 ** 63 - 1, limit)).fetchall()
+        return [(row[0], json.loads(row[1])) for row in rows]
+
+
+class RedisStateBackend(StateBackend):
+    """
+    State in Redis, shared by every worker on every node.
+
+    Pass `client` to use any redis-py compatible client instead of connecting to `url`,
+    e.g. a `fakeredis.FakeRedis()` stand-in for local development and tests (STATE_BACKEND=fakeredis).
+    """
+
+    shared = True
+
+    def __init__(self, url=None, prefix="docgene:", client=None):
+        if client is None:
+            if redis is None:
+                raise ImportError("STATE_BACKEND=redis requires the redis package: pip install redis")
+            client = redis.Redis.from_url(url)
+        self.client = client
+        self.prefix = prefix
+
+    def get(self, key):
+        value = self.client.get(self.prefix + key)
+        return json.loads(value) if value is not None else None
+
+    def set(self, key, value, ttl=None):
+        self.client.set(self.prefix + key, json.dumps(value), ex=int(ttl) if ttl else None)
+
+    def add(self, key, value, ttl=None):
+        return bool(self.client.set(self.prefix + key, json.dumps(value), ex=int(ttl) if ttl else None, nx=True))
+
+    def delete(self, key):
+        self.client.delete(self.prefix + key)
+
+    def incr(self, key, amount=1):
+        return self.client.incrby(self.prefix + key, amount)
+
+    def append(self, log, record):
+        # A sorted set scored by id keeps the log ordered and pages by id ranges
+        record_id = self.client.incr(f"{self.prefix}log:{log}:id")
+        self.client.zadd(f"{self.prefix}log:{log}", {json.dumps([record_id, record]): record_id})
+        return record_id
+
+    def scan(self, log, before_id=None, limit=100):
+        members = self.client.zrevrangebyscore(
+            f"{self.prefix}log:{log}", f"({before_id}" if before_id is not None else "+inf", "-inf", start=0, num=limit)
+        return [tuple(json.loads(member)) for member in members]
+
+
+_state_backend = None
+_state_backend_lock = threading.Lock()
+
+
+def get_state_backend():
+    """
+    Returns the process-wide state backend configured by `state_backend_settings()`.
+    """
+    global _state_backend
+    with _state_backend_lock:
+        if _state_backend is None:
+            settings = state_backend_settings()
+            if settings["backend"] == "redis":
+                _state_backend = RedisStateBackend(settings["redis_url"], prefix=settings["prefix"])
+            elif settings["backend"] == "fakeredis":
+                if fakeredis is None:
+                    raise ImportError("STATE_BACKEND=fakeredis requires the fakeredis package: pip install fakeredis")
+                _state_backend = RedisStateBackend(prefix=settings["prefix"], client=fakeredis.FakeRedis())
+            elif settings["backend"] == "local":
+                _state_backend = LocalStateBackend(settings["path"])
+            else:
+                raise ValueError(f"Unsupported state backend: {settings['backend']}")
+        return _state_backend
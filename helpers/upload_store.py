@@ -0,0 +1,100 @@
+import hashlib
+import json
+import os
+import tempfile
+from helpers.state_backend import get_state_backend
+
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", 1024 * 1024))
+
+
+def save_upload(file, directory, suffix="", chunk_size=UPLOAD_CHUNK_SIZE):
+    """
+    Streams an uploaded file to a temporary file in `directory`, hashing it on the way.
+
+    Only one chunk is held in memory at a time.
+
+    :param file: Readable binary file object.
+    :param directory: Directory for the temporary file (created if missing).
+    :param suffix: File name suffix, e.g. ".csv".
+    :param chunk_size: Bytes read per chunk.
+    :return: Tuple of (temporary file path, SHA-256 hex digest of the content).
+    """
+    os.makedirs(directory, exist_ok=True)
+    digest = hashlib.sha256()
+    handle, path = tempfile.mkstemp(suffix=suffix, dir=directory)
+    try:
+        with os.fdopen(handle, "wb") as buffer:
+            while True:
+                chunk = file.read(chunk_size)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                buffer.write(chunk)
+    except Exception:
+        os.remove(path)
+        raise
+    return path, digest.hexdigest()
+
+
+def dataset_id_for(content_hash):
+    """
+    Returns the ID of the dataset built from a file with this content hash.
+    """
+    return content_hash[:16]
+
+
+def is_dataset_id(value):
+    """
+    True for strings shaped like a dataset ID, which are safe to use as a directory name.
+    """
+    return isinstance(value, str) and len(value) == 16 and all(c in "0123456789abcdef" for c in value)
+
+
+def dataset_path(base_path, content_hash):
+    """
+    Returns the directory holding the database built from a file with this content hash
+    (or with this dataset ID).
+    """
+    return os.path.join(str(base_path), "datasets", dataset_id_for(content_hash))
+
+
+def list_datasets(base_path, db_name):
+    """
+    Returns the manifests of all completely loaded datasets, by dataset ID.
+    """
+    root = os.path.join(str(base_path), "datasets")
+    datasets = {}
+    for name in sorted(os.listdir(root)) if os.path.isdir(root) else []:
+        manifest = read_manifest(os.path.join(root, name), db_name) if is_dataset_id(name) else None
+        if manifest is not None:
+            datasets[name] = manifest
+    return datasets
+
+
+def read_manifest(directory, db_name):
+    """
+    Returns the manifest written after `db_name` was loaded in `directory`, or None.
+    """
+    path = os.path.join(directory, f"{db_name}.json")
+    if not os.path.exists(path) or not os.path.exists(os.path.join(directory, f"{db_name}.db")):
+        return None
+    with open(path, "r") as file:
+        return json.load(file)
+
+
+def write_manifest(directory, db_name, manifest):
+    """
+    Marks `db_name` in `directory` as completely loaded.
+    """
+    path = os.path.join(directory, f"{db_name}.json")
+    with open(path + ".tmp", "w") as file:
+        json.dump(manifest, file)
+    os.replace(path + ".tmp", path)
+
+
+def content_lock(content_hash):
+    """
+    Returns the lock serializing ingestion of one content hash, so concurrent uploads of
+    the same file load it once, on any worker sharing the state backend.
+    """
+    return get_state_backend().lock(f"upload:{content_hash}", ttl=3600)
@@ -110,10 +110,8 @@ if st.button("▶️  Send  Query"):
                 api_key = st.session_state.config.get("LLM_API_KEY")
             )
         
-        response=inference_client.generate_generic_response(nl_query)
-
         st.text(f"Response: LLM backend {backend} serving {model_name}")
-        st.markdown(response)
+        response = st.write_stream(inference_client.stream_generic_response(nl_query))
 
         # st.session_state.query_history.append((nl_query, response))
         # save_query_history(st.session_state["query_history"])
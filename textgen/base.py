@@ -1,22 +1,32 @@
 import re
-import requests
+import json
+import asyncio
+import hashlib
+import httpx
 import logging
 from abc import ABC, abstractmethod
 import sqlglot
+from sqlglot import exp
+from helpers.sql_cache import get_sql_cache
+from .transport import get_http_client, get_async_http_client, format_http_error
+from .sql_stream import StreamingSQLExtractor, sql_streaming_enabled
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Statement types worth caching; anything else is a model reply that merely parses, e.g. "No response"
+CACHEABLE_SQL_TYPES = (exp.Query, exp.DML, exp.DDL, exp.Drop, exp.Alter)
+
 class TextGenBase(ABC):
     """
     Abstract base class for text generation clients.
     """
 
     def __init__(self, server_url, model_name,api_key=None):
-        self.server_url = self.override_server_url(server_url)
         self.model_name = model_name
         self.api_key = api_key
+        self.server_url = self.override_server_url(server_url)
         logger.info(f"Initialized {self.__class__.__name__} with server_url={self.server_url} and model_name={self.model_name}")
 
     def override_server_url(self, server_url):
@@ -39,39 +49,212 @@ class TextGenBase(ABC):
 
     def generate_generic_response(self, user_question):
         try:
-            payload = self.construct_generic_payload(user_question)
-            headers = {"Content-Type": "application/json"}
-            logging.info(f"Sending Payload: {payload} to Server: {self.server_url}")
-            response = requests.post(self.server_url, headers=headers, json=payload)
-            response.raise_for_status()
-            raw_response = response.json()
-            return self.parse_response(raw_response)
-        except requests.exceptions.RequestException as e:
-            error_response = None
-            if hasattr(e.response, "text"):  # Check if the response object exists
-                error_response = e.response.text
-            error_message = f"Error: {e}.\n Response: {error_response}"
+            return self.request_generic(user_question)
+        except httpx.HTTPError as e:
+            error_message = format_http_error(e)
             logging.error(error_message)  # Log the error for debugging purposes
             return error_message
-        
-  
 
-    def generate_sql(self, user_question, db_schema):
+    async def generate_generic_response_async(self, user_question):
         try:
-            payload = self.construct_sql_payload(user_question, db_schema)
-            headers = {"Content-Type": "application/json"}
-            response = requests.post(self.server_url, headers=headers, json=payload)
-            response.raise_for_status()
-            raw_response = response.json()
-            return self._extract_sql_statement(self.parse_response(raw_response))
-        except requests.exceptions.RequestException as e:
-            error_response = None
-            if hasattr(e.response, "text"):  # Check if the response object exists
-                error_response = e.response.text
-            error_message = f"Error: {e}.\n Response: {error_response}"
+            return await self.request_generic_async(user_question)
+        except httpx.HTTPError as e:
+            error_message = format_http_error(e)
             logging.error(error_message)  # Log the error for debugging purposes
             return error_message
-        
+
+    def stream_generic_response(self, user_question):
+        """
+        Yields the completion text in chunks as the model produces it.
+        """
+        try:
+            yield from self._stream(self.construct_generic_payload(user_question))
+        except httpx.HTTPError as e:
+            error_message = format_http_error(e)
+            logging.error(error_message)  # Log the error for debugging purposes
+            yield error_message
+
+    async def stream_generic_response_async(self, user_question):
+        try:
+            async for chunk in self._stream_async(self.construct_generic_payload(user_question)):
+                yield chunk
+        except httpx.HTTPError as e:
+            error_message = format_http_error(e)
+            logging.error(error_message)  # Log the error for debugging purposes
+            yield error_message
+
+    def request_generic(self, user_question):
+        """
+        Sends a free-form prompt to the model and returns the completion text.
+        """
+        payload = self.construct_generic_payload(user_question)
+        logging.info(f"Sending Payload: {payload} to Server: {self.server_url}")
+        return self.parse_response(self._post(payload))
+
+    async def request_generic_async(self, user_question):
+        payload = self.construct_generic_payload(user_question)
+        logging.info(f"Sending Payload: {payload} to Server: {self.server_url}")
+        return self.parse_response(await self._post_async(payload))
+
+    def generate_sql(self, user_question, db_schema, schema_version=None, use_cache=True):
+        """
+        Generates SQL for a question, answering from the SQL generation cache when possible.
+
+        :param user_question: Natural language question.
+        :param db_schema: Schema text sent to the model.
+        :param schema_version: Schema fingerprint used in the cache key (default: hash of db_schema).
+        :param use_cache: Set to False to bypass the cache for this call.
+        """
+        cache, cache_key, cached_sql = self._lookup_cached_sql(user_question, db_schema, schema_version, use_cache)
+        if cached_sql:
+            return cached_sql
+
+        try:
+            sql_query = self._extract_sql_statement(self.request_sql(user_question, db_schema))
+        except httpx.HTTPError as e:
+            error_message = format_http_error(e)
+            logging.error(error_message)  # Log the error for debugging purposes
+            return error_message
+
+        if cache is not None and sql_query and self._is_sql_statement(sql_query):
+            cache.put(cache_key, sql_query, user_question, self.__class__.__name__, self.model_name)
+        return sql_query
+
+    async def generate_sql_async(self, user_question, db_schema, schema_version=None, use_cache=True):
+        """
+        Async variant of generate_sql; neither the model call nor the cache's file or
+        network I/O blocks the event loop.
+        """
+        cache, cache_key, cached_sql = await asyncio.to_thread(
+            self._lookup_cached_sql, user_question, db_schema, schema_version, use_cache)
+        if cached_sql:
+            return cached_sql
+
+        try:
+            sql_query = self._extract_sql_statement(await self.request_sql_async(user_question, db_schema))
+        except httpx.HTTPError as e:
+            error_message = format_http_error(e)
+            logging.error(error_message)  # Log the error for debugging purposes
+            return error_message
+
+        if cache is not None and sql_query and self._is_sql_statement(sql_query):
+            await asyncio.to_thread(
+                cache.put, cache_key, sql_query, user_question, self.__class__.__name__, self.model_name)
+        return sql_query
+
+    def _lookup_cached_sql(self, user_question, db_schema, schema_version, use_cache):
+        cache = get_sql_cache() if use_cache else None
+        if cache is None:
+            return None, None, None
+        cache_key = cache.make_key(
+            user_question, self.__class__.__name__, self.model_name,
+            schema_version or hashlib.sha256(str(db_schema).encode()).hexdigest())
+        cached_sql = cache.get(cache_key)
+        if cached_sql:
+            logger.info(f"Using cached SQL for question: {user_question}")
+        return cache, cache_key, cached_sql
+
+    def request_sql(self, user_question, db_schema):
+        """
+        Sends the SQL prompt to the model and returns the raw completion text.
+
+        With SQL streaming enabled the completion is consumed as it arrives and the
+        upstream generation is cancelled as soon as a complete statement is received.
+        """
+        payload = self.construct_sql_payload(user_question, db_schema)
+        if not sql_streaming_enabled():
+            return self.parse_response(self._post(payload))
+
+        extractor = StreamingSQLExtractor()
+        chunks = self._stream(payload)
+        try:
+            for chunk in chunks:
+                if extractor.feed(chunk):
+                    logger.info("Complete SQL statement received, cancelling generation")
+                    break
+        finally:
+            chunks.close()  # Closes the HTTP stream, which aborts generation on the server
+        return extractor.text()
+
+    async def request_sql_async(self, user_question, db_schema):
+        payload = self.construct_sql_payload(user_question, db_schema)
+        if not sql_streaming_enabled():
+            return self.parse_response(await self._post_async(payload))
+
+        extractor = StreamingSQLExtractor()
+        chunks = self._stream_async(payload)
+        try:
+            async for chunk in chunks:
+                if extractor.feed(chunk):
+                    logger.info("Complete SQL statement received, cancelling generation")
+                    break
+        finally:
+            await chunks.aclose()
+        return extractor.text()
+
+    def _post(self, payload):
+        """
+        POSTs a JSON payload to the server over the shared pooled connection.
+        """
+        headers = {"Content-Type": "application/json"}
+        response = get_http_client().post(self.server_url, headers=headers, json=payload)
+        response.raise_for_status()
+        return response.json()
+
+    def _stream(self, payload):
+        """
+        POSTs a payload with streaming enabled and yields the text of each streamed chunk.
+        """
+        headers = {"Content-Type": "application/json"}
+        with get_http_client().stream("POST", self.server_url, headers=headers, json=dict(payload, stream=True)) as response:
+            if response.is_error:
+                response.read()  # Load the error body so format_http_error can report it
+            response.raise_for_status()
+            for line in response.iter_lines():
+                chunk = self.parse_stream_line(line)
+                if chunk:
+                    yield chunk
+
+    async def _stream_async(self, payload):
+        headers = {"Content-Type": "application/json"}
+        async with get_async_http_client().stream(
+                "POST", self.server_url, headers=headers, json=dict(payload, stream=True)) as response:
+            if response.is_error:
+                await response.aread()
+            response.raise_for_status()
+            async for line in response.aiter_lines():
+                chunk = self.parse_stream_line(line)
+                if chunk:
+                    yield chunk
+
+    def parse_stream_line(self, line):
+        """
+        Parses one line of an OpenAI-compatible server-sent events stream (TGI, vLLM).
+        Override for servers using a different framing.
+        """
+        if not line.startswith("data:"):
+            return None
+        data = line[len("data:"):].strip()
+        if data == "[DONE]":
+            return None
+        choices = json.loads(data).get("choices") or [{}]
+        return (choices[0].get("delta") or {}).get("content")
+
+    async def _post_async(self, payload):
+        headers = {"Content-Type": "application/json"}
+        response = await get_async_http_client().post(self.server_url, headers=headers, json=payload)
+        response.raise_for_status()
+        return response.json()
+
+    @staticmethod
+    def _is_sql_statement(sql_query):
+        """
+        True when the extracted text parses as a query, DML or DDL statement.
+        """
+        try:
+            return isinstance(sqlglot.parse_one(sql_query), CACHEABLE_SQL_TYPES)
+        except Exception:
+            return False
 
     @staticmethod
     def _extract_sql_statement(input_string):
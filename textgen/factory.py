@@ -1,19 +1,75 @@
+import os
+import time
+import hashlib
+import threading
+from collections import OrderedDict
 from .huggingface import HuggingFaceClient
 from .ollama import OllamaClient
 from .openai_client import OpenAIClient
 from .google_gemini import GoogleGeminiClient
 
 class LLMClientFactory:
-    @staticmethod
-    def get_client(backend, server_url, model_name,api_key):
+    """
+    Registry of warm LLM clients keyed on backend, endpoint, model and API key hash.
+
+    Clients are reused across requests; changing any part of the configuration yields a
+    new key and therefore a fresh client. At most LLM_CLIENT_CACHE_SIZE clients are kept
+    (default: 8) and clients unused for LLM_CLIENT_IDLE_TTL seconds are dropped (default: 1800).
+    """
+
+    _clients = OrderedDict()
+    _lock = threading.Lock()
+    max_clients = int(os.getenv("LLM_CLIENT_CACHE_SIZE", 8))
+    idle_ttl = int(os.getenv("LLM_CLIENT_IDLE_TTL", 1800))
+
+    @classmethod
+    def get_client(cls, backend, server_url, model_name,api_key):
         backend = backend.lower()
+        key = (backend, server_url, model_name, hashlib.sha256((api_key or "").encode()).hexdigest())
+        now = time.time()
+        with cls._lock:
+            cls._evict_idle(now)
+            entry = cls._clients.get(key)
+            if entry is not None:
+                entry["last_used"] = now
+                cls._clients.move_to_end(key)
+                return entry["client"]
+
+            client = cls._build_client(backend, server_url, model_name, api_key)
+            cls._clients[key] = {"client": client, "last_used": now}
+            while len(cls._clients) > cls.max_clients:
+                cls._clients.popitem(last=False)
+            return client
+
+    @staticmethod
+    def _build_client(backend, server_url, model_name,api_key):
         if backend == "huggingface":
             return HuggingFaceClient(server_url, model_name)
         elif backend == "ollama":
             return OllamaClient(server_url, model_name)
         elif backend == "openai":
-            return OpenAIClient(server_url,model_name)
+            return OpenAIClient(server_url,model_name,api_key)
         elif backend == "gemini":
             return GoogleGeminiClient(server_url,model_name,api_key)
         else:
             raise ValueError(f"Unsupported LLM backend: {backend}")
+
+    @classmethod
+    def _evict_idle(cls, now):
+        if not cls.idle_ttl:
+            return
+        for key in [key for key, entry in cls._clients.items() if now - entry["last_used"] > cls.idle_ttl]:
+            del cls._clients[key]
+
+    @classmethod
+    def clear(cls):
+        with cls._lock:
+            cls._clients.clear()
+
+    @classmethod
+    def stats(cls):
+        with cls._lock:
+            return {
+                "clients": len(cls._clients),
+                "backends": sorted({key[0] for key in cls._clients}),
+            }
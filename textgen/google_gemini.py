@@ -32,20 +32,27 @@ class GoogleGeminiClient(TextGenBase):
     def construct_generic_payload(self, user_question):
         return user_question
 
-    def generate_sql(self, user_question, db_schema):
-        genai.configure(api_key=self.api_key)
-        model = genai.GenerativeModel(self.model_name)
-        response = model.generate_content(self.construct_sql_payload(user_question, db_schema))
-    
-        parsed_response = self.parse_response(response)  # Get the response text
-        return self._extract_sql_statement(parsed_response)  # Extract the SQL statement
-    
-    def generate_generic_response(self, user_question):
-        genai.configure(api_key=self.api_key)
-        model = genai.GenerativeModel(self.model_name)
-        response = model.generate_content(user_question)
-        return self.parse_response(response)
-                
+    def _get_model(self):
+        # Configured once per client; LLMClientFactory keeps the client warm between requests
+        if getattr(self, "model", None) is None:
+            genai.configure(api_key=self.api_key)
+            self.model = genai.GenerativeModel(self.model_name)
+        return self.model
+
+    def _post(self, payload):
+        return self._get_model().generate_content(payload)
+
+    async def _post_async(self, payload):
+        return await self._get_model().generate_content_async(payload)
+
+    def _stream(self, payload):
+        for chunk in self._get_model().generate_content(payload, stream=True):
+            yield chunk.text
+
+    async def _stream_async(self, payload):
+        response = await self._get_model().generate_content_async(payload, stream=True)
+        async for chunk in response:
+            yield chunk.text
 
     def parse_response(self, response):
         logger.info(f"Parsing response of {self.model_name} with Google Gemini")
@@ -1,4 +1,5 @@
 from .base import TextGenBase
+import json
 import logging
 
 logger = logging.getLogger(__name__)
@@ -62,3 +63,9 @@ class OllamaClient(TextGenBase):
     def parse_response(self, response):
         logger.info(f"Parsing response for Ollama {response}")
         return response.get('message', {}).get('content', '').strip()
+
+    def parse_stream_line(self, line):
+        # Ollama streams newline-delimited JSON objects instead of server-sent events
+        if not line.strip():
+            return None
+        return json.loads(line).get('message', {}).get('content')
@@ -1,17 +1,32 @@
-from openai import OpenAI
+from openai import OpenAI, AsyncOpenAI, APIError
+from contextlib import contextmanager
 from .base import TextGenBase
+from .transport import get_http_client, get_async_http_client
+import httpx
 import logging
 
 logger = logging.getLogger(__name__)
 
 
-class OpenAIClient:
+@contextmanager
+def translate_errors():
+    """
+    Re-raises OpenAI SDK errors as httpx errors, which callers handle for every backend.
+    """
+    try:
+        yield
+    except APIError as e:
+        raise httpx.HTTPError(f"{e.__class__.__name__}: {e}") from e
+
+
+class OpenAIClient(TextGenBase):
     def override_server_url(self, server_url):
-        logger.info("Overriding server URL for HuggingFace")
+        logger.info("Overriding server URL for OpenAI")
         server_url= f"http://{server_url}/v1/"
         self.client = OpenAI(
             base_url=server_url,
-            api_key="-"
+            api_key=self.api_key or "-",
+            http_client=get_http_client()
         )
         return server_url
 
@@ -27,19 +42,50 @@ class OpenAIClient:
             "messages": [{"role": "user", "content": prompt}],
             "temperature": 0
         }
-    
+
     def construct_generic_payload(self, user_question):
-        chat_completion = self.client.chat.completions.create(
-            model="meta-llama/Llama-3.2-1B-Instruct",
-            messages=[
-                {"role": "user", "content": user_question}
-            ],
-            stream=False,
-            max_tokens=1024,  # Maximum number of tokens to generate
-            temperature=0.7,  # Adds randomness to encourage a longer response
-            top_p=0.9         # Ensures diverse token sampling
-        )
+        return {
+            "model": self.model_name,
+            "messages": [{"role": "user", "content": user_question}],
+            "stream": False,
+            "max_tokens": 1024,  # Maximum number of tokens to generate
+            "temperature": 0.7,  # Adds randomness to encourage a longer response
+            "top_p": 0.9         # Ensures diverse token sampling
+        }
+
+    def _post(self, payload):
+        with translate_errors():
+            chat_completion = self.client.chat.completions.create(**payload)
+        return chat_completion.model_dump()
+
+    async def _post_async(self, payload):
+        with translate_errors():
+            chat_completion = await self._get_async_client().chat.completions.create(**payload)
+        return chat_completion.model_dump()
+
+    def _stream(self, payload):
+        # Closing the stream, also when the consumer stops early, returns its connection to the pool
+        with translate_errors(), self.client.chat.completions.create(**dict(payload, stream=True)) as stream:
+            for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+
+    async def _stream_async(self, payload):
+        with translate_errors():
+            async with await self._get_async_client().chat.completions.create(**dict(payload, stream=True)) as stream:
+                async for chunk in stream:
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        yield chunk.choices[0].delta.content
+
+    def _get_async_client(self):
+        if getattr(self, "async_client", None) is None:
+            self.async_client = AsyncOpenAI(
+                base_url=self.server_url,
+                api_key=self.api_key or "-",
+                http_client=get_async_http_client()
+            )
+        return self.async_client
 
     def parse_response(self, response):
-        logger.info(f"Parsing response of {self.model_name} with TGI")
+        logger.info(f"Parsing response of {self.model_name} with OpenAI")
         return response.get("choices", [{}])[0].get("message", {}).get("content", "No response")
@@ -0,0 +1,82 @@
+import os
+import re
+import sqlglot
+from sqlglot import exp
+
+SQL_FENCE_OPEN = re.compile(r"```sql\s", re.IGNORECASE)
+THINK_BLOCK = re.compile(r"<think>[\s\S]*?</think>", re.IGNORECASE)
+STATEMENT_START = re.compile(r"^\s*(select|with|insert|update|delete)\b", re.IGNORECASE)
+STATEMENT_TYPES = (exp.Select, exp.Union, exp.Intersect, exp.Except, exp.Insert, exp.Update, exp.Delete)
+
+
+def sql_streaming_enabled():
+    """
+    LLM_STREAM_SQL: "on" to stream SQL completions and stop at the first complete
+    statement, "off" to wait for the whole completion (default: on).
+    """
+    return os.getenv("LLM_STREAM_SQL", "on").lower() not in {"off", "false", "0"}
+
+
+class StreamingSQLExtractor:
+    """
+    Consumes completion chunks and detects when a complete SQL statement has arrived.
+
+    A statement is complete once a ```sql fence is closed, or, when the model answers
+    without a fence, once a parseable statement is followed by a ";" terminator.
+    Reasoning preambles (<think>...</think>) are ignored, so SQL drafted while thinking
+    does not end the generation early.
+    """
+
+    def __init__(self):
+        self.buffer = ""
+        self.statement_end = None
+
+    def feed(self, chunk):
+        """
+        Appends a chunk and returns True when the buffered text holds a complete statement.
+        """
+        self.buffer += chunk
+        return self.is_complete()
+
+    def answer_text(self):
+        """
+        Returns the buffered text outside of reasoning blocks, or None while still thinking.
+        """
+        text = THINK_BLOCK.sub("", self.buffer)
+        if re.search(r"<think>", text, re.IGNORECASE):
+            return None
+        return text
+
+    def is_complete(self):
+        text = self.answer_text()
+        if text is None:
+            return False
+
+        fence = SQL_FENCE_OPEN.search(text)
+        if fence:
+            return "```" in text[fence.end():]
+        if "```" in text:
+            return False
+
+        if not STATEMENT_START.match(text):
+            return False
+        # A ";" may also sit inside a string literal, so try every terminator seen so far
+        for terminator in (match.start() for match in re.finditer(";", text)):
+            try:
+                statement = sqlglot.parse_one(text[:terminator])
+            except Exception:
+                continue
+            if isinstance(statement, STATEMENT_TYPES):
+                self.statement_end = terminator + 1
+                return True
+        return False
+
+    def text(self):
+        """
+        Returns the text to extract SQL from: the answer without reasoning blocks, cut after
+        the terminator when the statement was detected without a fence.
+        """
+        text = self.answer_text() or self.buffer
+        if self.statement_end is not None:
+            return text[:self.statement_end]
+        return text
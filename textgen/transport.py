@@ -0,0 +1,110 @@
+import os
+import asyncio
+import logging
+import threading
+import weakref
+import httpx
+
+logger = logging.getLogger(__name__)
+
+_client = None
+_async_clients = weakref.WeakKeyDictionary()
+_client_lock = threading.Lock()
+
+
+def http2_available():
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def transport_settings():
+    """
+    Reads HTTP transport settings for the LLM backends from the environment.
+
+    LLM_POOL_SIZE: Maximum open connections across all backends (default: 20).
+    LLM_POOL_KEEPALIVE: Idle keep-alive connections kept open (default: 10).
+    LLM_CONNECT_TIMEOUT: Seconds to establish a connection (default: 5).
+    LLM_READ_TIMEOUT: Seconds to wait for response data; generation can be slow (default: 300).
+    LLM_HTTP2: "on" to negotiate HTTP/2 when the h2 package is installed (default: on).
+    """
+    return {
+        "pool_size": int(os.getenv("LLM_POOL_SIZE", 20)),
+        "keepalive": int(os.getenv("LLM_POOL_KEEPALIVE", 10)),
+        "connect_timeout": float(os.getenv("LLM_CONNECT_TIMEOUT", 5)),
+        "read_timeout": float(os.getenv("LLM_READ_TIMEOUT", 300)),
+        "http2": os.getenv("LLM_HTTP2", "on").lower() not in {"off", "false", "0"} and http2_available(),
+    }
+
+
+def build_client_options():
+    settings = transport_settings()
+    return {
+        "limits": httpx.Limits(max_connections=settings["pool_size"],
+                               max_keepalive_connections=settings["keepalive"]),
+        "timeout": httpx.Timeout(settings["read_timeout"], connect=settings["connect_timeout"]),
+        "http2": settings["http2"],
+    }
+
+
+def get_http_client():
+    """
+    Returns the process-wide pooled HTTP client shared by every text generation client,
+    so connections (and TLS sessions) to the LLM servers are reused across requests.
+    """
+    global _client
+    with _client_lock:
+        if _client is None or _client.is_closed:
+            options = build_client_options()
+            _client = httpx.Client(**options)
+            logger.info(f"Created pooled LLM HTTP client (http2={options['http2']})")
+        return _client
+
+
+def get_async_http_client():
+    """
+    Returns the pooled async HTTP client for the running event loop.
+
+    httpx async clients are bound to the loop they are first used on, so one client is
+    kept per loop; in the API that means a single client shared by every request.
+    """
+    loop = asyncio.get_running_loop()
+    with _client_lock:
+        client = _async_clients.get(loop)
+        if client is None or client.is_closed:
+            options = build_client_options()
+            client = httpx.AsyncClient(**options)
+            _async_clients[loop] = client
+            logger.info(f"Created pooled async LLM HTTP client (http2={options['http2']})")
+        return client
+
+
+def close_http_client():
+    global _client
+    with _client_lock:
+        if _client is not None:
+            _client.close()
+            _client = None
+
+
+async def close_async_http_client():
+    loop = asyncio.get_running_loop()
+    with _client_lock:
+        client = _async_clients.pop(loop, None)
+    if client is not None:
+        await client.aclose()
+
+
+def format_http_error(error):
+    """
+    Builds the error message returned to callers when an LLM request fails.
+    """
+    error_response = None
+    if isinstance(error, httpx.HTTPStatusError):
+        try:
+            error_response = error.response.text
+        except httpx.ResponseNotRead:  # Streamed response whose body was never loaded
+            error_response = None
+    return f"Error: {error}.\n Response: {error_response}"